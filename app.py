@@ -7,14 +7,16 @@ import atexit
 import sys
 import os
 
-from PyQt6.QtCore import QEvent
+from PyQt6.QtCore import QEvent, Qt
 from PyQt6.QtWidgets import QApplication, QHBoxLayout, QMainWindow, QWidget
 
 from canvas import Canvas
 from core.communicator import Communicator
 from core.toolbar import Toolbar
 from core.gui_module_handler import GUIModuleHandler
+from core.modules.stats_panel import StatsPanel
 from utils.config_handler import ConfigHandler
+from utils.profiler import StartupProfiler
 from utils.vec2f import Vec2f
 
 class App(QMainWindow):
@@ -30,10 +32,12 @@ class App(QMainWindow):
         """
         self._announce("STARTING APP")
         super().__init__()
+        self.profiler = StartupProfiler()
 
         print("Setting up main window")
-        self.config_handler = ConfigHandler()
-        self.config_handler.load_window_config(self)
+        with self.profiler.phase("config"):
+            self.config_handler = ConfigHandler()
+            self.config_handler.load_window_config(self)
 
         print("Loading UI")
         self.main_widget = QWidget(self)
@@ -46,15 +50,23 @@ class App(QMainWindow):
 
         # todo: this should all just be a large widget for the menus, and canvas should be a seperate thing
         # picker menus
-        self.ui_layout = GUIModuleHandler(self.main_widget)
+        with self.profiler.phase("picker build"):
+            self.ui_layout = GUIModuleHandler(self.main_widget)
 
         self.toolbar = Toolbar(self)
         self.toolbar.setMovable(False)
         self.addToolBar(self.toolbar)
 
+        # show progress of background saves
+        save_signals = self.toolbar.kagimage.signals
+        save_signals.progress.connect(lambda fp, percent: self.statusBar().showMessage(f"Saving {os.path.basename(fp)}... {percent}%"))
+        save_signals.finished.connect(lambda fp: self.statusBar().showMessage(f"Saved {fp}", 5000))
+        save_signals.failed.connect(lambda fp, error: self.statusBar().showMessage(f"Failed to save {fp}: {error}"))
+
         # load canvas
         print("Loading Canvas")
-        self.canvas = Canvas(Vec2f(200, 80))
+        with self.profiler.phase("canvas build"):
+            self.canvas = Canvas(Vec2f(200, 80))
 
         # add canvas to layout
         self.layout.addWidget(self.canvas)
@@ -62,6 +74,15 @@ class App(QMainWindow):
         self.communicator = Communicator()
         self.communicator.set_canvas(self.canvas)
         self.communicator.set_exec_path(os.path.dirname(os.path.abspath(__file__)))
+
+        # item counts, shown from the view menu
+        self.stats_panel = StatsPanel(self)
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.stats_panel)
+        self.stats_panel.setVisible(False)
+        self.stats_panel.visibilityChanged.connect(self.toolbar.stats_visible.setChecked)
+
+        self.canvas.recover_session()
+        self.profiler.finish()
         self._announce("RUNNING APP")
         atexit.register(self.save_on_exit)
 
@@ -100,8 +121,38 @@ class App(QMainWindow):
         print(message)
         print("============")
 
+def _get_startup_report_args(argv: list[str]) -> tuple[bool, str]:
+    """
+    Reads the startup report flags from the command line.
+
+    '--startup-report' prints the startup timings,
+    '--startup-report=path.json' also writes them to the given file.
+
+    Parameters:
+        argv (list[str]): The command line arguments.
+
+    Returns:
+        tuple[bool, str]: Whether to print the report, and the JSON path or None.
+    """
+    for arg in argv[1:]:
+        if arg == "--startup-report":
+            return True, None
+
+        if arg.startswith("--startup-report="):
+            return True, arg.split("=", 1)[1] or None
+
+    return False, None
+
 if __name__ == '__main__':
+    show_report, report_path = _get_startup_report_args(sys.argv)
     app = QApplication(sys.argv)
     application = App()
     application.show()
+
+    if show_report:
+        application.profiler.print_report()
+
+    if report_path is not None:
+        application.profiler.write_json(report_path)
+
     sys.exit(app.exec())
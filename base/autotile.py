@@ -0,0 +1,192 @@
+"""
+Picks the world.png variant of each tile from the tiles around it, to preview the map the way it looks in game.
+"""
+from array import array
+from itertools import repeat
+from operator import add
+
+from base.citemlist import CItemList, ID_SHIFT
+from base.tile_grid import GridListener, TileGrid
+
+# the neighbors of a cell that are the same kind of tile, as bits of a mask
+UP, RIGHT, DOWN, LEFT = 1, 2, 4, 8
+
+# the world.png variants of each tile, by which of the cells above and below are the same kind of tile.
+# "top" is used with nothing above, "bottom" with nothing below, "single" with neither and "inner" with both.
+# when there are several variants one is picked from the cell's position, so the same map always looks the same
+VARIANTS = {
+    "tile_ground": {"top": (16, 18, 20), "inner": (17, 19, 21, 22)},
+    "tile_castle": {"single": (50,), "top": (48, 54), "bottom": (53,), "inner": (49, 51, 52)},
+    "tile_gold": {"inner": (80, 81, 82, 83, 84, 85)},
+    "tile_stone": {"inner": (96, 97)},
+    "tile_bedrock": {"inner": (106, 107, 108, 109, 110, 111)},
+    "tile_wood": {"single": (197,), "top": (196,), "inner": (197, 198)},
+    "tile_thickstone": {"inner": (208, 209)}
+}
+
+def _get_position_hash(x: int, y: int) -> int:
+    return ((x * 73856093) ^ (y * 19349663)) & 0xFFFF
+
+class Autotiler(GridListener):
+    """
+    Keeps the world.png index each tile should be drawn with.
+    Every edit only changes the cells next to it, so only the 3x3 cells around each changed cell are worked out again.
+    """
+    def __init__(self, grid: TileGrid, item_list: CItemList) -> None:
+        self.grid = grid
+        self.item_list = item_list
+
+        # item id -> family number, starting at 1
+        self._families: dict[int, int] = {}
+        # family number -> mask -> variants
+        self._variants: list[list[tuple[int, ...]]] = [None]
+        for name, variants in VARIANTS.items():
+            item_id = item_list.get_item_id(name)
+            if item_id == 0:
+                continue
+
+            self._families[item_id] = len(self._variants)
+            self._variants.append([self._get_mask_variants(variants, mask) for mask in range(16)])
+
+        self._family_codes: dict[int, int] = {}
+        # the world.png index of every cell, 0 for cells that are drawn as they are
+        self.indexes = array('H', bytes(2 * len(grid.codes)))
+        self._dirty: set[int] = set()
+        self._needs_full_update = True
+        grid.add_listener(self)
+
+    def cells_changed(self, indexes, old, new) -> None:
+        if self._needs_full_update:
+            return
+
+        # the cells around them are added when the variants are next worked out
+        self._dirty.update(indexes)
+
+    def cell_changed(self, index: int, old: int, new: int) -> None:
+        self.cells_changed((index,), (old,), (new,))
+
+    def grid_reset(self, grid: TileGrid) -> None:
+        self._needs_full_update = True
+        self._dirty.clear()
+
+    def get_index(self, cell: int) -> int:
+        """
+        Returns the world.png index a cell should be drawn with, or 0 to draw it as it is.
+        """
+        self.update()
+        return self.indexes[cell]
+
+    def update(self) -> dict[int, int]:
+        """
+        Works out the variants of the cells around the edits made since the last update.
+
+        Returns:
+            dict[int, int]: The world.png index of every cell that was worked out again,
+                0 for cells that are drawn as they are.
+        """
+        if self._needs_full_update:
+            return self._update_all()
+
+        if not self._dirty:
+            return {}
+
+        changed_cells, self._dirty = self._dirty, set()
+        codes = self.grid.codes
+        get_family = self._get_family
+        width, height = self.grid.width, self.grid.height
+
+        # the 3x3 cells around every changed cell, cells wrapped around to the other end of a row are just worked out again
+        dirty = set(changed_cells)
+        for offset in (-width - 1, -width, -width + 1, -1, 1, width - 1, width, width + 1):
+            dirty.update(map(add, changed_cells, repeat(offset)))
+
+        dirty.difference_update(range(-width - 1, 0))
+        dirty.difference_update(range(len(codes), len(codes) + width + 1))
+
+        changed = {}
+        for cell in dirty:
+            family = get_family(codes[cell])
+            if family == 0:
+                self.indexes[cell] = 0
+                changed[cell] = 0
+                continue
+
+            x, y = cell % width, cell // width
+            mask = 0
+            if y > 0 and get_family(codes[cell - width]) == family:
+                mask |= UP
+            if x < width - 1 and get_family(codes[cell + 1]) == family:
+                mask |= RIGHT
+            if y < height - 1 and get_family(codes[cell + width]) == family:
+                mask |= DOWN
+            if x > 0 and get_family(codes[cell - 1]) == family:
+                mask |= LEFT
+
+            variants = self._variants[family][mask]
+            self.indexes[cell] = changed[cell] = variants[_get_position_hash(x, y) % len(variants)]
+
+        return changed
+
+    def _update_all(self) -> dict[int, int]:
+        # every row is compared with the rows above and below it in one pass
+        self._needs_full_update = False
+        self._dirty.clear()
+
+        families = self._get_families()
+        width, height = self.grid.width, self.grid.height
+        indexes = array('H', bytes(2 * len(families)))
+        empty_row = bytes(width)
+
+        changed = {}
+        for y in range(height):
+            start = y * width
+            row = families[start:start + width]
+            if not any(row):
+                continue
+
+            above = families[start - width:start] if y > 0 else empty_row
+            below = families[start + width:start + 2 * width] if y < height - 1 else empty_row
+            for x, family in enumerate(row):
+                if family == 0:
+                    continue
+
+                mask = (
+                    (UP if above[x] == family else 0)
+                    | (RIGHT if x < width - 1 and row[x + 1] == family else 0)
+                    | (DOWN if below[x] == family else 0)
+                    | (LEFT if x > 0 and row[x - 1] == family else 0)
+                )
+                variants = self._variants[family][mask]
+                indexes[start + x] = changed[start + x] = variants[_get_position_hash(x, y) % len(variants)]
+
+        self.indexes = indexes
+        return changed
+
+    def _get_family(self, code: int) -> int:
+        family = self._family_codes.get(code)
+        if family is None:
+            family = self._family_codes[code] = self._families.get(code >> ID_SHIFT, 0)
+
+        return family
+
+    def _get_families(self) -> bytes:
+        # the family of every cell, looked up once per distinct code
+        codes = self.grid.codes
+        for code in set(codes).difference(self._family_codes):
+            self._get_family(code)
+
+        return bytes(map(self._family_codes.__getitem__, codes))
+
+    def _get_mask_variants(self, variants: dict[str, tuple[int, ...]], mask: int) -> tuple[int, ...]:
+        inner = variants["inner"]
+        has_above, has_below = bool(mask & UP), bool(mask & DOWN)
+        if not has_above and not has_below:
+            return variants.get("single", variants.get("top", inner))
+
+        if not has_above:
+            return variants.get("top", inner)
+
+        if not has_below:
+            return variants.get("bottom", inner)
+
+        return inner
@@ -47,6 +47,7 @@ class PixelData:
     offset: Vec2f
     team_from_alpha: bool = False
     angle_from_alpha: bool = False
+    bottom_anchored: bool = False # a column of the item is one item, saved at its bottom-most pixel
 
 @dataclass
 class CItem:
@@ -129,7 +130,8 @@ class CItem:
             colors=pixel_data.get("colors", {}),
             offset=Vec2f(offset.get("x", 0), offset.get("y", 0)),
             team_from_alpha=pixel_data.get("team_from_alpha", False),
-            angle_from_alpha=pixel_data.get("angle_from_alpha", False)
+            angle_from_alpha=pixel_data.get("angle_from_alpha", False),
+            bottom_anchored=pixel_data.get("bottom_anchored", False)
         )
 
         name_data = Name(
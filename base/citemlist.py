@@ -1,9 +1,12 @@
+import zlib
+from array import array
 from typing import Union
 
 from utils.config_handler import ConfigHandler
 from utils.file_handler import FileHandler
 from core.communicator import Communicator
 from base.citem import CItem
+from utils.profiler import StartupProfiler
 
 # indexes in KAG but will also use here to try to keep it similar,
 # can be changed later if its a problem
@@ -14,19 +17,30 @@ from base.citem import CItem
 #  500 = in front of solid tiles (and basically everything else except trees and spikes)
 # 1500 = in front of spikes
 
+# tiles are stored compactly as packed codes:
+# item id << 10 | rotation / 90 << 8 | team as an unsigned byte
+# code 0 is an empty cell
+ROTATION_SHIFT = 8
+ID_SHIFT = 10
+ROTATION_MASK = 3 << ROTATION_SHIFT
+TEAM_MASK = 0xFF
+
 class CItemList:
     def __init__(self) -> None:
         self.file_handler = FileHandler()
         self.config_handler = ConfigHandler()
 
-        self.vanilla_tiles: list[CItem] = self.__setup_tiles()
-        Communicator().picked_tiles = self.__get_selected_tiles()
-        self.vanilla_blobs: list[CItem] = self.__setup_blobs()
-        self.vanilla_others: list[CItem] = self.__setup_others()
+        profiler = StartupProfiler()
+
+        with profiler.phase("catalog parse"):
+            self.vanilla_tiles: list[CItem] = self.__setup_tiles()
+            Communicator().picked_tiles = self.__get_selected_tiles()
+            self.vanilla_blobs: list[CItem] = self.__setup_blobs()
+            self.vanilla_others: list[CItem] = self.__setup_others()
 
-        self.merge_items: list[CItem] = self.__setup_merge_items()
+            self.merge_items: list[CItem] = self.__setup_merge_items()
 
-        tiles, blobs, other = self.__setup_modded_items()
+            tiles, blobs, other = self.__setup_modded_items()
 
         self.modded_tiles: list[CItem] = tiles
         self.modded_blobs: list[CItem] = blobs
@@ -42,7 +56,21 @@ class CItemList:
         ]
         self.all_items = [item for sublist in all_items for item in sublist]
 
-        self.pixel_color_map: dict[tuple[int, int, int, int], CItem] = self.__create_pixel_color_map()
+        self.item_ids: dict[str, int] = self.__create_item_ids()
+        self._items_by_id: list[CItem] = [None] + self.all_items
+        self._decoded_items: dict[int, CItem] = {}
+        # items that are taller than one cell and saved at the bottom of their column, such as trees
+        self.bottom_anchored_ids: frozenset[int] = frozenset(
+            item_id for item_id, item in enumerate(self._items_by_id) if item is not None and item.pixel_data.bottom_anchored
+        )
+
+        with profiler.phase("color map build"):
+            self.pixel_color_map: dict[tuple[int, int, int, int], CItem] = self.__create_pixel_color_map()
+
+        with profiler.phase("merge table build"):
+            # the id of the item made by placing one item onto another, at placing id * stride + existing id
+            self._merge_stride = len(self._items_by_id)
+            self.merge_table: array = self.__create_merge_table()
 
         # TODO: magazine can support alpha for specific items
         # TODO: add below items
@@ -101,14 +129,76 @@ class CItemList:
         return False
 
     def get_item_by_name(self, name: str) -> CItem:
-        name = str(name)
-        for item in self.all_items:
-            if item.name_data.name == name:
-                return item
+        return self.get_item_by_id(self.get_item_id(name))
 
     def get_item_by_color(self, color: tuple[int, int, int, int]) -> CItem:
         return self.pixel_color_map.get(color)
 
+    def get_item_id(self, name: str) -> int:
+        """
+        Returns the id of the item with the given name, or 0 if it doesn't exist.
+        """
+        return self.item_ids.get(str(name), 0)
+
+    def get_item_by_id(self, item_id: int) -> CItem:
+        if 0 < item_id < len(self._items_by_id):
+            return self._items_by_id[item_id]
+
+        return None
+
+    def get_merge_result(self, placing_id: int, existing_id: int) -> int:
+        """
+        Returns the id of the item made by placing an item onto another, or 0 if they don't merge.
+        """
+        if 0 < placing_id < self._merge_stride and 0 < existing_id < self._merge_stride:
+            return self.merge_table[placing_id * self._merge_stride + existing_id]
+
+        return 0
+
+    def get_fingerprint(self) -> int:
+        """
+        Returns a checksum of the item ids, which changes whenever codes from encode_item would.
+        """
+        names = sorted(self.item_ids, key=self.item_ids.get)
+        return zlib.crc32("\n".join(names).encode("utf-8"))
+
+    def encode_item(self, item: CItem) -> int:
+        """
+        Packs the item, its rotation and its team into a single code.
+        """
+        if item is None:
+            return 0
+
+        item_id = self.get_item_id(item.name_data.name)
+        if item_id == 0:
+            return 0
+
+        rotation = (item.sprite.rotation // 90) & 3
+        team = item.sprite.team & 0xFF
+        return (item_id << ID_SHIFT) | (rotation << ROTATION_SHIFT) | team
+
+    def decode_item(self, code: int) -> CItem:
+        """
+        Returns a new item from a code made by encode_item, or None for an empty cell.
+        """
+        item = self._decoded_items.get(code)
+        if item is None:
+            base_item = self.get_item_by_id(code >> ID_SHIFT)
+            if base_item is None:
+                return None
+
+            item = base_item.copy()
+            item.sprite.rotation = ((code >> ROTATION_SHIFT) & 3) * 90
+
+            team = code & 0xFF
+            team = team - 256 if team > 127 else team
+            if team != item.sprite.team:
+                item.swap_team(team)
+
+            self._decoded_items[code] = item
+
+        return item.copy()
+
     def __setup_modded_items(self) -> tuple[list[CItem], list[CItem], list[CItem]]:
         fh, ch = FileHandler(), ConfigHandler()
         items = fh.get_modded_items_paths()
@@ -126,6 +216,36 @@ class CItemList:
 
         return tiles, blobs, other
 
+    def __create_item_ids(self) -> dict[str, int]:
+        item_ids = {}
+        for index, item in enumerate(self.all_items):
+            # the first item with a name wins, same as get_item_by_name
+            item_ids.setdefault(item.name_data.name, index + 1)
+
+        return item_ids
+
+    def __create_merge_table(self) -> array:
+        stride = self._merge_stride
+        table = array('I', bytes(4 * stride * stride))
+
+        # what the placed item merges into comes first, then what the existing item merges into
+        for placing_first in (True, False):
+            for item_id, item in enumerate(self._items_by_id):
+                if item is None:
+                    continue
+
+                for other_name, result_name in item.sprite.properties.merges_with.items():
+                    other_id = self.get_item_id(other_name)
+                    result_id = self.get_item_id(result_name)
+                    if other_id == 0 or result_id == 0:
+                        continue
+
+                    index = item_id * stride + other_id if placing_first else other_id * stride + item_id
+                    if table[index] == 0:
+                        table[index] = result_id
+
+        return table
+
     def __create_pixel_color_map(self) -> dict[tuple[int, int, int, int], CItem]:
         color_map = {}
 
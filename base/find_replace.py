@@ -0,0 +1,138 @@
+"""
+Finds every cell holding a kind of item, used to replace one material with another across the map.
+"""
+from array import array
+from itertools import compress
+
+from base.citem import CItem
+from base.citemlist import CItemList, ID_SHIFT, ROTATION_MASK, ROTATION_SHIFT, TEAM_MASK
+from base.tile_grid import TileGrid
+
+# how cells are matched against the item being searched for
+MATCH_ITEM = "same item"
+MATCH_TYPE = "same type" # any item of the same type (tile, blob, ...)
+MATCH_COLOR = "same color" # any item saved as the same map color, ignoring team and rotation
+MATCH_MODES = (MATCH_ITEM, MATCH_TYPE, MATCH_COLOR)
+
+def find_cells(grid: TileGrid, item_list: CItemList, target: int, mode: str = MATCH_ITEM,
+               team: int = None, rotation: int = None, region: tuple[int, int, int, int] = None) -> array:
+    """
+    Finds the cells that match an item. Each distinct code is checked once,
+    then every row is matched as a mask.
+
+    Args:
+        grid (TileGrid): The grid to search.
+        item_list (CItemList): Used to look up items.
+        target (int): The code of the item to look for (see CItemList.encode_item).
+        mode (str): One of MATCH_MODES.
+        team (int): Only match cells of this team, or None for any team.
+        rotation (int): Only match cells with this rotation in degrees, or None for any rotation.
+        region (tuple[int, int, int, int]): Only search the (left, top, right, bottom) cells, or None for the whole map.
+
+    Returns:
+        array: The matching cell indexes, in order.
+    """
+    if target == 0:
+        return array('I')
+
+    matches = _get_matcher(target, mode, item_list)
+
+    def is_match(code: int) -> bool:
+        if code == 0 or not matches(code):
+            return False
+
+        if team is not None and _get_team(code) != team:
+            return False
+
+        return rotation is None or ((code & ROTATION_MASK) >> ROTATION_SHIFT) * 90 == rotation % 360
+
+    width = grid.width
+    left, top, right, bottom = region if region is not None else (0, 0, width - 1, grid.height - 1)
+    left, top = max(left, 0), max(top, 0)
+    right, bottom = min(right, width - 1), min(bottom, grid.height - 1)
+
+    found = array('I')
+    lookup = {}
+    for y in range(top, bottom + 1):
+        start = y * width + left
+        row = grid.codes[start:y * width + right + 1]
+
+        for code in set(row).difference(lookup):
+            lookup[code] = is_match(code)
+
+        mask = bytes(map(lookup.__getitem__, row))
+        if any(mask):
+            found.extend(compress(range(start, start + len(row)), mask))
+
+    return found
+
+def get_replacement_codes(grid: TileGrid, item_list: CItemList, indexes, replacement: CItem) -> array:
+    """
+    Returns the codes that replace cells with another item.
+    The replacement keeps the rotation and team of each cell where it can rotate or swap teams.
+
+    Args:
+        grid (TileGrid): The grid the cells are in.
+        item_list (CItemList): Used to look up items.
+        indexes: The cell indexes to replace.
+        replacement (CItem): The item to replace with, erasers clear the cells.
+
+    Returns:
+        array: The new code of each cell.
+    """
+    if replacement is None or replacement.is_eraser():
+        return array('I', bytes(4 * len(indexes)))
+
+    base_code = item_list.encode_item(replacement)
+    properties = replacement.sprite.properties
+
+    replaced = {}
+    codes = array('I')
+    for index in indexes:
+        code = grid.codes[index]
+        if code not in replaced:
+            new_code = base_code
+            if properties.is_rotatable:
+                new_code = (new_code & ~ROTATION_MASK) | (code & ROTATION_MASK)
+
+            item = item_list.get_item_by_id(code >> ID_SHIFT)
+            if properties.can_swap_teams and item is not None and item.sprite.properties.can_swap_teams:
+                new_code = (new_code & ~TEAM_MASK) | (code & TEAM_MASK)
+
+            replaced[code] = new_code
+
+        codes.append(replaced[code])
+
+    return codes
+
+def _get_matcher(target: int, mode: str, item_list: CItemList):
+    if mode == MATCH_ITEM:
+        target_id = target >> ID_SHIFT
+        return lambda code: code >> ID_SHIFT == target_id
+
+    if mode == MATCH_TYPE:
+        target_type = _get_type(target, item_list)
+        return lambda code: _get_type(code, item_list) == target_type
+
+    if mode == MATCH_COLOR:
+        target_color = _get_color(target, item_list)
+        return lambda code: target_color is not None and _get_color(code, item_list) == target_color
+
+    raise ValueError(f"Unknown match mode: {mode}")
+
+def _get_team(code: int) -> int:
+    team = code & TEAM_MASK
+    return team - 256 if team > 127 else team
+
+def _get_type(code: int, item_list: CItemList) -> str:
+    item = item_list.get_item_by_id(code >> ID_SHIFT)
+    return item.type if item is not None else None
+
+def _get_color(code: int, item_list: CItemList) -> tuple[int, int, int]:
+    # the rgb part of the map color, the alpha channel only holds the team and rotation
+    item = item_list.get_item_by_id(code >> ID_SHIFT)
+    if item is None:
+        return None
+
+    color = item.get_color(((code & ROTATION_MASK) >> ROTATION_SHIFT) * 90, _get_team(code))
+    return tuple(color[1:]) if color is not None else None
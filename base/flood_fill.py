@@ -0,0 +1,107 @@
+"""
+Finds the connected region of cells to fill with the bucket tool.
+"""
+from array import array
+
+from base.citemlist import CItemList, ID_SHIFT
+from base.tile_grid import TileGrid
+
+# what stops the fill from spreading
+SAME_ITEM = "same item" # spreads over the same item as the starting cell
+SAME_TYPE = "same type" # spreads over items of the same type (tile, blob, ...) as the starting cell
+ANY_NON_EMPTY = "any non-empty" # spreads over empty cells, or over any item when started on one
+BOUNDARY_MODES = (SAME_ITEM, SAME_TYPE, ANY_NON_EMPTY)
+
+# fills larger than this are most likely a mistake, such as filling the sky of a whole map
+DEFAULT_MAX_AREA = 250000
+
+def flood_fill(grid: TileGrid, x: int, y: int, mode: str = SAME_ITEM,
+               max_area: int = DEFAULT_MAX_AREA, item_list: CItemList = None) -> array:
+    """
+    Finds the cells connected to a starting cell with a scanline fill,
+    working on whole horizontal spans of cells at a time.
+
+    Args:
+        grid (TileGrid): The grid to fill.
+        x (int): The x position of the starting cell.
+        y (int): The y position of the starting cell.
+        mode (str): One of BOUNDARY_MODES.
+        max_area (int): The most cells the fill can cover.
+        item_list (CItemList): Used to look up item types, required for SAME_TYPE.
+
+    Returns:
+        array: The cell indexes of the region, or None if it is larger than max_area.
+    """
+    if not grid.in_bounds(x, y):
+        return array('I')
+
+    codes = grid.codes
+    width = grid.width
+    start = grid.index(x, y)
+    matches = _get_matcher(codes[start], mode, item_list)
+
+    # 1 for every cell the fill can still spread to, looked up once per distinct code
+    lookup = {code: matches(code) for code in set(codes)}
+    open_cells = bytearray(map(lookup.__getitem__, codes))
+
+    region = array('I')
+    stack = [start]
+    while stack:
+        index = stack.pop()
+        if not open_cells[index]:
+            continue
+
+        # grow the span left and right until it hits a boundary or the edge of the map
+        row = index - index % width
+        row_end = row + width
+        left = open_cells.rfind(0, row, index)
+        left = row if left == -1 else left + 1
+
+        right = open_cells.find(0, index, row_end)
+        if right == -1:
+            right = row_end
+
+        open_cells[left:right] = bytes(right - left)
+        region.extend(range(left, right))
+        if len(region) > max_area:
+            return None
+
+        # queue the start of every open span touching this one in the rows above and below
+        for offset in (-width, width):
+            span_start = left + offset
+            span_end = right + offset
+            if span_start < 0 or span_end > len(open_cells):
+                continue
+
+            found = open_cells.find(1, span_start, span_end)
+            while found != -1:
+                stack.append(found)
+                gap = open_cells.find(0, found, span_end)
+                if gap == -1:
+                    break
+
+                found = open_cells.find(1, gap, span_end)
+
+    return region
+
+def _get_matcher(start_code: int, mode: str, item_list: CItemList):
+    if mode == SAME_ITEM:
+        start_id = start_code >> ID_SHIFT
+        return lambda code: code >> ID_SHIFT == start_id
+
+    if mode == SAME_TYPE:
+        if start_code == 0:
+            return lambda code: code == 0
+
+        start_type = _get_type(start_code, item_list)
+        return lambda code: code != 0 and _get_type(code, item_list) == start_type
+
+    if mode == ANY_NON_EMPTY:
+        start_empty = start_code == 0
+        return lambda code: (code == 0) == start_empty
+
+    raise ValueError(f"Unknown fill boundary mode: {mode}")
+
+def _get_type(code: int, item_list: CItemList) -> str:
+    item = item_list.get_item_by_id(code >> ID_SHIFT)
+    return item.type if item is not None else None
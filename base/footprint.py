@@ -0,0 +1,234 @@
+"""
+Keeps track of which cells each item's sprite covers, so big blobs can be found from any of their cells.
+"""
+import math
+
+from base.citemlist import CItemList, ID_SHIFT, ROTATION_MASK, ROTATION_SHIFT
+from base.tile_grid import GridListener, TileGrid
+
+class FootprintIndex(GridListener):
+    """
+    Maps every cell covered by a sprite larger than one cell to the cell the item is placed at (its anchor).
+    The footprint of an item is worked out from its sprite size and offset, the same way the renderer places it,
+    and holds every cell whose center is under the sprite, as well as the anchor itself.
+    """
+    def __init__(self, grid: TileGrid, item_list: CItemList, grid_spacing: int, scale: int) -> None:
+        self.grid = grid
+        self.item_list = item_list
+        self.grid_spacing = grid_spacing
+        self.scale = scale
+        # cell index -> anchors of the big items covering it
+        self._covering: dict[int, list[int]] = {}
+        # code -> (left, top, right, bottom) cells relative to the anchor, or None for single cell items
+        self._footprints: dict[int, tuple[int, int, int, int]] = {0: None}
+        self._depths: dict[int, int] = {}
+        grid.add_listener(self)
+        self.grid_reset(grid)
+
+    def cells_changed(self, indexes, old, new) -> None:
+        footprints = self._footprints
+        codes = set(old).union(new)
+        for code in codes.difference(footprints):
+            self.get_footprint(code)
+
+        # most batches only hold items that cover their own cell
+        if all(footprints[code] is None for code in codes):
+            return
+
+        for index, old_code, new_code in zip(indexes, old, new):
+            if old_code == new_code:
+                continue
+
+            if footprints[old_code] is not None:
+                self._remove(index, footprints[old_code])
+            if footprints[new_code] is not None:
+                self._add(index, footprints[new_code])
+
+    def cell_changed(self, index: int, old: int, new: int) -> None:
+        self.cells_changed((index,), (old,), (new,))
+
+    def grid_reset(self, grid: TileGrid) -> None:
+        self._covering.clear()
+        footprints = self._footprints
+        for index, code in enumerate(grid.codes):
+            if code == 0:
+                continue
+
+            if code not in footprints:
+                self.get_footprint(code)
+            if footprints[code] is not None:
+                self._add(index, footprints[code])
+
+    def get_footprint(self, code: int) -> tuple[int, int, int, int]:
+        """
+        Returns the cells an item's sprite covers.
+
+        Args:
+            code (int): The code of the item (see CItemList.encode_item).
+
+        Returns:
+            tuple[int, int, int, int]: The (left, top, right, bottom) cells relative to the anchor,
+                or None if the item only covers its own cell.
+        """
+        if code in self._footprints:
+            return self._footprints[code]
+
+        item = self.item_list.get_item_by_id(code >> ID_SHIFT)
+        image = item.sprite.image if item is not None else None
+        if image is None:
+            self._footprints[code] = None
+            return None
+
+        # the sprite's rectangle in the scene, relative to the anchor's top left corner
+        scale, spacing = self.scale, self.grid_spacing
+        width, height = image.width() * scale, image.height() * scale
+        left, top = 0, 0
+        rotation = ((code & ROTATION_MASK) >> ROTATION_SHIFT) * 90 if item.sprite.properties.is_rotatable else 0
+        if rotation in (90, 270):
+            width, height = height, width
+            left += (height - width) / 2
+            top += (width - height) / 2
+
+        offset_x, offset_y = item.sprite.offset
+        left, top = left + offset_x, top + offset_y
+        right, bottom = left + width, top + height
+
+        # the first and last cell centers under the sprite, always including the anchor
+        first_x = min(math.ceil(left / spacing - 0.5), 0)
+        first_y = min(math.ceil(top / spacing - 0.5), 0)
+        last_x = max(math.floor(right / spacing - 0.5), 0)
+        last_y = max(math.floor(bottom / spacing - 0.5), 0)
+
+        footprint = (first_x, first_y, last_x, last_y)
+        self._footprints[code] = footprint if footprint != (0, 0, 0, 0) else None
+        return self._footprints[code]
+
+    def get_cells(self, anchor: int, code: int = None) -> list[int]:
+        """
+        Returns the cells an item placed at a cell covers, clipped to the grid.
+
+        Args:
+            anchor (int): The cell index the item is placed at.
+            code (int): The code of the item, or None for the item at the cell.
+
+        Returns:
+            list[int]: The covered cell indexes.
+        """
+        if code is None:
+            code = self.grid.codes[anchor]
+
+        bounds = self.get_bounds(anchor, code)
+        if bounds is None:
+            return []
+
+        width = self.grid.width
+        left, top, right, bottom = bounds
+        return [y * width + x for y in range(top, bottom + 1) for x in range(left, right + 1)]
+
+    def get_bounds(self, anchor: int, code: int = None) -> tuple[int, int, int, int]:
+        """
+        Returns the (left, top, right, bottom) cells an item placed at a cell covers, clipped to the grid.
+        Empty cells have no bounds and return None.
+        """
+        if code is None:
+            code = self.grid.codes[anchor]
+
+        if code == 0:
+            return None
+
+        x, y = self.grid.position(anchor)
+        footprint = self.get_footprint(code) or (0, 0, 0, 0)
+        left, top, right, bottom = footprint
+        return (
+            max(x + left, 0), max(y + top, 0),
+            min(x + right, self.grid.width - 1), min(y + bottom, self.grid.height - 1)
+        )
+
+    def get_owner(self, index: int) -> int:
+        """
+        Returns the anchor of the item shown on top at a cell, which is either the cell itself
+        or a big item covering it.
+
+        Args:
+            index (int): The cell index.
+
+        Returns:
+            int: The anchor cell index, or -1 if nothing covers the cell.
+        """
+        anchors = self._covering.get(index)
+        if not anchors:
+            return index if self.grid.codes[index] != 0 else -1
+
+        codes = self.grid.codes
+        owner = index if codes[index] != 0 else -1
+        for anchor in anchors:
+            if owner == -1 or self._get_depth(codes[anchor]) > self._get_depth(codes[owner]):
+                owner = anchor
+
+        return owner
+
+    def get_anchors(self, index: int) -> list[int]:
+        """
+        Returns the anchors of every big item covering a cell.
+        """
+        return list(self._covering.get(index, ()))
+
+    def get_overlaps(self, anchor: int, code: int) -> set[int]:
+        """
+        Returns the big items that an item placed at a cell would overlap.
+        The item already at the cell isn't counted, since placing replaces it.
+
+        Args:
+            anchor (int): The cell index the item would be placed at.
+            code (int): The code of the item.
+
+        Returns:
+            set[int]: The anchors of the overlapped items.
+        """
+        overlaps = set()
+        covering = self._covering
+        for index in self.get_cells(anchor, code) or (anchor,):
+            if index in covering:
+                overlaps.update(covering[index])
+
+        overlaps.discard(anchor)
+        return overlaps
+
+    def _add(self, anchor: int, footprint: tuple[int, int, int, int]) -> None:
+        covering = self._covering
+        for index in self._get_covered(anchor, footprint):
+            if index in covering:
+                covering[index].append(anchor)
+            else:
+                covering[index] = [anchor]
+
+    def _remove(self, anchor: int, footprint: tuple[int, int, int, int]) -> None:
+        covering = self._covering
+        for index in self._get_covered(anchor, footprint):
+            anchors = covering.get(index)
+            if anchors is None or anchor not in anchors:
+                continue
+
+            anchors.remove(anchor)
+            if not anchors:
+                del covering[index]
+
+    def _get_covered(self, anchor: int, footprint: tuple[int, int, int, int]) -> list[int]:
+        width, height = self.grid.width, self.grid.height
+        x, y = anchor % width, anchor // width
+        left, top, right, bottom = footprint
+        first_x, last_x = max(x + left, 0), min(x + right, width - 1)
+
+        covered = []
+        for row in range(max(y + top, 0), min(y + bottom, height - 1) + 1):
+            start = row * width
+            covered.extend(range(start + first_x, start + last_x + 1))
+
+        return covered
+
+    def _get_depth(self, code: int) -> int:
+        if code not in self._depths:
+            item = self.item_list.get_item_by_id(code >> ID_SHIFT)
+            self._depths[code] = item.sprite.z if item is not None else 0
+
+        return self._depths[code]
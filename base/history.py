@@ -0,0 +1,179 @@
+"""
+Handles the undo / redo history of the canvas.
+"""
+from array import array
+from itertools import compress
+from operator import ne
+
+# memory budget of the whole history (undo and redo) in bytes
+DEFAULT_HISTORY_BYTES = 32 * 1024 * 1024
+
+class Transaction:
+    """
+    A group of tile changes that are undone and redone together, such as a single stroke.
+    Changes are stored as compact arrays of (cell index, old code, new code).
+    """
+    __slots__ = ("cells", "old", "new")
+
+    def __init__(self) -> None:
+        self.cells = array('I')
+        self.old = array('I')
+        self.new = array('I')
+
+    def record(self, index: int, old: int, new: int) -> None:
+        self.cells.append(index)
+        self.old.append(old)
+        self.new.append(new)
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    @property
+    def nbytes(self) -> int:
+        return (len(self.cells) * self.cells.itemsize
+                + len(self.old) * self.old.itemsize
+                + len(self.new) * self.new.itemsize)
+
+    def undo_changes(self) -> tuple[array, array]:
+        """
+        Returns the cells and codes to apply to undo this transaction, in order.
+        """
+        cells, old = array('I', self.cells), array('I', self.old)
+        cells.reverse()
+        old.reverse()
+        return cells, old
+
+    def redo_changes(self) -> tuple[array, array]:
+        """
+        Returns the cells and codes to apply to redo this transaction, in order.
+        """
+        return self.cells, self.new
+
+class EditHistory:
+    """
+    Stores transactions for undo and redo, bounded by memory instead of entry count.
+    """
+    def __init__(self, max_bytes: int = DEFAULT_HISTORY_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self._undo_stack: list[Transaction] = []
+        self._redo_stack: list[Transaction] = []
+        self._current: Transaction = None
+        self._nbytes = 0
+
+    def begin(self) -> None:
+        """
+        Starts a new transaction, committing the previous one if it is still open.
+        """
+        self.commit()
+        self._current = Transaction()
+
+    def record(self, index: int, old: int, new: int) -> None:
+        """
+        Records a single tile change into the open transaction.
+        Changes made outside of a transaction are committed on their own.
+
+        Args:
+            index (int): The cell index of the change.
+            old (int): The code of the cell before the change.
+            new (int): The code of the cell after the change.
+        """
+        if old == new:
+            return
+
+        if self._current is None:
+            self.begin()
+            self._current.record(index, old, new)
+            self.commit()
+            return
+
+        self._current.record(index, old, new)
+
+    def record_many(self, cells, old, new) -> None:
+        """
+        Records several tile changes into the open transaction.
+        Changes made outside of a transaction are committed together as their own.
+
+        Args:
+            cells: The cell index of each change.
+            old: The code of each cell before the change.
+            new: The code of each cell after the change.
+        """
+        opened = self._current is None
+        if opened:
+            self.begin()
+
+        transaction = self._current
+        changed = list(map(ne, old, new))
+        transaction.cells.extend(compress(cells, changed))
+        transaction.old.extend(compress(old, changed))
+        transaction.new.extend(compress(new, changed))
+
+        if opened:
+            self.commit()
+
+    def commit(self) -> Transaction:
+        """
+        Closes the open transaction and pushes it onto the undo stack.
+
+        Returns:
+            Transaction: The committed transaction, or None if nothing was recorded.
+        """
+        transaction, self._current = self._current, None
+        if transaction is None or len(transaction) == 0:
+            return None
+
+        # new changes invalidate anything that was undone
+        self._nbytes -= sum(t.nbytes for t in self._redo_stack)
+        self._redo_stack.clear()
+        self._undo_stack.append(transaction)
+        self._nbytes += transaction.nbytes
+        self._trim()
+        return transaction
+
+    def undo(self) -> Transaction:
+        """
+        Moves the latest transaction onto the redo stack.
+
+        Returns:
+            Transaction: The transaction to undo, or None if there is nothing to undo.
+        """
+        self.commit()
+        if not self._undo_stack:
+            return None
+
+        transaction = self._undo_stack.pop()
+        self._redo_stack.append(transaction)
+        return transaction
+
+    def redo(self) -> Transaction:
+        """
+        Moves the latest undone transaction back onto the undo stack.
+
+        Returns:
+            Transaction: The transaction to redo, or None if there is nothing to redo.
+        """
+        self.commit()
+        if not self._redo_stack:
+            return None
+
+        transaction = self._redo_stack.pop()
+        self._undo_stack.append(transaction)
+        return transaction
+
+    def clear(self) -> None:
+        """
+        Removes every transaction, used when the cell indexes are no longer valid.
+        """
+        self._undo_stack.clear()
+        self._redo_stack.clear()
+        self._current = None
+        self._nbytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def _trim(self) -> None:
+        # always keep the latest transaction, even if it is over budget on its own
+        while self._nbytes > self.max_bytes and len(self._undo_stack) > 1:
+            self._nbytes -= self._undo_stack.pop(0).nbytes
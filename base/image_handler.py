@@ -9,6 +9,7 @@ from PIL import Image
 from PyQt6.QtGui import QPixmap, QImage
 from PyQt6.QtCore import QBuffer, QByteArray
 from utils.file_handler import FileHandler
+from utils.profiler import StartupProfiler
 import colorsys
 import io
 
@@ -43,6 +44,7 @@ class ImageHandler(metaclass=SingletonMeta):
     """
     def __init__(self) -> None:
         self._file_handler = FileHandler()
+        self._profiler = StartupProfiler()
         self._vanilla_images = {}
         self._modded_images = {}
 
@@ -140,15 +142,16 @@ class ImageHandler(metaclass=SingletonMeta):
         if not path or not self._file_handler.does_path_exist(path):
             return None
 
-        image = Image.open(path).convert("RGBA")
+        with self._profiler.phase("sprite decode"):
+            image = Image.open(path).convert("RGBA")
 
-        width = image.size[0]
-        tile_size = width // 8
+            width = image.size[0]
+            tile_size = width // 8
 
-        x = (index % tile_size) * 8
-        y = (index // tile_size) * 8
+            x = (index % tile_size) * 8
+            y = (index // tile_size) * 8
 
-        image = image.crop((x, y, x + 8, y + 8)).toqpixmap()
+            image = image.crop((x, y, x + 8, y + 8)).toqpixmap()
 
         self._cache_image_by_index(image, world_path, index)
         return image
@@ -194,8 +197,7 @@ class ImageHandler(metaclass=SingletonMeta):
 
         for path in paths:
             if os.path.exists(path):
-                image = Image.open(path).convert("RGBA").toqpixmap()
-                image = self._swap_sprite_color(image, team)
+                image = self._decode_sprite(path, team)
                 self._modded_images[team][name] = image
                 return image
 
@@ -204,8 +206,7 @@ class ImageHandler(metaclass=SingletonMeta):
         for root, _, files in os.walk(mod_path):
             if image_filename in files:
                 full_path = os.path.join(root, image_filename)
-                image = Image.open(full_path).convert("RGBA").toqpixmap()
-                image = self._swap_sprite_color(image, team)
+                image = self._decode_sprite(full_path, team)
                 self._modded_images[team][name] = image
                 return image
 
@@ -214,8 +215,7 @@ class ImageHandler(metaclass=SingletonMeta):
 
         img_path = os.path.join(base_path, f"{name}.png")
         if os.path.exists(img_path):
-            image = Image.open(img_path).convert("RGBA").toqpixmap()
-            image = self._swap_sprite_color(image, team)
+            image = self._decode_sprite(img_path, team)
             self._vanilla_images[team][name] = image
             return image
 
@@ -225,6 +225,13 @@ class ImageHandler(metaclass=SingletonMeta):
 
         return None
 
+    def _decode_sprite(self, path: str, team: int) -> QPixmap:
+        # the only place sprite files are decoded, so each decode is timed once
+        # world.png tiles are timed in _get_image_by_index
+        with self._profiler.phase("sprite decode"):
+            image = Image.open(path).convert("RGBA").toqpixmap()
+            return self._swap_sprite_color(image, team)
+
     def _get_world_path(self, world_path: str) -> str:
         if not world_path:
             return None
@@ -1,5 +1,5 @@
-import inspect
 import os
+from array import array
 from tkinter import filedialog
 import re
 
@@ -8,16 +8,25 @@ from PIL import Image
 from PyQt6.QtWidgets import QLabel, QLineEdit, QVBoxLayout, QHBoxLayout, QPushButton, QDialog
 
 from base.citemlist import CItemList
+from base.map_writer import (
+    ARCHIVAL_PROFILE, EncodeProfile, MapSnapshot, SaveJob, SaveSignals, collapse_columns, encode_map, get_save_pool, write_png
+)
 from core.communicator import Communicator
 from utils.vec2f import Vec2f
 from utils.file_handler import FileHandler
 
+# what each file written this session holds: path -> (revision, grid state, mtime, size)
+_saved_files: dict[str, tuple[int, tuple, int, int]] = {}
+
 class KagImage:
     def __init__(self) -> None:
         self.communicator = Communicator()
         self.last_saved_location = None
         self.item_list = CItemList()
         self.file_handler = FileHandler()
+        # forwards the progress of background saves to the UI
+        self.signals = SaveSignals()
+        self._save_jobs = set()
 
     def new_map(self) -> None:
         """
@@ -49,7 +58,24 @@ class KagImage:
         else:
             print("New map creation cancelled.")
 
-    def save_map(self, fp: str = None, force_ask: bool = False) -> None:
+    def save_map(self, fp: str = None, force_ask: bool = False, background: bool = True, on_saved: callable = None,
+                 profile: EncodeProfile = ARCHIVAL_PROFILE) -> None:
+        """
+        Saves the map as a KAG map image.
+
+        The tile grid is copied on the calling thread, then encoded and written
+        on a worker thread so editing can continue while the save is in flight.
+
+        Args:
+            fp (str): The path to save to, asks for one if not given and the map hasn't been saved before.
+            force_ask (bool): Whether to always ask for a path.
+            background (bool): Whether to save on a worker thread, otherwise blocks until written.
+            on_saved (callable): Called with the path once the map has been written.
+            profile (EncodeProfile): The encoder settings, FAST_PROFILE for test launches and autosaves.
+
+        Returns:
+            None
+        """
         if self.last_saved_location is not None and not force_ask and fp is None:
             fp = self.last_saved_location
 
@@ -62,44 +88,98 @@ class KagImage:
 
         fp = fp.strip()
 
-        canvas = self.communicator.get_canvas()
-        tilemap = self._get_translated_tilemap(canvas.tilemap)
-        sky = self.argb_to_rgba(self.item_list.get_item_by_name("sky").get_color())
-        image = Image.new("RGBA", size=(canvas.size.x, canvas.size.y), color=sky)
+        grid = self.communicator.get_canvas().grid
+        if self.is_saved(fp):
+            print(f"Map unchanged since it was saved to: {fp}")
+            self.last_saved_location = fp
+            if on_saved is not None:
+                on_saved(fp)
+            return
 
-        for pos, item in tilemap.items():
-            if item is None or pos is None:
+        snapshot = MapSnapshot(grid.width, grid.height, grid.snapshot())
+        state = (grid.revision, grid.get_state())
+
+        if not background:
+            try:
+                write_png(encode_map(snapshot, self.item_list), fp, profile)
+
+            except (OSError, ValueError) as e:
+                print(f"Failed to save image: {e}")
+                return
+
+            self._remember_saved_file(fp, state)
+            self._on_save_finished(fp, on_saved)
+            return
+
+        job = SaveJob(snapshot, fp, self.item_list, profile)
+        job.setAutoDelete(False)
+        job.signals.progress.connect(self.signals.progress.emit)
+        job.signals.finished.connect(lambda path: self._remember_saved_file(path, state))
+        job.signals.finished.connect(lambda path: self._on_save_finished(path, on_saved, job))
+        job.signals.failed.connect(lambda path, error: self._on_save_failed(path, error, job))
+
+        self._save_jobs.add(job)
+        get_save_pool().start(job)
+
+    def is_saved(self, fp: str = None) -> bool:
+        """
+        Checks whether a file written this session still holds the current map.
+
+        Args:
+            fp (str): The file to check, or None to check every file written this session.
+
+        Returns:
+            bool: True if the map doesn't need to be saved again.
+        """
+        grid = self.communicator.get_canvas().grid
+        paths = list(_saved_files) if fp is None else [os.path.abspath(fp)]
+
+        for path in paths:
+            saved = _saved_files.get(path)
+            if saved is None:
                 continue
 
-            rotation = item.sprite.rotation
-            team = item.sprite.team
-            color = item.get_color(rotation, team)
-
-            if color is None:
-                color = item.get_color(rotation, team, True)
-                if color is None:
-                    linenum = inspect.currentframe().f_lineno
-                    path = os.path.basename(__file__)
-                    # todo: should be 'raise' but we dont have all the sprites yet
-                    print(f"Item not found: '{item.name_data.name}' | Unable to load in line {linenum} of {path} from mod: {item.mod_info.folder_name}")
-                    continue
+            revision, state, mtime, size = saved
+            try:
+                stat = os.stat(path)
+
+            except OSError:
+                continue
 
-            offset_x, offset_y = item.pixel_data.offset
-            width, height = canvas.size
+            # the file was changed by something else
+            if stat.st_mtime_ns != mtime or stat.st_size != size:
+                continue
 
-            # clamp coords to map size
-            final_x = min(max(pos.x + offset_x, 0), width - 1)
-            final_y = min(max(pos.y + offset_y, 0), height - 1)
+            if revision == grid.revision or state == grid.get_state():
+                return True
 
-            image.putpixel((final_x, final_y), self.argb_to_rgba(color))
+        return False
 
+    def _remember_saved_file(self, fp: str, state: tuple[int, tuple]) -> None:
+        path = os.path.abspath(fp)
         try:
-            image.save(fp)
-            print(f"Map saved to: {fp}")
-            self.last_saved_location = fp
+            stat = os.stat(path)
+
+        except OSError:
+            _saved_files.pop(path, None)
+            return
+
+        revision, grid_state = state
+        _saved_files[path] = (revision, grid_state, stat.st_mtime_ns, stat.st_size)
+
+    def _on_save_finished(self, fp: str, on_saved: callable = None, job: SaveJob = None) -> None:
+        self._save_jobs.discard(job)
+        print(f"Map saved to: {fp}")
+        self.last_saved_location = fp
+        self.signals.finished.emit(fp)
 
-        except FileNotFoundError as e:
-            print(f"Failed to save image: {e}")
+        if on_saved is not None:
+            on_saved(fp)
+
+    def _on_save_failed(self, fp: str, error: str, job: SaveJob = None) -> None:
+        self._save_jobs.discard(job)
+        print(f"Failed to save image: {error}")
+        self.signals.failed.emit(fp, error)
 
     def load_map(self) -> None:
         fp = self._ask_location("Load Map", self.file_handler.get_maps_path(), False)
@@ -118,11 +198,28 @@ class KagImage:
             raise FileNotFoundError(f"File not found: {fp}")
 
         canvas = self.communicator.get_canvas()
+        snapshot = self.read_map(fp)
+
+        self.last_saved_location = fp
+
+        canvas.resize_canvas(Vec2f(snapshot.width, snapshot.height), codes=snapshot.codes)
+        canvas.recenter_canvas()
+
+    def read_map(self, fp: str) -> MapSnapshot:
+        """
+        Reads a KAG map image into tile codes.
+
+        Args:
+            fp (str): The path of the map image.
+
+        Returns:
+            MapSnapshot: The size and tile codes of the map.
+        """
         tilemap = Image.open(fp).convert("RGBA")
 
         width, height = tilemap.size
 
-        new_tilemap = {}
+        codes = array('I', bytes(4 * width * height))
         for x in range(width):
             for y in range(height):
                 pixel = self.rgba_to_argb(tilemap.getpixel((x, y)))
@@ -138,8 +235,6 @@ class KagImage:
                 if name == "sky" or name is None:
                     continue
 
-                item.sprite.position = Vec2f(x, y)
-
                 alpha = pixel[0]
                 # team from alpha channel
                 if item.pixel_data.team_from_alpha:
@@ -158,13 +253,9 @@ class KagImage:
                 final_x = min(max(x + offset_x, 0), width - 1)
                 final_y = min(max(y + offset_y, 0), height - 1)
 
-                new_tilemap[Vec2f(final_x, final_y)] = item
-
-        self.last_saved_location = fp
+                codes[int(final_y) * width + int(final_x)] = self.item_list.encode_item(item)
 
-        new_tilemap = self._get_translated_tilemap(new_tilemap)
-        canvas.resize_canvas(Vec2f(width, height), new_tilemap)
-        canvas.recenter_canvas()
+        return MapSnapshot(width, height, collapse_columns(codes, width, self.item_list))
 
     def argb_to_rgba(self, argb: tuple) -> tuple:
         a, r, g, b = argb
@@ -213,32 +304,6 @@ class KagImage:
 
         return file_path
 
-    # required because trees can be multiple blocks tall
-    def _get_translated_tilemap(self, tilemap: dict) -> dict:
-        if tilemap is None:
-            print(f"Failed to get tilemap in kag_image.py: {inspect.currentframe().f_lineno}")
-            return None
-
-        new_tilemap = {}
-
-        for pos, item in tilemap.items():
-            if item is not None and pos is not None:
-                # add non-tree items directly to the new tilemap
-                if item.name_data.name != "tree":
-                    new_tilemap[pos] = item
-                else:
-                    # handle trees specially
-                    x, y = pos
-
-                    # find the lowest pixel of the tree (to place it properly)
-                    while tilemap.get(Vec2f(x, y + 1)) is not None and tilemap.get(Vec2f(x, y + 1)).name_data.name == "tree":
-                        y += 1
-
-                    # add the bottom-most tree pixel
-                    new_tilemap[Vec2f(x, y)] = tilemap[Vec2f(x, y)]
-
-        return new_tilemap
-
 class TwoInputDialog(QDialog):
     """
     Used as the input box for the new map size.
@@ -0,0 +1,238 @@
+"""
+Works out how much light reaches every cell, from the sky and from light-emitting items, to preview dark areas.
+"""
+from array import array
+from itertools import compress, repeat
+from operator import itemgetter, mod, ne
+
+from base.citemlist import CItemList, ID_SHIFT
+from base.support import SOLID_TILES
+from base.tile_grid import CHUNK_SIZE, GridListener, TileGrid
+
+# light levels go from 0 (dark) to MAX_LIGHT, and drop by one with every cell they travel
+MAX_LIGHT = 15
+SKY_LIGHT = MAX_LIGHT
+EMITTERS = {
+    "lamp": 12,
+    "fireplace": 12,
+    "lantern": 10
+}
+
+# how far light can travel from where it starts
+LIGHT_REACH = MAX_LIGHT - 1
+
+class LightMap(GridListener):
+    """
+    Keeps the light level of every cell, worked out one chunk at a time.
+    Light starts at light-emitting items and at every cell with open sky above it,
+    and spreads through empty and background cells. Solid tiles are lit but stop the light.
+
+    The light in a chunk only depends on the cells within LIGHT_REACH of it, so an edit only marks those chunks
+    (and the chunks below it that lose or gain open sky) to be worked out again when the light is next asked for.
+    """
+    def __init__(self, grid: TileGrid, item_list: CItemList) -> None:
+        self.grid = grid
+        self.item_list = item_list
+        self._blocking_ids = {item_list.get_item_id(name) for name in SOLID_TILES} - {0}
+        self._emitter_ids = {item_list.get_item_id(name): level for name, level in EMITTERS.items()}
+        self._emitter_ids.pop(0, None)
+        # code -> (blocks light, light given off)
+        self._kinds: dict[int, tuple[bool, int]] = {0: (False, 0)}
+
+        self.levels = bytearray(len(grid.codes))
+        # the first row of every column with a solid tile, everything above it is under open sky
+        self._sky_depths = array('I')
+        self._dirty_chunks: set[int] = set()
+        self._needs_full_update = True
+        grid.add_listener(self)
+
+    def cells_changed(self, indexes, old, new) -> None:
+        if self._needs_full_update:
+            return
+
+        # kinds are compared with map, each distinct code is only looked up once
+        kinds = self._kinds
+        for code in set(old).union(new).difference(kinds):
+            self.get_kind(code)
+
+        old_kinds = list(map(kinds.__getitem__, old))
+        new_kinds = list(map(kinds.__getitem__, new))
+        changed = list(compress(indexes, map(ne, old_kinds, new_kinds)))
+        if not changed:
+            return
+
+        # the light of every chunk within reach of a changed chunk can change
+        for chunk in self.grid.get_chunk_indexes(changed):
+            left, top, right, bottom = self._get_chunk_rect(chunk)
+            self._mark_area(left - LIGHT_REACH, top - LIGHT_REACH, right + LIGHT_REACH, bottom + LIGHT_REACH)
+
+        width = self.grid.width
+        blocking = map(ne, map(itemgetter(0), old_kinds), map(itemgetter(0), new_kinds))
+        columns = set(map(mod, compress(indexes, blocking), repeat(width)))
+
+        # the sky reaches further down or stops higher up
+        for x in columns:
+            old_depth = self._sky_depths[x]
+            new_depth = self._get_sky_depth(x)
+            if old_depth != new_depth:
+                self._sky_depths[x] = new_depth
+                top, bottom = min(old_depth, new_depth), max(old_depth, new_depth)
+                self._mark_area(x - LIGHT_REACH, top - LIGHT_REACH, x + LIGHT_REACH, bottom + LIGHT_REACH)
+
+    def cell_changed(self, index: int, old: int, new: int) -> None:
+        self.cells_changed((index,), (old,), (new,))
+
+    def grid_reset(self, grid: TileGrid) -> None:
+        self._needs_full_update = True
+        self._dirty_chunks.clear()
+
+    def get_kind(self, code: int) -> tuple[bool, int]:
+        """
+        Returns whether an item blocks light, and how much light it gives off.
+        """
+        kind = self._kinds.get(code)
+        if kind is None:
+            item_id = code >> ID_SHIFT
+            kind = self._kinds[code] = (item_id in self._blocking_ids, self._emitter_ids.get(item_id, 0))
+
+        return kind
+
+    def get_level(self, index: int) -> int:
+        """
+        Returns the light level of a cell, from 0 to MAX_LIGHT.
+        """
+        self.update()
+        return self.levels[index]
+
+    def get_chunk_count(self) -> tuple[int, int]:
+        """
+        Returns how many chunks wide and tall the map is.
+        """
+        return (
+            (self.grid.width + CHUNK_SIZE - 1) // CHUNK_SIZE,
+            (self.grid.height + CHUNK_SIZE - 1) // CHUNK_SIZE
+        )
+
+    def get_chunk_levels(self, chunk: int) -> tuple[int, int, int, int, bytes]:
+        """
+        Returns the light levels of a chunk.
+
+        Args:
+            chunk (int): The chunk index, row by row.
+
+        Returns:
+            tuple[int, int, int, int, bytes]: The left and top cell of the chunk,
+                its width and height (smaller at the edges of the map) and its levels row by row.
+        """
+        self.update()
+        left, top, right, bottom = self._get_chunk_rect(chunk)
+        width = self.grid.width
+
+        levels = bytearray()
+        for y in range(top, bottom + 1):
+            levels += self.levels[y * width + left:y * width + right + 1]
+
+        return left, top, right - left + 1, bottom - top + 1, bytes(levels)
+
+    def update(self) -> set[int]:
+        """
+        Works out the light of the chunks that edits could have changed.
+
+        Returns:
+            set[int]: The indexes of the chunks that were worked out again.
+        """
+        if self._needs_full_update:
+            self._needs_full_update = False
+            self.levels = bytearray(len(self.grid.codes))
+            self._sky_depths = array('I', [self._get_sky_depth(x) for x in range(self.grid.width)])
+            columns, rows = self.get_chunk_count()
+            self._dirty_chunks = set(range(columns * rows))
+
+        dirty, self._dirty_chunks = self._dirty_chunks, set()
+        for chunk in dirty:
+            self._update_chunk(chunk)
+
+        return dirty
+
+    def _update_chunk(self, chunk: int) -> None:
+        # light can reach the chunk from anywhere within LIGHT_REACH of it, so only that area is lit
+        grid = self.grid
+        width, height = grid.width, grid.height
+        codes = grid.codes
+        left, top, right, bottom = self._get_chunk_rect(chunk)
+        area_left, area_top = max(left - LIGHT_REACH, 0), max(top - LIGHT_REACH, 0)
+        area_right, area_bottom = min(right + LIGHT_REACH, width - 1), min(bottom + LIGHT_REACH, height - 1)
+        area_width = area_right - area_left + 1
+        area_height = area_bottom - area_top + 1
+
+        light = bytearray(area_width * area_height)
+        blocks = bytearray(area_width * area_height)
+        buckets = [[] for _ in range(MAX_LIGHT + 1)]
+        sky_depths = self._sky_depths
+
+        kinds = self._kinds
+        for y in range(area_top, area_bottom + 1):
+            start = y * width
+            area_row = (y - area_top) * area_width
+            row = codes[start + area_left:start + area_right + 1]
+            for code in set(row).difference(kinds):
+                self.get_kind(code)
+
+            for x, (blocking, level) in enumerate(map(kinds.__getitem__, row), area_left):
+                cell = area_row + x - area_left
+                if blocking:
+                    blocks[cell] = 1
+                elif y < sky_depths[x]:
+                    level = max(level, SKY_LIGHT)
+
+                if level:
+                    light[cell] = level
+                    buckets[level].append(cell)
+
+        # spread the brightest light first, so every cell is reached at its highest level
+        for level in range(MAX_LIGHT, 1, -1):
+            next_level = level - 1
+            for cell in buckets[level]:
+                if light[cell] != level or blocks[cell]:
+                    continue
+
+                x = cell % area_width
+                if cell >= area_width and light[cell - area_width] < next_level:
+                    light[cell - area_width] = next_level
+                    buckets[next_level].append(cell - area_width)
+                if cell < len(light) - area_width and light[cell + area_width] < next_level:
+                    light[cell + area_width] = next_level
+                    buckets[next_level].append(cell + area_width)
+                if x > 0 and light[cell - 1] < next_level:
+                    light[cell - 1] = next_level
+                    buckets[next_level].append(cell - 1)
+                if x < area_width - 1 and light[cell + 1] < next_level:
+                    light[cell + 1] = next_level
+                    buckets[next_level].append(cell + 1)
+
+        # only the chunk itself is kept
+        levels = self.levels
+        for y in range(top, bottom + 1):
+            area_start = (y - area_top) * area_width + left - area_left
+            levels[y * width + left:y * width + right + 1] = light[area_start:area_start + right - left + 1]
+
+    def _get_sky_depth(self, x: int) -> int:
+        codes = self.grid.codes
+        width = self.grid.width
+        for y in range(self.grid.height):
+            if self.get_kind(codes[y * width + x])[0]:
+                return y
+
+        return self.grid.height
+
+    def _get_chunk_rect(self, chunk: int) -> tuple[int, int, int, int]:
+        columns = self.get_chunk_count()[0]
+        left, top = (chunk % columns) * CHUNK_SIZE, (chunk // columns) * CHUNK_SIZE
+        return left, top, min(left + CHUNK_SIZE, self.grid.width) - 1, min(top + CHUNK_SIZE, self.grid.height) - 1
+
+    def _mark_area(self, left: int, top: int, right: int, bottom: int) -> None:
+        columns, rows = self.get_chunk_count()
+        first_x, last_x = max(left // CHUNK_SIZE, 0), min(right // CHUNK_SIZE, columns - 1)
+        first_y, last_y = max(top // CHUNK_SIZE, 0), min(bottom // CHUNK_SIZE, rows - 1)
+        for chunk_y in range(first_y, last_y + 1):
+            self._dirty_chunks.update(range(chunk_y * columns + first_x, chunk_y * columns + last_x + 1))
@@ -0,0 +1,204 @@
+"""
+Counts the items on the map for each team and each half of the map.
+"""
+from collections import Counter
+from dataclasses import dataclass
+from itertools import repeat
+from operator import lshift, mod, or_
+
+from base.citemlist import CItemList, ID_SHIFT, TEAM_MASK
+from base.spatial_index import SpatialIndex
+from base.tile_grid import GridListener, TileGrid
+
+# the parts of the map items are counted in, the middle column of odd widths belongs to neither half
+LEFT, RIGHT, MIDDLE = 0, 1, 2
+# batches changing more than one in this many cells of the map are counted again instead of changing the counts
+RECOUNT_FRACTION = 8
+
+@dataclass
+class StatsRow:
+    item_id: int
+    name: str
+    display_name: str
+    type: str
+    team: int # None for items without a team
+    left: int
+    right: int
+    middle: int
+    total: int
+    balance: int # how many more are on the left than the other team has on the right
+
+class MapStats(GridListener):
+    """
+    Counts every item by team and by half of the map.
+
+    Nothing is counted until the counts are first asked for, when they are taken from the tile code counts
+    the spatial index keeps per chunk. After that every batch of edits adds its changes to the counts,
+    so an edit costs time in proportion to the cells it changed rather than to the map.
+    Batches covering much of the map, such as big fills, are counted again from the spatial index instead.
+    """
+    def __init__(self, spatial: SpatialIndex, item_list: CItemList) -> None:
+        self.spatial = spatial
+        self.grid = spatial.grid
+        self.item_list = item_list
+        # (item id, team) -> amount on the left, right and middle, None until first asked for
+        self._counts: dict[tuple[int, int], list[int]] = None
+        self._keys: dict[int, tuple[int, int]] = {}
+        # the grid revision the counts were taken at
+        self._revision = None
+        self.grid.add_listener(self)
+
+    def cells_changed(self, indexes, old, new) -> None:
+        counts = self._counts
+        # counts taken after this batch was made already include it
+        if counts is None or self.grid.revision == self._revision:
+            return
+
+        # a batch covering much of the map is counted again quicker from the chunk counts of the spatial index
+        if len(indexes) > len(self.grid.codes) // RECOUNT_FRACTION:
+            self._counts = None
+            return
+
+        width = self.grid.width
+        half, right_start = width // 2, (width + 1) // 2
+        # the side of every column, so the side of each cell is looked up without looping in Python
+        side_of_column = bytes([LEFT] * half + [MIDDLE] * (right_start - half) + [RIGHT] * (width - right_start))
+        sides = bytes(map(side_of_column.__getitem__, map(mod, indexes, repeat(width))))
+
+        # the change in amount of every code on every side, as code << 2 | side, each one applied once
+        changes = Counter(map(or_, map(lshift, new, repeat(2)), sides))
+        changes.subtract(map(or_, map(lshift, old, repeat(2)), sides))
+        for code_side, amount in changes.items():
+            code, side = code_side >> 2, code_side & 3
+            if code == 0 or amount == 0:
+                continue
+
+            key = self._keys.get(code)
+            if key is None:
+                key = self._keys[code] = self._get_key(code)
+
+            key_counts = counts.get(key)
+            if key_counts is None:
+                key_counts = counts[key] = [0, 0, 0]
+
+            key_counts[side] += amount
+            if not any(key_counts):
+                del counts[key]
+
+    def cell_changed(self, index: int, old: int, new: int) -> None:
+        self.cells_changed((index,), (old,), (new,))
+
+    def grid_reset(self, grid: TileGrid) -> None:
+        self._counts = None
+
+    def get_count(self, item_id: int, team: int = None, side: int = None) -> int:
+        """
+        Returns how many of an item are on the map.
+
+        Args:
+            item_id (int): The id of the item.
+            team (int): Only count this team, or None for every team.
+            side (int): Only count one part of the map (LEFT, RIGHT or MIDDLE), or None for the whole map.
+
+        Returns:
+            int: The amount of the item.
+        """
+        total = 0
+        for (key_id, key_team), counts in self._get_counts().items():
+            if key_id != item_id or (team is not None and key_team != team):
+                continue
+
+            total += sum(counts) if side is None else counts[side]
+
+        return total
+
+    def get_team_totals(self, item_type: str = None) -> dict[int, int]:
+        """
+        Returns how many items each team has.
+
+        Args:
+            item_type (str): Only count items of this type (tile, blob, ...), or None for every type.
+
+        Returns:
+            dict[int, int]: The amount of items of each team.
+        """
+        totals = {}
+        for (item_id, team), counts in self._get_counts().items():
+            if team is None:
+                continue
+
+            item = self.item_list.get_item_by_id(item_id)
+            if item_type is None or (item is not None and item.type == item_type):
+                totals[team] = totals.get(team, 0) + sum(counts)
+
+        return totals
+
+    def get_rows(self) -> list[StatsRow]:
+        """
+        Returns the counts of every item on the map, sorted by name and team.
+        """
+        rows = []
+        counts = self._get_counts()
+        for (item_id, team), (left, right, middle) in counts.items():
+            item = self.item_list.get_item_by_id(item_id)
+            if item is None:
+                continue
+
+            # the mirrored side belongs to the other team
+            mirrored_team = 1 - team if team in (0, 1) else team
+            mirrored = counts.get((item_id, mirrored_team), (0, 0, 0))
+            rows.append(StatsRow(
+                item_id=item_id,
+                name=item.name_data.name,
+                display_name=item.name_data.display_name or item.name_data.name,
+                type=item.type,
+                team=team,
+                left=left,
+                right=right,
+                middle=middle,
+                total=left + right + middle,
+                balance=left - mirrored[RIGHT]
+            ))
+
+        rows.sort(key=lambda row: (row.display_name.lower(), -1 if row.team is None else row.team))
+        return rows
+
+    def _get_counts(self) -> dict[tuple[int, int], list[int]]:
+        # only counted from the spatial index the first time, edits keep the counts up to date after that
+        if self._counts is not None:
+            return self._counts
+
+        grid = self.grid
+        self._revision = grid.revision
+        width = grid.width
+        half, right_start = width // 2, (width + 1) // 2
+        sides = (
+            self.spatial.count_codes(0, half - 1),
+            self.spatial.count_codes(right_start, width - 1),
+            self.spatial.count_codes(half, right_start - 1)
+        )
+
+        self._counts = {}
+        for side, codes in enumerate(sides):
+            for code, amount in codes.items():
+                key = self._keys.get(code)
+                if key is None:
+                    key = self._keys[code] = self._get_key(code)
+
+                counts = self._counts.get(key)
+                if counts is None:
+                    counts = self._counts[key] = [0, 0, 0]
+
+                counts[side] += amount
+
+        return self._counts
+
+    def _get_key(self, code: int) -> tuple[int, int]:
+        # only items that can swap teams are counted per team
+        item_id = code >> ID_SHIFT
+        item = self.item_list.get_item_by_id(item_id)
+        if item is None or not item.sprite.properties.can_swap_teams:
+            return (item_id, None)
+
+        team = code & TEAM_MASK
+        return (item_id, team - 256 if team > 127 else team)
@@ -0,0 +1,221 @@
+"""
+Encodes and writes maps on a background thread.
+"""
+import os
+import tempfile
+from array import array
+from dataclasses import dataclass
+from itertools import compress
+
+from PIL import Image
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from base.citemlist import CItemList, ID_SHIFT, ROTATION_SHIFT
+
+_save_pool: QThreadPool = None
+
+@dataclass(frozen=True)
+class EncodeProfile:
+    """
+    PNG encoder settings, trading save time against file size.
+    Every profile writes a plain RGBA image that KAG can load.
+    """
+    name: str
+    compress_level: int
+    optimize: bool = False
+
+# test launches and autosaves, where save time matters more than size
+FAST_PROFILE = EncodeProfile("fast", compress_level=1)
+# maps that are kept or shared
+ARCHIVAL_PROFILE = EncodeProfile("archival", compress_level=9, optimize=True)
+
+@dataclass
+class MapSnapshot:
+    """
+    A copy of the tile grid taken on the GUI thread, safe to encode while editing continues.
+    """
+    width: int
+    height: int
+    codes: array
+
+def get_save_pool() -> QThreadPool:
+    """
+    Returns the thread pool used for saving, which runs one save at a time in order.
+    """
+    global _save_pool
+    if _save_pool is None:
+        _save_pool = QThreadPool()
+        _save_pool.setMaxThreadCount(1)
+
+    return _save_pool
+
+def wait_for_saves() -> None:
+    """
+    Blocks until every queued save has been written.
+    """
+    if _save_pool is not None:
+        _save_pool.waitForDone()
+
+def argb_to_rgba(argb: tuple) -> tuple:
+    a, r, g, b = argb
+    return (r, g, b, a)
+
+def encode_map(snapshot: MapSnapshot, item_list: CItemList) -> Image.Image:
+    """
+    Builds the KAG map image for a snapshot of the tile grid.
+
+    Args:
+        snapshot (MapSnapshot): The tile grid to encode.
+        item_list (CItemList): Used to look up the color of each code.
+
+    Returns:
+        Image.Image: The map image.
+    """
+    width, height = snapshot.width, snapshot.height
+    codes = collapse_columns(snapshot.codes, width, item_list)
+
+    sky = bytes(argb_to_rgba(item_list.get_item_by_name("sky").get_color()))
+
+    # every distinct code is looked up once
+    palette = {0: sky}
+    offset_codes = {}
+    for code in set(codes):
+        if code == 0:
+            continue
+
+        color, offset = _get_code_color(code, item_list)
+        if color is None or offset != (0, 0):
+            palette[code] = sky
+            if color is not None:
+                offset_codes[code] = (color, offset)
+            continue
+
+        palette[code] = bytes(argb_to_rgba(color))
+
+    image = Image.frombytes("RGBA", (width, height), b"".join(map(palette.__getitem__, codes)))
+
+    # items that save to a different pixel than the one they are placed on
+    if offset_codes:
+        for index, code in enumerate(codes):
+            if code not in offset_codes:
+                continue
+
+            color, (offset_x, offset_y) = offset_codes[code]
+            x, y = index % width, index // width
+
+            # clamp coords to map size
+            final_x = min(max(x + offset_x, 0), width - 1)
+            final_y = min(max(y + offset_y, 0), height - 1)
+            image.putpixel((final_x, final_y), argb_to_rgba(color))
+
+    return image
+
+def write_png(image: Image.Image, fp: str, profile: EncodeProfile = ARCHIVAL_PROFILE) -> None:
+    """
+    Writes an image through a temporary file and renames it over the target,
+    so the target is never left half written.
+
+    Args:
+        image (Image.Image): The image to write.
+        fp (str): The path of the file to write.
+        profile (EncodeProfile): The encoder settings to use.
+    """
+    directory = os.path.dirname(os.path.abspath(fp))
+    fd, temp_path = tempfile.mkstemp(suffix=".tmp", prefix=".mapmaker_", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, format="PNG", compress_level=profile.compress_level, optimize=profile.optimize)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(temp_path, fp)
+
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def _get_code_color(code: int, item_list: CItemList) -> tuple[tuple, tuple]:
+    item = item_list.get_item_by_id(code >> ID_SHIFT)
+    if item is None:
+        return None, (0, 0)
+
+    rotation = ((code >> ROTATION_SHIFT) & 3) * 90
+    team = code & 0xFF
+    team = team - 256 if team > 127 else team
+
+    color = item.get_color(rotation, team)
+    if color is None:
+        color = item.get_color(rotation, team, True)
+
+    if color is None:
+        # todo: should be 'raise' but we dont have all the sprites yet
+        print(f"Item not found: '{item.name_data.name}' | Unable to save from mod: {item.mod_info.folder_name}")
+
+    offset_x, offset_y = item.pixel_data.offset
+    return color, (int(offset_x), int(offset_y))
+
+def collapse_columns(codes: array, width: int, item_list: CItemList) -> array:
+    """
+    Required because trees can be multiple blocks tall. Every cell of a bottom anchored item
+    (see PixelData.bottom_anchored) with the same item below it is emptied, leaving one item at the bottom of each column.
+
+    Args:
+        codes (array): The tile codes of the map, changed in place.
+        width (int): The width of the map.
+        item_list (CItemList): Used to find the bottom anchored items.
+
+    Returns:
+        array: The same codes.
+    """
+    anchored_ids = item_list.bottom_anchored_ids
+    if not anchored_ids:
+        return codes
+
+    # the item id of every anchored cell and 0 for the rest, looked up once per distinct code
+    lookup = {code: code >> ID_SHIFT if code >> ID_SHIFT in anchored_ids else 0 for code in set(codes)}
+    if not any(lookup.values()):
+        return codes
+
+    item_ids = array('I', map(lookup.__getitem__, codes))
+    for index in compress(range(len(codes) - width), item_ids):
+        if item_ids[index + width] == item_ids[index]:
+            codes[index] = 0
+
+    return codes
+
+class SaveSignals(QObject):
+    """
+    Lets the GUI thread know how a save is going.
+    """
+    progress = pyqtSignal(str, int) # path, percent
+    finished = pyqtSignal(str) # path
+    failed = pyqtSignal(str, str) # path, error
+
+class SaveJob(QRunnable):
+    """
+    Encodes a map snapshot and writes it to disk on a worker thread.
+    """
+    def __init__(self, snapshot: MapSnapshot, fp: str, item_list: CItemList, profile: EncodeProfile = ARCHIVAL_PROFILE) -> None:
+        super().__init__()
+        self.snapshot = snapshot
+        self.fp = fp
+        self.item_list = item_list
+        self.profile = profile
+        self.signals = SaveSignals()
+
+    def run(self) -> None:
+        try:
+            self.signals.progress.emit(self.fp, 0)
+            image = encode_map(self.snapshot, self.item_list)
+
+            self.signals.progress.emit(self.fp, 50)
+            write_png(image, self.fp, self.profile)
+
+            self.signals.progress.emit(self.fp, 100)
+
+        except (OSError, ValueError) as e:
+            self.signals.failed.emit(self.fp, str(e))
+            return
+
+        self.signals.finished.emit(self.fp)
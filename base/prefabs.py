@@ -0,0 +1,129 @@
+"""
+Stores named prefabs, regions of tiles that can be stamped onto any map.
+"""
+import os
+import re
+from array import array
+
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QPixmap
+
+from base.kag_image import KagImage
+from base.map_writer import ARCHIVAL_PROFILE, MapSnapshot, encode_map, write_png
+from base.tile_region import TileRegion
+from core.communicator import Communicator
+from utils.file_handler import FileHandler
+
+# the largest side of a thumbnail in pixels
+THUMBNAIL_SIZE = 64
+
+class PrefabLibrary:
+    """
+    Saves prefabs as KAG map images, so they can also be opened as maps,
+    and keeps a thumbnail of each on disk and in memory.
+    """
+    def __init__(self, kag_image: KagImage) -> None:
+        self.kag_image = kag_image
+        self.directory = FileHandler().paths.get("prefabs_path")
+        self.thumbnail_directory = os.path.join(self.directory, "thumbnails")
+        # name -> (modified time of the prefab, thumbnail)
+        self._thumbnails: dict[str, tuple[int, QPixmap]] = {}
+
+    def get_names(self) -> list[str]:
+        """
+        Returns the name of every saved prefab, sorted alphabetically.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+
+        names = [os.path.splitext(fn)[0] for fn in os.listdir(self.directory) if fn.lower().endswith(".png")]
+        return sorted(names, key=str.lower)
+
+    def get_path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.png")
+
+    def save(self, name: str, region: TileRegion) -> str:
+        """
+        Saves a region as a prefab, replacing any prefab with the same name.
+
+        Args:
+            name (str): The name of the prefab.
+            region (TileRegion): The tiles to save.
+
+        Returns:
+            str: The name the prefab was saved as, or None if the name is invalid.
+        """
+        name = re.sub(r"[^A-Za-z0-9_\- ]+", "", name).strip()
+        if name == "":
+            print("Invalid prefab name. Not saving.")
+            return None
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        # the encoder changes the codes it is given
+        snapshot = MapSnapshot(region.width, region.height, array('I', region.codes))
+        write_png(encode_map(snapshot, self.kag_image.item_list), self.get_path(name), ARCHIVAL_PROFILE)
+
+        self._thumbnails.pop(name, None)
+        print(f"Prefab saved: {name}")
+        return name
+
+    def load(self, name: str) -> TileRegion:
+        """
+        Loads a prefab.
+
+        Args:
+            name (str): The name of the prefab.
+
+        Returns:
+            TileRegion: The tiles of the prefab, or None if it couldn't be read.
+        """
+        try:
+            snapshot = self.kag_image.read_map(self.get_path(name))
+
+        except OSError as e:
+            print(f"Failed to load prefab '{name}': {e}")
+            return None
+
+        return TileRegion(snapshot.width, snapshot.height, snapshot.codes)
+
+    def get_thumbnail(self, name: str) -> QPixmap:
+        """
+        Returns a small picture of a prefab, only drawing it again after the prefab has changed.
+
+        Args:
+            name (str): The name of the prefab.
+
+        Returns:
+            QPixmap: The thumbnail, or None if the prefab doesn't exist.
+        """
+        path = self.get_path(name)
+        if not os.path.exists(path):
+            return None
+
+        modified = os.stat(path).st_mtime_ns
+        cached = self._thumbnails.get(name)
+        if cached is not None and cached[0] == modified:
+            return cached[1]
+
+        thumbnail_path = os.path.join(self.thumbnail_directory, f"{name}.png")
+        if os.path.exists(thumbnail_path) and os.stat(thumbnail_path).st_mtime_ns >= modified:
+            thumbnail = QPixmap(thumbnail_path)
+
+        else:
+            region = self.load(name)
+            if region is None:
+                return None
+
+            renderer = Communicator().get_canvas().renderer
+            thumbnail = renderer.render_region(region).scaled(
+                THUMBNAIL_SIZE, THUMBNAIL_SIZE,
+                Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.FastTransformation
+            )
+
+            os.makedirs(self.thumbnail_directory, exist_ok=True)
+            if not thumbnail.save(thumbnail_path, "PNG"):
+                print(f"Failed to save thumbnail for prefab '{name}'")
+
+        self._thumbnails[name] = (modified, thumbnail)
+        return thumbnail
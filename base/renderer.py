@@ -2,15 +2,18 @@
 Handles the rendering of objects for the canvas class.
 """
 
-import inspect
-import os
+from array import array
+from itertools import groupby
 
-from PyQt6.QtGui import QPixmap, QTransform
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QPainter, QPixmap, QTransform
 from PyQt6.QtWidgets import QGraphicsPixmapItem
 
 from base.citem import CItem
-from base.citemlist import CItemList
+from base.citemlist import CItemList, ID_SHIFT, ROTATION_MASK, TEAM_MASK
 from base.image_handler import ImageHandler
+from base.tile_grid import CHUNK_SIZE
+from base.tile_region import TileRegion
 
 from core.communicator import Communicator
 from utils.vec2f import Vec2f
@@ -24,113 +27,241 @@ class Renderer:
         self.images = ImageHandler()
         self.item_list = CItemList()
         self.cursor_graphics_item = None
-
-    def render_item(self, placing: CItem, pos: Vec2f, tm_pos: Vec2f, eraser: bool, rot: int) -> None:
+        # hidden pixmap items of erased sprites, reused before making new ones
+        # removing items from a big scene is slow, changing them isn't
+        self._free_items: list[QGraphicsPixmapItem] = []
+        # chunk index -> z value -> the pixmap item the chunk's tiles with that z are drawn into
+        self._chunk_layers: dict[int, dict[int, QGraphicsPixmapItem]] = {}
+        # chunk index -> cell index -> (tile code, pixmap item) of the sprites bigger than their cell
+        self._chunk_sprites: dict[int, dict[int, tuple[int, QGraphicsPixmapItem]]] = {}
+        # tile code -> (item, image, fits in its cell), None for codes without an image
+        self._sprites: dict[int, tuple[CItem, QPixmap, bool]] = {}
+        self._variants: dict[int, QPixmap] = {}
+
+    def resolve_placement(self, placing_code: int, existing_code: int) -> int:
         """
-        Handles the rendering of an object on the canvas.
+        Works out what a cell becomes when an item is placed onto it,
+        merging the same way placing with the brush always has.
 
         Args:
-            placing (CItem): The object to render.
-            pos (Vec2f): The position of the object on the canvas.
-            tm_pos (Vec2f): The snapped position of the object on the canvas.
-            eraser (bool): Whether or not to erase the object.
-        """
-
-        canvas = self.communicator.get_canvas()
-
-        # merge two items if applicable
-        did_merge, old_name = False, placing.name_data.name
-        tile = canvas.tilemap.get(tm_pos)
-        if tile is not None and (placing.is_mergeable() or tile.is_mergeable()):
-            name = placing.merge_with(tile.name_data.name)
-            new_item: CItem = self.item_list.get_item_by_name(name)
-
-            if new_item is None:
-                name = tile.merge_with(placing.name_data.name)
-                new_item: CItem = self.item_list.get_item_by_name(name)
+            placing_code (int): The code of the item being placed, with the team to place it as.
+            existing_code (int): The code of the cell before placing.
 
-            if new_item is not None:
-                placing: CItem = new_item.copy()
-                did_merge = True
-
-        # items merging into itself dont place
-        if did_merge and old_name == placing.name_data.name:
-            return
-
-        # remove rendered item if it exists
-        if canvas.tilemap.get(tm_pos) is not None:
-            self.remove_existing_item_from_scene(tm_pos)
+        Returns:
+            int: The code of the cell after placing.
+        """
+        item_list = self.item_list
+        placing = item_list.get_item_by_id(placing_code >> ID_SHIFT)
+        if placing is None or placing.is_eraser():
+            return 0
 
-        if eraser:
-            return
+        code = placing_code
 
-        current_team = self.communicator.team
-        can_change_teams = placing.sprite.properties.can_swap_teams
-        if can_change_teams and placing.sprite.team != current_team:
-            placing.swap_team(current_team)
+        # merge two items if applicable, looked up in the table built with the item list
+        merged_id = item_list.get_merge_result(placing_code >> ID_SHIFT, existing_code >> ID_SHIFT)
+        if merged_id != 0:
+            # items merging into itself dont place
+            if merged_id == placing_code >> ID_SHIFT:
+                return existing_code
 
-        pixmap: QPixmap = placing.sprite.image
-        if pixmap is None:
-            line = inspect.currentframe().f_lineno
-            fn = os.path.basename(__file__)
-            print(f"Warning: Failed to get image for {placing} at line {line} of {fn}")
-            return
+            placing = item_list.get_item_by_id(merged_id)
+            rotation = placing_code & ROTATION_MASK if placing.sprite.properties.is_rotatable else 0
+            code = (merged_id << ID_SHIFT) | rotation | (placing.sprite.team & TEAM_MASK)
 
-        if placing.sprite.properties.is_rotatable:
-            pixmap = self._rotate_blob(pixmap, rot)
+        if placing.sprite.properties.can_swap_teams:
+            code = (code & ~TEAM_MASK) | (placing_code & TEAM_MASK)
 
-        pixmap_item = self.add_to_canvas(placing, pixmap, pos, rot)
+        return code
 
-        if pixmap_item is not None:
-            canvas.tilemap[tm_pos] = placing
+    def can_draw(self, code: int) -> bool:
+        """
+        Returns whether a tile code can be drawn, which empty cells always can.
+        """
+        return code == 0 or self._get_sprite(code) is not None
 
-    def remove_existing_item_from_scene(self, pos: Vec2f) -> None:
+    def draw_chunks(self, chunks, variants: array = None) -> None:
         """
-        Removes an existing item from the scene at the specified position (in tilemap coordinates).
+        Redraws chunks of the map from the canvas's tile grid, each one once.
+        Tiles (items that fit in their cell) are drawn into one pixmap per chunk for each z value they use,
+        with runs of the same tile drawn in one call. Bigger sprites keep a scene item each.
 
         Args:
-            pos (tuple): The position of the item to be removed.
+            chunks: The indexes of the chunks to redraw, row by row (see TileGrid.get_chunk_indexes).
+            variants (array): The world.png index to draw each cell with instead of its own image,
+                0 for cells that are drawn as they are, or None to draw every cell as it is.
 
         Returns:
             None
         """
         canvas = self.communicator.get_canvas()
+        grid = canvas.grid
+        width, height, codes = grid.width, grid.height, grid.codes
+        columns = grid.get_chunk_columns()
+        tile_size = canvas.grid_spacing // canvas.default_zoom_scale
+
+        for chunk in chunks:
+            left, top = (chunk % columns) * CHUNK_SIZE, (chunk // columns) * CHUNK_SIZE
+            right, bottom = min(left + CHUNK_SIZE, width), min(top + CHUNK_SIZE, height)
+
+            # z value -> (x, y, length, image) runs of tiles, in pixels from the chunk's corner
+            layers: dict[int, list[tuple[int, int, int, QPixmap]]] = {}
+            sprites: dict[int, int] = {}
+            for y in range(top, bottom):
+                start = y * width + left
+                row = codes[start:y * width + right]
+                if variants is not None:
+                    row = zip(row, variants[start:y * width + right])
+
+                x = 0
+                for key, run in groupby(row):
+                    length = len(list(run))
+                    code, variant = key if variants is not None else (key, 0)
+                    sprite = self._get_sprite(code) if code else None
+                    x += length
+                    if sprite is None:
+                        continue
+
+                    item, image, is_tile = sprite
+                    if not is_tile:
+                        sprites.update(dict.fromkeys(range(start + x - length, start + x), code))
+                        continue
+
+                    if variant and self._get_variant(variant) is not None:
+                        image = self._get_variant(variant)
+
+                    runs = layers.setdefault(item.sprite.z, [])
+                    runs.append(((x - length) * tile_size, (y - top) * tile_size, length, image))
+
+            self._draw_chunk_layers(chunk, layers, left, top, right - left, bottom - top, tile_size)
+            self._draw_chunk_sprites(chunk, sprites)
+
+    def clear(self) -> None:
+        """
+        Forgets every drawn chunk and sprite, required after the scene is cleared.
+        """
+        self._chunk_layers.clear()
+        self._chunk_sprites.clear()
+        self._free_items.clear()
+
+    def _draw_chunk_layers(self, chunk: int, layers: dict, left: int, top: int,
+                           width: int, height: int, tile_size: int) -> None:
+        canvas = self.communicator.get_canvas()
+        items = self._chunk_layers.setdefault(chunk, {})
+        for z, runs in layers.items():
+            pixmap = QPixmap(width * tile_size, height * tile_size)
+            pixmap.fill(Qt.GlobalColor.transparent)
+
+            painter = QPainter(pixmap)
+            for x, y, length, image in runs:
+                if length == 1:
+                    painter.drawPixmap(x, y, image)
+                else:
+                    painter.drawTiledPixmap(x, y, length * tile_size, tile_size, image)
+            painter.end()
+
+            item = items.get(z)
+            if item is None:
+                item = items[z] = QGraphicsPixmapItem()
+                item.setScale(canvas.default_zoom_scale)
+                item.setPos(left * canvas.grid_spacing, top * canvas.grid_spacing)
+                item.setZValue(z)
+                canvas.canvas.addItem(item)
+
+            item.setPixmap(pixmap)
+            item.setVisible(True)
+
+        # layers the chunk no longer uses are hidden, removing items from a big scene is slow
+        for z, item in items.items():
+            if z not in layers and item.isVisible():
+                item.setVisible(False)
+                item.setPixmap(QPixmap())
+
+    def _draw_chunk_sprites(self, chunk: int, sprites: dict[int, int]) -> None:
+        canvas = self.communicator.get_canvas()
+        width, spacing = canvas.grid.width, canvas.grid_spacing
+        drawn = self._chunk_sprites.pop(chunk, {})
+
+        kept = {}
+        for cell, code in sprites.items():
+            entry = drawn.pop(cell, None)
+            if entry is not None and entry[0] == code:
+                kept[cell] = entry
+                continue
+
+            if entry is not None:
+                self._hide_item(entry[1])
+
+            item, pixmap, _ = self._get_sprite(code)
+            pixmap_item = self.add_to_canvas(item, pixmap, (cell % width * spacing, cell // width * spacing),
+                                             item.sprite.rotation)
+            kept[cell] = (code, pixmap_item)
+
+        for _, pixmap_item in drawn.values():
+            self._hide_item(pixmap_item)
+
+        if kept:
+            self._chunk_sprites[chunk] = kept
+
+    def _hide_item(self, pixmap_item: QGraphicsPixmapItem) -> None:
+        # kept for the next sprite, removing items from a big scene is slow
+        pixmap_item.setVisible(False)
+        self._free_items.append(pixmap_item)
+
+    def _get_sprite(self, code: int) -> tuple[CItem, QPixmap, bool]:
+        # the item, its image and whether it fits in its cell, worked out once per code
+        if code in self._sprites:
+            return self._sprites[code]
+
+        item = self.item_list.decode_item(code)
+        pixmap = item.sprite.image if item is not None else None
+        if pixmap is None:
+            print(f"Warning: Failed to get image for tile code {code}")
+            self._sprites[code] = None
+            return None
+
+        if item.sprite.properties.is_rotatable:
+            pixmap = self._rotate_blob(pixmap, item.sprite.rotation)
+
+        canvas = self.communicator.get_canvas()
+        tile_size = canvas.grid_spacing // canvas.default_zoom_scale
+        is_tile = pixmap.width() == tile_size and pixmap.height() == tile_size and tuple(item.sprite.offset) == (0, 0)
+        self._sprites[code] = (item, pixmap, is_tile)
+        return self._sprites[code]
 
-        if pos in canvas.tilemap:
-            if pos in canvas.graphics_items:
-                canvas.canvas.removeItem(canvas.graphics_items[pos])
-                del canvas.graphics_items[pos]
+    def _get_variant(self, index: int) -> QPixmap:
+        if index not in self._variants:
+            self._variants[index] = self.images.get_image(index)
 
-            del canvas.tilemap[pos]
+        return self._variants[index]
 
     def add_to_canvas(self, placing: CItem, img: QPixmap, pos: Vec2f, rot: int) -> QGraphicsPixmapItem:
         """
         Adds an item to the canvas at the specified position.
 
         Args:
-            img (QPixmap): The pixmap to be added to the canvas.
-            pos (tuple): The position of the item in the canvas.
-            z (int): The z-value of the item.
-            name (str): The name of the item.
-            offset (Vec2f): The offset to apply to the item's position.
+            placing (CItem): The item to add, which gives the offset and z-value.
+            img (QPixmap): The pixmap to be added to the canvas, already rotated.
+            pos (tuple): The position of the item's cell in the canvas.
+            rot (int): The rotation of the item in degrees.
 
         Returns:
             QGraphicsPixmapItem: The added pixmap item, or None if the pixmap is None.
         """
         canvas = self.communicator.get_canvas()
-        x, y = canvas.snap_to_grid(pos)
-        tm_pos = Vec2f(x, y)
-
-        # remove existing item if present
-        if canvas.tilemap.get(pos) is not None:
-            self.remove_existing_item_from_scene(pos)
 
         if img is None:
             print(f"Warning: img is None for item {placing.name_data.name} at position {pos}")
             return None
 
-        # create new item
-        pixmap_item = QGraphicsPixmapItem(img)
+        # reuse a hidden item if there is one
+        if self._free_items:
+            pixmap_item = self._free_items.pop()
+            pixmap_item.setPixmap(img)
+            pixmap_item.setVisible(True)
+        else:
+            pixmap_item = QGraphicsPixmapItem(img)
+            canvas.canvas.addItem(pixmap_item)
+
         scale = canvas.default_zoom_scale
         pixmap_item.setScale(scale)
 
@@ -145,11 +276,63 @@ class Renderer:
         pixmap_item.setPos(float(adjusted_x + offset_x), float(adjusted_y + offset_y))
 
         pixmap_item.setZValue(placing.sprite.z)
+        return pixmap_item
 
-        canvas.canvas.addItem(pixmap_item)
-        canvas.graphics_items[tm_pos] = pixmap_item
+    def render_region(self, region: TileRegion) -> QPixmap:
+        """
+        Draws a region of tiles into a single pixmap at the size of the sprites,
+        used for the paste preview and prefab thumbnails.
 
-        return pixmap_item
+        Args:
+            region (TileRegion): The tiles to draw.
+
+        Returns:
+            QPixmap: The drawn region, transparent where there are no tiles.
+        """
+        canvas = self.communicator.get_canvas()
+        scale = canvas.default_zoom_scale
+        tile_size = canvas.grid_spacing // scale
+
+        pixmap = QPixmap(max(1, region.width * tile_size), max(1, region.height * tile_size))
+        pixmap.fill(Qt.GlobalColor.transparent)
+
+        # items are looked up once per code, and drawn back to front
+        items = {}
+        sprites = []
+        for index, code in enumerate(region.codes):
+            if code == 0:
+                continue
+
+            if code not in items:
+                items[code] = self.item_list.decode_item(code)
+
+            item = items[code]
+            if item is None or item.sprite.image is None:
+                continue
+
+            x, y = index % region.width * tile_size, index // region.width * tile_size
+            sprites.append((item.sprite.z, x, y, item))
+
+        sprites.sort(key=lambda sprite: sprite[0])
+
+        painter = QPainter(pixmap)
+        for _, x, y, item in sprites:
+            image = item.sprite.image
+            rot = item.sprite.rotation
+            if item.sprite.properties.is_rotatable:
+                image = self._rotate_blob(image, rot)
+
+            w, h = image.width(), image.height()
+            if rot in (90, 270):
+                x += (h - w) / 2
+                y += (w - h) / 2
+
+            # offsets are in scene coordinates
+            offset_x, offset_y = item.sprite.offset
+            painter.drawPixmap(int(x + offset_x / scale), int(y + offset_y / scale), image)
+
+        painter.end()
+        return pixmap
 
     def render_cursor(self, pos: Vec2f) -> None:
         """
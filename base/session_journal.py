@@ -0,0 +1,277 @@
+"""
+Keeps an append-only journal of edits so a session can be recovered after a crash.
+"""
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from itertools import chain
+
+from base.tile_grid import GridListener, TileGrid
+
+JOURNAL_MAGIC = b"KMJN"
+CHECKPOINT_MAGIC = b"KMCK"
+VERSION = 1
+
+# magic, version, catalog fingerprint, checkpoint generation
+JOURNAL_HEADER = struct.Struct("<4sHII")
+# magic, version, catalog fingerprint, checkpoint generation, width, height
+CHECKPOINT_HEADER = struct.Struct("<4sHIIII")
+# amount of (index, code) pairs, crc32 of the pairs
+RECORD_HEADER = struct.Struct("<II")
+
+# compact the journal into a checkpoint once it grows past this size or age
+CHECKPOINT_BYTES = 4 * 1024 * 1024
+CHECKPOINT_INTERVAL = 5 * 60 # seconds
+
+def _to_little_endian(codes: array) -> bytes:
+    if sys.byteorder == "big":
+        codes = array('I', codes)
+        codes.byteswap()
+
+    return codes.tobytes()
+
+def _from_little_endian(data: bytes) -> array:
+    codes = array('I')
+    codes.frombytes(data)
+    if sys.byteorder == "big":
+        codes.byteswap()
+
+    return codes
+
+class SessionJournal(GridListener):
+    """
+    Records tile changes from a TileGrid into an append-only binary journal.
+
+    Changes are batched in memory and written with fsync by flush(), which the canvas calls on a timer.
+    The journal is compacted into a full checkpoint of the grid every so often,
+    and both files are removed when the app closes normally.
+    """
+    def __init__(self, directory: str, fingerprint: int) -> None:
+        self.directory = directory
+        self.fingerprint = fingerprint
+        self.checkpoint_path = os.path.join(directory, "session.ckpt")
+        self.journal_path = os.path.join(directory, "session.journal")
+
+        self.grid: TileGrid = None
+        self._journal_file = None
+        self._pending: dict[int, int] = {}
+        self._needs_checkpoint = False
+        self._generation = 0
+        self._last_checkpoint = 0.0
+
+    def has_session(self) -> bool:
+        """
+        Returns whether a session was left behind by a crash.
+        """
+        return os.path.exists(self.checkpoint_path)
+
+    def read_session(self) -> tuple[int, int, array]:
+        """
+        Rebuilds the grid of a crashed session from its checkpoint and journal.
+
+        Returns:
+            tuple[int, int, array]: The width, height and codes of the map, or None if it can't be recovered.
+        """
+        try:
+            with open(self.checkpoint_path, 'rb') as f:
+                header = f.read(CHECKPOINT_HEADER.size)
+                magic, version, fingerprint, generation, width, height = CHECKPOINT_HEADER.unpack(header)
+                codes = _from_little_endian(zlib.decompress(f.read()))
+
+        except (OSError, struct.error, zlib.error) as e:
+            print(f"Failed to read session checkpoint: {e}")
+            return None
+
+        if magic != CHECKPOINT_MAGIC or version != VERSION or len(codes) != width * height:
+            print("Session checkpoint is invalid. Not recovering.")
+            return None
+
+        if fingerprint != self.fingerprint:
+            print("Items have changed since the session was saved. Not recovering.")
+            return None
+
+        replayed = self._replay_journal(codes, generation)
+        print(f"Recovered session with {replayed} journaled changes")
+        return width, height, codes
+
+    def start(self, grid: TileGrid) -> None:
+        """
+        Starts a new session for the given grid, replacing any previous one.
+
+        Args:
+            grid (TileGrid): The grid to record changes from.
+        """
+        self.close(clean=False)
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.grid = grid
+        grid.add_listener(self)
+        # random so a journal left by another session never matches our checkpoints
+        self._generation = int.from_bytes(os.urandom(4), "little")
+        self._write_checkpoint()
+
+    def close(self, clean: bool = True) -> None:
+        """
+        Stops recording changes.
+
+        Args:
+            clean (bool): Whether the session ended normally, in which case the files are removed.
+        """
+        if self.grid is not None:
+            self.grid.remove_listener(self)
+
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
+
+        self.grid = None
+        self._pending.clear()
+
+        if clean:
+            for path in (self.journal_path, self.checkpoint_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def cells_changed(self, indexes, old, new) -> None:
+        self._pending.update(zip(indexes, new))
+
+    def cell_changed(self, index: int, old: int, new: int) -> None:
+        self._pending[index] = new
+
+    def grid_reset(self, grid: TileGrid) -> None:
+        # every cell changed, a checkpoint is smaller than journaling all of them
+        self._pending.clear()
+        self._needs_checkpoint = True
+
+    def flush(self) -> None:
+        """
+        Writes the batched changes to the journal and syncs it to disk.
+        """
+        if self.grid is None:
+            return
+
+        if self._needs_checkpoint or self._should_compact():
+            self._write_checkpoint()
+            return
+
+        if not self._pending:
+            return
+
+        pairs = array('I', chain.from_iterable(self._pending.items()))
+        payload = _to_little_endian(pairs)
+        record = RECORD_HEADER.pack(len(pairs) // 2, zlib.crc32(payload)) + payload
+
+        start = self._journal_file.tell()
+        try:
+            self._journal_file.write(record)
+            self._journal_file.flush()
+            os.fsync(self._journal_file.fileno())
+
+        except OSError as e:
+            # the changes stay pending and are written again with the next flush
+            print(f"Failed to write session journal: {e}")
+            self._discard_record(start)
+            return
+
+        self._pending.clear()
+
+    def _discard_record(self, start: int) -> None:
+        # replaying stops at a partly written record, which would hide every record written after it
+        try:
+            self._journal_file.truncate(start)
+            self._journal_file.seek(start)
+
+        except OSError as e:
+            print(f"Failed to discard partial journal record: {e}")
+            self._needs_checkpoint = True
+
+    def _should_compact(self) -> bool:
+        if self._journal_file is None:
+            return True
+
+        if not self._pending:
+            return False
+
+        too_big = self._journal_file.tell() > CHECKPOINT_BYTES
+        too_old = time.monotonic() - self._last_checkpoint > CHECKPOINT_INTERVAL
+        return too_big or too_old
+
+    def _write_checkpoint(self) -> None:
+        grid = self.grid
+        self._generation = (self._generation + 1) & 0xFFFFFFFF
+        header = CHECKPOINT_HEADER.pack(
+            CHECKPOINT_MAGIC, VERSION, self.fingerprint, self._generation, grid.width, grid.height
+        )
+        data = zlib.compress(_to_little_endian(grid.codes), 1)
+
+        try:
+            # write to a temporary file first so a crash never leaves a half written checkpoint
+            temp_path = self.checkpoint_path + ".tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(header)
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+            os.replace(temp_path, self.checkpoint_path)
+
+            # start a fresh journal for the new checkpoint
+            if self._journal_file is not None:
+                self._journal_file.close()
+
+            self._journal_file = open(self.journal_path, 'wb')
+            self._journal_file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, VERSION, self.fingerprint, self._generation))
+            self._journal_file.flush()
+            os.fsync(self._journal_file.fileno())
+
+        except OSError as e:
+            print(f"Failed to write session checkpoint: {e}")
+            return
+
+        self._pending.clear()
+        self._needs_checkpoint = False
+        self._last_checkpoint = time.monotonic()
+
+    def _replay_journal(self, codes: array, generation: int) -> int:
+        try:
+            with open(self.journal_path, 'rb') as f:
+                data = f.read()
+
+        except OSError:
+            return 0
+
+        if len(data) < JOURNAL_HEADER.size:
+            return 0
+
+        magic, version, fingerprint, journal_generation = JOURNAL_HEADER.unpack_from(data)
+        if magic != JOURNAL_MAGIC or version != VERSION or fingerprint != self.fingerprint:
+            return 0
+
+        # the journal belongs to an older checkpoint, which means the new checkpoint already has its changes
+        if journal_generation != generation:
+            return 0
+
+        replayed = 0
+        offset = JOURNAL_HEADER.size
+        while offset + RECORD_HEADER.size <= len(data):
+            count, crc = RECORD_HEADER.unpack_from(data, offset)
+            start = offset + RECORD_HEADER.size
+            end = start + count * 8
+
+            # stop at a record that was only partly written
+            if end > len(data) or zlib.crc32(data[start:end]) != crc:
+                break
+
+            pairs = _from_little_endian(data[start:end])
+            for i in range(0, len(pairs), 2):
+                index = pairs[i]
+                if index < len(codes):
+                    codes[index] = pairs[i + 1]
+
+            replayed += count
+            offset = end
+
+        return replayed
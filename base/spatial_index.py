@@ -0,0 +1,388 @@
+"""
+Answers questions about where items are on the map, such as every spawn in a rectangle or the nearest flag to a cell.
+"""
+from array import array
+from collections import Counter
+from itertools import compress, repeat
+from operator import ne, rshift
+
+from base.citemlist import CItemList, ID_SHIFT, TEAM_MASK
+from base.tile_grid import CHUNK_SIZE, GridListener, TileGrid
+
+def get_item_ids(item_list: CItemList, item_type: str = None, names=None) -> set[int]:
+    """
+    Returns the ids of the items of a type or with one of the given names, to query with.
+
+    Args:
+        item_list (CItemList): The items to pick from.
+        item_type (str): Only items of this type (tile, blob, ...), or None for any type.
+        names: Only items with one of these names, or None for any name.
+
+    Returns:
+        set[int]: The item ids.
+    """
+    names = set(names) if names is not None else None
+    ids = set()
+    for item in item_list.all_items:
+        if item_type is not None and item.type != item_type:
+            continue
+
+        if names is not None and item.name_data.name not in names:
+            continue
+
+        item_id = item_list.get_item_id(item.name_data.name)
+        if item_id != 0:
+            ids.add(item_id)
+
+    return ids
+
+class SpatialIndex(GridListener):
+    """
+    Keeps the cells of every item id in a bucket, and how many of each tile code every chunk holds.
+    Queries look at the buckets when there are few matching cells, and otherwise only scan the chunks
+    that hold one of the items, so they take time in proportion to what they find rather than to the map.
+
+    Nothing is kept until the first query, so edits cost nothing while no tool or panel uses the index.
+    After that every batch moves the cells it changed between buckets, and the edited chunks are recounted when next asked for.
+    """
+    def __init__(self, grid: TileGrid) -> None:
+        self.grid = grid
+        # item id -> cell indexes, None until the first query
+        self._buckets: dict[int, set[int]] = None
+        # chunk index -> tile code -> amount of cells, None for chunks edited since they were counted
+        self._chunks: list[Counter] = []
+        self._chunk_columns = 0
+        grid.add_listener(self)
+        self.grid_reset(grid)
+
+    def cells_changed(self, indexes, old, new) -> None:
+        if self._buckets is None:
+            return
+
+        chunks = self._chunks
+        for chunk in self.grid.get_chunk_indexes(indexes):
+            chunks[chunk] = None
+
+        old_ids = array('I', map(rshift, old, repeat(ID_SHIFT)))
+        new_ids = array('I', map(rshift, new, repeat(ID_SHIFT)))
+        if old_ids == new_ids:
+            return
+
+        # the cells that changed item are grouped by their old and new id in one pass,
+        # so every bucket is only touched once however many items the batch holds
+        removed: dict[int, list[int]] = {}
+        added: dict[int, list[int]] = {}
+        for index, old_id, new_id in compress(zip(indexes, old_ids, new_ids), map(ne, old_ids, new_ids)):
+            if old_id:
+                if old_id in removed:
+                    removed[old_id].append(index)
+                else:
+                    removed[old_id] = [index]
+            if new_id:
+                if new_id in added:
+                    added[new_id].append(index)
+                else:
+                    added[new_id] = [index]
+
+        # every cell is taken out of its old bucket before being put in its new one
+        buckets = self._buckets
+        for item_id, cells in removed.items():
+            bucket = buckets.get(item_id)
+            if bucket is not None:
+                bucket.difference_update(cells)
+                if not bucket:
+                    del buckets[item_id]
+
+        for item_id, cells in added.items():
+            if item_id in buckets:
+                buckets[item_id].update(cells)
+            else:
+                buckets[item_id] = set(cells)
+
+    def cell_changed(self, index: int, old: int, new: int) -> None:
+        self.cells_changed((index,), (old,), (new,))
+
+    def grid_reset(self, grid: TileGrid) -> None:
+        self._buckets = None
+        self._chunk_columns = grid.get_chunk_columns()
+        self._chunks = [None] * (self._chunk_columns * ((grid.height + CHUNK_SIZE - 1) // CHUNK_SIZE))
+
+    def count(self, item_ids, team: int = None) -> int:
+        """
+        Returns how many cells hold one of the items.
+
+        Args:
+            item_ids: The item ids to count.
+            team (int): Only count cells of this team, or None for any team.
+
+        Returns:
+            int: The amount of cells.
+        """
+        buckets = self._get_buckets()
+        if team is None:
+            return sum(len(buckets.get(item_id, ())) for item_id in set(item_ids))
+
+        codes = self.grid.codes
+        team &= TEAM_MASK
+        return sum(
+            1 for item_id in set(item_ids) for index in buckets.get(item_id, ())
+            if codes[index] & TEAM_MASK == team
+        )
+
+    def get_cells(self, item_ids) -> array:
+        """
+        Returns every cell holding one of the items, in order.
+        """
+        cells = array('I')
+        buckets = self._get_buckets()
+        for item_id in set(item_ids):
+            cells.extend(buckets.get(item_id, ()))
+
+        return array('I', sorted(cells))
+
+    def find_in_rect(self, item_ids, left: int, top: int, right: int, bottom: int, team: int = None) -> array:
+        """
+        Finds the cells in a rectangle that hold one of the items.
+
+        Args:
+            item_ids: The item ids to look for.
+            left (int): The left-most column of the rectangle.
+            top (int): The top row of the rectangle.
+            right (int): The right-most column of the rectangle.
+            bottom (int): The bottom row of the rectangle.
+            team (int): Only find cells of this team, or None for any team.
+
+        Returns:
+            array: The matching cell indexes, in order.
+        """
+        grid = self.grid
+        width = grid.width
+        left, top = max(left, 0), max(top, 0)
+        right, bottom = min(right, width - 1), min(bottom, grid.height - 1)
+        item_ids = set(item_ids)
+        if left > right or top > bottom or not item_ids:
+            return array('I')
+
+        found = array('I')
+        buckets = self._get_buckets()
+        area = (right - left + 1) * (bottom - top + 1)
+        total = sum(len(buckets.get(item_id, ())) for item_id in item_ids)
+
+        # few matching cells on the map, check each of them
+        if total <= area // CHUNK_SIZE:
+            for item_id in item_ids:
+                for index in buckets.get(item_id, ()):
+                    y, x = divmod(index, width)
+                    if left <= x <= right and top <= y <= bottom:
+                        found.append(index)
+
+        # otherwise scan only the chunks that hold one of the items
+        else:
+            codes = grid.codes
+            for chunk_y in range(top // CHUNK_SIZE, bottom // CHUNK_SIZE + 1):
+                for chunk_x in range(left // CHUNK_SIZE, right // CHUNK_SIZE + 1):
+                    if not self._has_items(chunk_y * self._chunk_columns + chunk_x, item_ids):
+                        continue
+
+                    first_x = max(chunk_x * CHUNK_SIZE, left)
+                    last_x = min(chunk_x * CHUNK_SIZE + CHUNK_SIZE - 1, right)
+                    for y in range(max(chunk_y * CHUNK_SIZE, top), min(chunk_y * CHUNK_SIZE + CHUNK_SIZE - 1, bottom) + 1):
+                        start = y * width + first_x
+                        row = codes[start:y * width + last_x + 1]
+                        found.extend(start + x for x, code in enumerate(row) if code >> ID_SHIFT in item_ids)
+
+        if team is not None:
+            codes = grid.codes
+            team &= TEAM_MASK
+            found = array('I', [index for index in found if codes[index] & TEAM_MASK == team])
+
+        return array('I', sorted(found))
+
+    def find_in_radius(self, item_ids, x: int, y: int, radius: float, team: int = None) -> array:
+        """
+        Finds the cells within a distance of a cell that hold one of the items.
+
+        Args:
+            item_ids: The item ids to look for.
+            x (int): The x position of the center cell.
+            y (int): The y position of the center cell.
+            radius (float): The largest distance from the center, in cells.
+            team (int): Only find cells of this team, or None for any team.
+
+        Returns:
+            array: The matching cell indexes, in order.
+        """
+        reach = int(radius)
+        width = self.grid.width
+        radius_squared = radius * radius
+
+        found = self.find_in_rect(item_ids, x - reach, y - reach, x + reach, y + reach, team)
+        return array('I', [
+            index for index in found
+            if (index % width - x) ** 2 + (index // width - y) ** 2 <= radius_squared
+        ])
+
+    def find_nearest(self, item_ids, x: int, y: int, team: int = None, max_distance: float = None) -> int:
+        """
+        Finds the closest cell to a cell that holds one of the items.
+        Chunks are searched in rings around the cell, skipping chunks that don't hold any of the items.
+
+        Args:
+            item_ids: The item ids to look for.
+            x (int): The x position of the cell to search from.
+            y (int): The y position of the cell to search from.
+            team (int): Only find cells of this team, or None for any team.
+            max_distance (float): The furthest to search in cells, or None for the whole map.
+
+        Returns:
+            int: The closest cell index, or -1 if there is none.
+        """
+        item_ids = set(item_ids)
+        if not item_ids or self.count(item_ids) == 0:
+            return -1
+
+        grid = self.grid
+        width = grid.width
+        chunk_rows = (grid.height + CHUNK_SIZE - 1) // CHUNK_SIZE
+        center_x, center_y = x // CHUNK_SIZE, y // CHUNK_SIZE
+        max_ring = max(center_x, self._chunk_columns - 1 - center_x, center_y, chunk_rows - 1 - center_y)
+
+        best, best_distance = -1, None
+        for ring in range(max_ring + 1):
+            # every cell of this ring is at least this far away
+            nearest_possible = max(ring - 1, 0) * CHUNK_SIZE
+            if best_distance is not None and nearest_possible ** 2 > best_distance:
+                break
+
+            if max_distance is not None and nearest_possible > max_distance:
+                break
+
+            for chunk_x, chunk_y in self._get_ring(center_x, center_y, ring, chunk_rows):
+                if not self._has_items(chunk_y * self._chunk_columns + chunk_x, item_ids):
+                    continue
+
+                left, top = chunk_x * CHUNK_SIZE, chunk_y * CHUNK_SIZE
+                for index in self.find_in_rect(item_ids, left, top, left + CHUNK_SIZE - 1, top + CHUNK_SIZE - 1, team):
+                    distance = (index % width - x) ** 2 + (index // width - y) ** 2
+                    if best_distance is None or distance < best_distance:
+                        best, best_distance = index, distance
+
+        if best != -1 and max_distance is not None and best_distance > max_distance * max_distance:
+            return -1
+
+        return best
+
+    def get_chunk_counts(self, chunk_x: int, chunk_y: int) -> dict[int, int]:
+        """
+        Returns how many cells of each item id a chunk holds.
+        """
+        counts = {}
+        for code, amount in self.get_chunk_codes(chunk_y * self._chunk_columns + chunk_x).items():
+            counts[code >> ID_SHIFT] = counts.get(code >> ID_SHIFT, 0) + amount
+
+        return counts
+
+    def get_chunk_codes(self, chunk: int) -> Counter:
+        """
+        Returns how many cells of each tile code a chunk holds, counting the chunk again if it was edited.
+
+        Args:
+            chunk (int): The chunk index, row by row.
+
+        Returns:
+            Counter: The amount of every tile code in the chunk, without empty cells. Shouldn't be changed.
+        """
+        if self._buckets is None:
+            self._build()
+
+        counts = self._chunks[chunk]
+        if counts is None:
+            grid = self.grid
+            width, codes = grid.width, grid.codes
+            left, top = (chunk % self._chunk_columns) * CHUNK_SIZE, (chunk // self._chunk_columns) * CHUNK_SIZE
+            right = min(left + CHUNK_SIZE, width)
+
+            counts = Counter()
+            for y in range(top, min(top + CHUNK_SIZE, grid.height)):
+                counts.update(codes[y * width + left:y * width + right])
+
+            del counts[0]
+            self._chunks[chunk] = counts
+
+        return counts
+
+    def count_codes(self, first_x: int, last_x: int) -> Counter:
+        """
+        Returns how many cells of each tile code a range of columns holds.
+        Whole chunks are taken from their counts, only the columns of partly covered chunks are counted.
+
+        Args:
+            first_x (int): The left-most column.
+            last_x (int): The right-most column.
+
+        Returns:
+            Counter: The amount of every tile code in the columns, without empty cells.
+        """
+        grid = self.grid
+        width, codes = grid.width, grid.codes
+        first_x, last_x = max(first_x, 0), min(last_x, width - 1)
+        counts = Counter()
+        if first_x > last_x:
+            return counts
+
+        chunk_rows = len(self._chunks) // max(self._chunk_columns, 1)
+        for chunk_x in range(first_x // CHUNK_SIZE, last_x // CHUNK_SIZE + 1):
+            left, right = chunk_x * CHUNK_SIZE, min(chunk_x * CHUNK_SIZE + CHUNK_SIZE, width) - 1
+            if first_x <= left and right <= last_x:
+                for chunk_y in range(chunk_rows):
+                    counts.update(self.get_chunk_codes(chunk_y * self._chunk_columns + chunk_x))
+                continue
+
+            left, right = max(left, first_x), min(right, last_x)
+            for start in range(0, len(codes), width):
+                counts.update(codes[start + left:start + right + 1])
+
+        del counts[0]
+        return counts
+
+    def _get_ring(self, center_x: int, center_y: int, ring: int, chunk_rows: int) -> list[tuple[int, int]]:
+        # the chunks on the edge of a square around the center chunk, inside the map
+        if ring == 0:
+            return [(center_x, center_y)]
+
+        chunks = []
+        for chunk_x in range(center_x - ring, center_x + ring + 1):
+            chunks.append((chunk_x, center_y - ring))
+            chunks.append((chunk_x, center_y + ring))
+
+        for chunk_y in range(center_y - ring + 1, center_y + ring):
+            chunks.append((center_x - ring, chunk_y))
+            chunks.append((center_x + ring, chunk_y))
+
+        return [
+            (chunk_x, chunk_y) for chunk_x, chunk_y in chunks
+            if 0 <= chunk_x < self._chunk_columns and 0 <= chunk_y < chunk_rows
+        ]
+
+    def _has_items(self, chunk: int, item_ids: set[int]) -> bool:
+        return any(code >> ID_SHIFT in item_ids for code in self.get_chunk_codes(chunk))
+
+    def _get_buckets(self) -> dict[int, set[int]]:
+        if self._buckets is None:
+            self._build()
+
+        return self._buckets
+
+    def _build(self) -> None:
+        # sorts every filled cell into its bucket, and counts every chunk again when it is next asked for
+        codes = self.grid.codes
+        buckets = {}
+        for index in compress(range(len(codes)), codes):
+            item_id = codes[index] >> ID_SHIFT
+            if item_id in buckets:
+                buckets[item_id].add(index)
+            else:
+                buckets[item_id] = {index}
+
+        self._buckets = buckets
+        self._chunks = [None] * len(self._chunks)
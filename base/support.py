@@ -0,0 +1,267 @@
+"""
+Finds the solid blocks that aren't connected to bedrock or the bottom of the map, which collapse in game.
+"""
+from collections import deque
+
+from base.citemlist import CItemList, ID_SHIFT
+from base.tile_grid import GridListener, TileGrid
+
+# tiles that hold each other up, and the ones that hold everything else up
+SOLID_TILES = (
+    "tile_ground", "tile_castle", "tile_castle_moss", "tile_gold", "tile_stone",
+    "tile_thickstone", "tile_bedrock", "tile_wood"
+)
+ANCHOR_TILES = ("tile_bedrock",)
+
+# batches bigger than this part of the map are analyzed from scratch
+FULL_UPDATE_RATIO = 0.25
+
+NOT_SOLID, SOLID, ANCHOR = 0, 1, 2
+
+class SupportAnalyzer(GridListener):
+    """
+    Keeps track of which solid cells are connected, through the four cells next to them,
+    to an anchor tile or a solid cell on the bottom row.
+
+    Edits are analyzed when the results are next asked for. Placing blocks only spreads support from the new cells,
+    and removing blocks only searches the pieces that touched them. A search stops as soon as it finds an anchor,
+    looking down first, so breaking a block off of the ground doesn't go over the whole ground.
+    """
+    def __init__(self, grid: TileGrid, item_list: CItemList) -> None:
+        self.grid = grid
+        self.item_list = item_list
+        self._kinds = {0: NOT_SOLID}
+        self._solid_ids = {item_list.get_item_id(name) for name in SOLID_TILES} - {0}
+        self._anchor_ids = {item_list.get_item_id(name) for name in ANCHOR_TILES} - {0}
+
+        self._supported = bytearray(len(grid.codes))
+        # the unsupported cells of every row as (first x, last x) spans
+        self._rows: dict[int, list[tuple[int, int]]] = {}
+        self._dirty_rows: set[int] = set()
+        self._changes: dict[int, int] = {} # cell index -> code before the pending edits
+        self._needs_full_update = True
+        grid.add_listener(self)
+
+    def cells_changed(self, indexes, old, new) -> None:
+        if self._needs_full_update:
+            return
+
+        # the code before the first pending edit of each cell is kept
+        changes = dict(zip(indexes, old))
+        changes.update(self._changes)
+        self._changes = changes
+
+        if len(changes) > len(self.grid.codes) * FULL_UPDATE_RATIO:
+            self._needs_full_update = True
+            changes.clear()
+
+    def cell_changed(self, index: int, old: int, new: int) -> None:
+        self.cells_changed((index,), (old,), (new,))
+
+    def grid_reset(self, grid: TileGrid) -> None:
+        self._needs_full_update = True
+        self._changes.clear()
+
+    def get_kind(self, index: int) -> int:
+        """
+        Returns whether a cell is NOT_SOLID, SOLID or an ANCHOR.
+        Solid cells on the bottom row are anchors.
+        """
+        code = self.grid.codes[index]
+        kind = self._kinds.get(code)
+        if kind is None:
+            kind = self._kinds[code] = self._get_code_kind(code)
+
+        if kind == SOLID and index >= len(self.grid.codes) - self.grid.width:
+            return ANCHOR
+
+        return kind
+
+    def is_supported(self, index: int) -> bool:
+        """
+        Returns whether a cell is a solid block that won't collapse.
+        """
+        self.update()
+        return bool(self._supported[index])
+
+    def update_spans(self) -> set[int]:
+        """
+        Analyzes the pending edits and works out the unsupported spans of the rows they changed.
+
+        Returns:
+            set[int]: The rows whose spans were worked out again.
+        """
+        self.update()
+
+        width = self.grid.width
+        for y in self._dirty_rows:
+            spans = []
+            first = None
+            start = y * width
+            for x in range(width + 1):
+                unsupported = x < width and not self._supported[start + x] and self.get_kind(start + x) != NOT_SOLID
+                if unsupported and first is None:
+                    first = x
+                elif not unsupported and first is not None:
+                    spans.append((first, x - 1))
+                    first = None
+
+            if spans:
+                self._rows[y] = spans
+            else:
+                self._rows.pop(y, None)
+
+        dirty, self._dirty_rows = self._dirty_rows, set()
+        return dirty
+
+    def get_row_spans(self, y: int) -> list[tuple[int, int]]:
+        """
+        Returns the unsupported cells of a row as (first x, last x) spans, as of the last update.
+        """
+        return self._rows.get(y, [])
+
+    def get_unsupported_spans(self) -> list[tuple[int, int, int]]:
+        """
+        Returns the solid cells that would collapse.
+
+        Returns:
+            list[tuple[int, int, int]]: Rows of cells as (y, first x, last x) spans.
+        """
+        self.update_spans()
+        return [(y, first, last) for y in sorted(self._rows) for first, last in self._rows[y]]
+
+    def get_unsupported_count(self) -> int:
+        return sum(last - first + 1 for _, first, last in self.get_unsupported_spans())
+
+    def update(self) -> None:
+        """
+        Analyzes the edits made since the last update.
+        """
+        if self._needs_full_update:
+            self._update_all()
+            return
+
+        if not self._changes:
+            return
+
+        changes, self._changes = self._changes, {}
+        width, height = self.grid.width, self.grid.height
+        supported = self._supported
+        codes = self.grid.codes
+
+        # cells that lost their block or stopped being an anchor might have held others up
+        seeds = []
+        grown = []
+        for index, old_code in changes.items():
+            kind = self.get_kind(index)
+            old_kind = self._get_code_kind(old_code)
+            if old_kind == SOLID and index >= len(codes) - width:
+                old_kind = ANCHOR
+
+            was_supported = supported[index]
+            if kind == NOT_SOLID:
+                supported[index] = 0
+            else:
+                grown.append(index)
+
+            if kind < old_kind and was_supported:
+                if kind != NOT_SOLID:
+                    seeds.append(index)
+                seeds.extend(self._get_neighbors(index, width, height))
+
+        # every piece touching a weakened cell is searched for an anchor, and dropped without one
+        confirmed = set()
+        for seed in seeds:
+            if not supported[seed] or seed in confirmed:
+                continue
+
+            piece, has_anchor = self._search(seed)
+            if has_anchor:
+                confirmed.update(piece)
+            else:
+                for index in piece:
+                    supported[index] = 0
+                self._mark_dirty(piece)
+
+        # new blocks are held up by an anchor or by a supported cell next to them
+        for index in grown:
+            if supported[index] or self.get_kind(index) == NOT_SOLID:
+                continue
+
+            if self.get_kind(index) == ANCHOR or any(supported[n] for n in self._get_neighbors(index, width, height)):
+                self._spread(index)
+
+        self._mark_dirty(changes)
+
+    def _update_all(self) -> None:
+        self._needs_full_update = False
+        self._changes.clear()
+
+        count = len(self.grid.codes)
+        self._supported = bytearray(count)
+        self._rows.clear()
+        self._dirty_rows = set(range(self.grid.height))
+
+        for index in range(count):
+            if not self._supported[index] and self.get_kind(index) == ANCHOR:
+                self._spread(index)
+
+    def _spread(self, start: int) -> None:
+        # marks every solid cell connected to the start as supported
+        width, height = self.grid.width, self.grid.height
+        supported = self._supported
+        supported[start] = 1
+        queue = deque((start,))
+        marked = [start]
+        while queue:
+            index = queue.popleft()
+            for neighbor in self._get_neighbors(index, width, height):
+                if not supported[neighbor] and self.get_kind(neighbor) != NOT_SOLID:
+                    supported[neighbor] = 1
+                    marked.append(neighbor)
+                    queue.append(neighbor)
+
+        self._mark_dirty(marked)
+
+    def _search(self, start: int) -> tuple[set[int], bool]:
+        # finds the solid cells connected to the start, stopping early if one of them is an anchor
+        width, height = self.grid.width, self.grid.height
+        piece = {start}
+        stack = [start]
+        while stack:
+            index = stack.pop()
+            if self.get_kind(index) == ANCHOR:
+                return piece, True
+
+            # the cell below is pushed last so it is searched first
+            for neighbor in self._get_neighbors(index, width, height):
+                if neighbor not in piece and self.get_kind(neighbor) != NOT_SOLID:
+                    piece.add(neighbor)
+                    stack.append(neighbor)
+
+        return piece, False
+
+    def _get_neighbors(self, index: int, width: int, height: int) -> list[int]:
+        x, y = index % width, index // width
+        neighbors = []
+        if y > 0:
+            neighbors.append(index - width)
+        if x > 0:
+            neighbors.append(index - 1)
+        if x < width - 1:
+            neighbors.append(index + 1)
+        if y < height - 1:
+            neighbors.append(index + width)
+
+        return neighbors
+
+    def _mark_dirty(self, indexes) -> None:
+        width = self.grid.width
+        self._dirty_rows.update(index // width for index in indexes)
+
+    def _get_code_kind(self, code: int) -> int:
+        item_id = code >> ID_SHIFT
+        if item_id in self._anchor_ids:
+            return ANCHOR
+
+        return SOLID if item_id in self._solid_ids else NOT_SOLID
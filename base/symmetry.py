@@ -0,0 +1,140 @@
+"""
+Keeps track of which cells break the left/right symmetry of the map.
+"""
+from array import array
+from itertools import repeat
+from operator import floordiv
+
+from base.citemlist import CItemList, ID_SHIFT, TEAM_MASK
+from base.tile_grid import GridListener, TileGrid
+
+class SymmetryChecker(GridListener):
+    """
+    Compares every row of the grid with its mirror image, where the mirrored side belongs to the other team
+    (the same way mirrored placing works). Only rows that changed since the last check are compared again.
+    The middle column of maps with an odd width is its own mirror image and is never asymmetric.
+    """
+    def __init__(self, grid: TileGrid, item_list: CItemList) -> None:
+        self.grid = grid
+        self.item_list = item_list
+        # the asymmetric cells of every row as (first x, last x) spans
+        self._rows: dict[int, list[tuple[int, int]]] = {}
+        self._dirty_rows = set(range(grid.height))
+        self._mirrored_codes = {0: 0}
+        grid.add_listener(self)
+
+    def cells_changed(self, indexes, old, new) -> None:
+        self._dirty_rows.update(map(floordiv, indexes, repeat(self.grid.width)))
+
+    def cell_changed(self, index: int, old: int, new: int) -> None:
+        self._dirty_rows.add(index // self.grid.width)
+
+    def grid_reset(self, grid: TileGrid) -> None:
+        self._rows.clear()
+        self._dirty_rows = set(range(grid.height))
+
+    def get_mirrored_code(self, code: int) -> int:
+        """
+        Returns the code a cell should have on the other side of the map.
+        """
+        if code not in self._mirrored_codes:
+            item = self.item_list.get_item_by_id(code >> ID_SHIFT)
+            team = code & TEAM_MASK
+            if item is not None and item.sprite.properties.can_swap_teams and team in (0, 1):
+                self._mirrored_codes[code] = (code & ~TEAM_MASK) | (1 - team)
+            else:
+                self._mirrored_codes[code] = code
+
+        return self._mirrored_codes[code]
+
+    def get_mirrored_row(self, y: int) -> array:
+        """
+        Returns how a row looks mirrored over the middle of the map.
+        """
+        width = self.grid.width
+        row = self.grid.codes[y * width:(y + 1) * width]
+        row.reverse()
+        return array('I', map(self.get_mirrored_code, row))
+
+    def update_spans(self) -> set[int]:
+        """
+        Compares the rows that changed since the last update with their mirror image.
+
+        Returns:
+            set[int]: The rows that were compared again.
+        """
+        width = self.grid.width
+        middle = width // 2 if width % 2 else -1
+
+        for y in self._dirty_rows:
+            mirrored = self.get_mirrored_row(y)
+            row = self.grid.codes[y * width:(y + 1) * width]
+            if row == mirrored:
+                self._rows.pop(y, None)
+                continue
+
+            spans = []
+            first = None
+            for x in range(width + 1):
+                different = x < width and x != middle and row[x] != mirrored[x]
+                if different and first is None:
+                    first = x
+                elif not different and first is not None:
+                    spans.append((first, x - 1))
+                    first = None
+
+            if spans:
+                self._rows[y] = spans
+            else:
+                self._rows.pop(y, None)
+
+        dirty, self._dirty_rows = self._dirty_rows, set()
+        return dirty
+
+    def get_row_spans(self, y: int) -> list[tuple[int, int]]:
+        """
+        Returns the asymmetric cells of a row as (first x, last x) spans, as of the last update.
+        """
+        return self._rows.get(y, [])
+
+    def get_asymmetric_spans(self) -> list[tuple[int, int, int]]:
+        """
+        Returns the cells that don't match their mirrored cell, checking the rows that changed.
+
+        Returns:
+            list[tuple[int, int, int]]: Rows of cells as (y, first x, last x) spans.
+        """
+        self.update_spans()
+        return [(y, first, last) for y in sorted(self._rows) for first, last in self._rows[y]]
+
+    def get_asymmetric_count(self) -> int:
+        return sum(last - first + 1 for _, first, last in self.get_asymmetric_spans())
+
+    def get_completion(self, from_left: bool = True) -> tuple[array, array]:
+        """
+        Returns the changes that make one half of the map a mirror image of the other.
+
+        Args:
+            from_left (bool): Whether the left half is copied onto the right, otherwise the right onto the left.
+
+        Returns:
+            tuple[array, array]: The cell indexes to change and the new code for each.
+        """
+        width = self.grid.width
+        # the middle column of odd widths is left alone
+        first, last = ((width + 1) // 2, width) if from_left else (0, width // 2)
+
+        indexes, codes = array('I'), array('I')
+        for y in range(self.grid.height):
+            start = y * width
+            row = self.grid.codes[start + first:start + last]
+            mirrored = self.get_mirrored_row(y)[first:last]
+            if row == mirrored:
+                continue
+
+            for x in range(last - first):
+                if row[x] != mirrored[x]:
+                    indexes.append(start + first + x)
+                    codes.append(mirrored[x])
+
+        return indexes, codes
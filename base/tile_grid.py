@@ -0,0 +1,184 @@
+"""
+Stores the map as a flat array of packed tile codes.
+"""
+from array import array
+from functools import reduce
+from itertools import compress, repeat
+from operator import add, floordiv, mod, mul, xor
+
+from utils.vec2f import Cell
+
+# width and height of a chunk in cells, the unit that is redrawn after a batch of edits
+CHUNK_SIZE = 16
+
+def _cells_hash(indexes, codes) -> int:
+    # an xor of the hash of every filled cell, empty cells are skipped so they don't change the hash.
+    # tuples of ints hash the same in every run, and hashing them with map doesn't loop in Python
+    return reduce(xor, map(hash, compress(zip(indexes, codes), codes)), 0)
+
+class GridListener:
+    """
+    Base class for anything that needs to know about changes to the tile grid.
+    """
+    def cell_changed(self, index: int, old: int, new: int) -> None:
+        """
+        Called after a single cell has changed.
+        """
+
+    def cells_changed(self, indexes, old, new) -> None:
+        """
+        Called once after a batch of cells has changed. Calls cell_changed for each changed cell by default.
+        """
+        for index, old_code, new_code in zip(indexes, old, new):
+            if old_code != new_code:
+                self.cell_changed(index, old_code, new_code)
+
+    def grid_reset(self, grid: 'TileGrid') -> None:
+        """
+        Called after the whole grid has been replaced, such as when loading or creating a map.
+        """
+
+class TileGrid:
+    """
+    A flat, row-major array of tile codes (see CItemList.encode_item) mirroring the canvas tilemap.
+    Code 0 is an empty cell.
+
+    The revision goes up with every change, and the content hash is kept up to date incrementally
+    (an xor of a hash per cell), so two grids with the same tiles have the same hash.
+    """
+    def __init__(self, width: int, height: int) -> None:
+        self.width = int(width)
+        self.height = int(height)
+        self.codes = array('I', bytes(4 * self.width * self.height))
+        self.listeners: list[GridListener] = []
+        self.revision = 0
+        self.content_hash = 0
+
+    def add_listener(self, listener: GridListener) -> None:
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener: GridListener) -> None:
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def index(self, x: int, y: int) -> int:
+        return int(y) * self.width + int(x)
+
+    def position(self, index: int) -> Cell:
+        return Cell.from_index(index, self.width)
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def get(self, index: int) -> int:
+        return self.codes[index]
+
+    def set(self, index: int, code: int) -> int:
+        """
+        Changes a single cell and lets the listeners know.
+
+        Args:
+            index (int): The cell index.
+            code (int): The new tile code.
+
+        Returns:
+            int: The previous code of the cell.
+        """
+        old = self.codes[index]
+        if old == code:
+            return old
+
+        self.codes[index] = code
+        self.revision += 1
+        self.content_hash ^= _cells_hash((index, index), (old, code))
+        for listener in self.listeners:
+            listener.cell_changed(index, old, code)
+
+        return old
+
+    def set_many(self, indexes, codes) -> array:
+        """
+        Changes many cells in one pass and lets the listeners know once.
+
+        Args:
+            indexes: The cell indexes to change, each one once.
+            codes: The new tile code of each cell.
+
+        Returns:
+            array: The previous code of each cell.
+        """
+        grid_codes = self.codes
+        new = array('I', codes)
+        old = array('I', map(grid_codes.__getitem__, indexes))
+        if old == new:
+            return old
+
+        for index, code in zip(indexes, new):
+            grid_codes[index] = code
+
+        self.revision += 1
+        self.content_hash ^= _cells_hash(indexes, old) ^ _cells_hash(indexes, new)
+        for listener in self.listeners:
+            listener.cells_changed(indexes, old, new)
+
+        return old
+
+    def get_chunks(self, indexes) -> "set[tuple[int, int]]":
+        """
+        Returns the (x, y) position of every chunk that contains one of the cells.
+        """
+        columns = self.get_chunk_columns()
+        return {(chunk % columns, chunk // columns) for chunk in self.get_chunk_indexes(indexes)}
+
+    def get_chunk_indexes(self, indexes) -> "set[int]":
+        """
+        Returns the index (row by row) of every chunk that contains one of the cells.
+        The chunk of each cell is worked out with map, so big batches don't loop over their cells in Python.
+        """
+        width, columns = self.width, self.get_chunk_columns()
+        chunk_rows = map(floordiv, indexes, repeat(width * CHUNK_SIZE))
+        chunk_columns = map(floordiv, map(mod, indexes, repeat(width)), repeat(CHUNK_SIZE))
+        return set(map(add, map(mul, chunk_rows, repeat(columns)), chunk_columns))
+
+    def get_chunk_columns(self) -> int:
+        """
+        Returns how many chunks wide the grid is.
+        """
+        return (self.width + CHUNK_SIZE - 1) // CHUNK_SIZE
+
+    def reset(self, width: int, height: int, codes: array = None) -> None:
+        """
+        Replaces the whole grid and lets the listeners know.
+
+        Args:
+            width (int): The new width of the grid.
+            height (int): The new height of the grid.
+            codes (array): The new codes, or None for an empty grid.
+        """
+        self.width = int(width)
+        self.height = int(height)
+
+        if codes is None:
+            codes = array('I', bytes(4 * self.width * self.height))
+
+        if len(codes) != self.width * self.height:
+            raise ValueError(f"Expected {self.width * self.height} codes, got {len(codes)}")
+
+        self.codes = array('I', codes)
+        self.revision += 1
+        self.content_hash = _cells_hash(range(len(self.codes)), self.codes)
+
+        for listener in self.listeners:
+            listener.grid_reset(self)
+
+    def get_state(self) -> tuple[int, int, int]:
+        """
+        Returns a key that is equal for any two grids with the same size and tiles.
+        """
+        return (self.width, self.height, self.content_hash)
+
+    def snapshot(self) -> array:
+        """
+        Returns a copy of the codes that won't change with further edits.
+        """
+        return array('I', self.codes)
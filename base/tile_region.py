@@ -0,0 +1,164 @@
+"""
+A rectangular slice of tile codes, used for the clipboard and prefabs.
+"""
+from array import array
+from dataclasses import dataclass
+
+from base.citemlist import CItemList, ID_SHIFT, ROTATION_MASK, ROTATION_SHIFT
+from base.tile_grid import TileGrid
+
+# region transforms
+FLIP_HORIZONTAL = "flip horizontal"
+FLIP_VERTICAL = "flip vertical"
+ROTATE_CLOCKWISE = "rotate clockwise"
+ROTATE_COUNTERCLOCKWISE = "rotate counterclockwise"
+TRANSFORMS = (FLIP_HORIZONTAL, FLIP_VERTICAL, ROTATE_CLOCKWISE, ROTATE_COUNTERCLOCKWISE)
+
+# how the angle of a rotatable item changes with each transform
+_ANGLE_CHANGES = {
+    FLIP_HORIZONTAL: lambda angle: -angle,
+    FLIP_VERTICAL: lambda angle: 180 - angle,
+    ROTATE_CLOCKWISE: lambda angle: angle + 90,
+    ROTATE_COUNTERCLOCKWISE: lambda angle: angle - 90
+}
+
+def transform_cells(values: array, width: int, height: int, transform: str) -> tuple[array, int, int]:
+    """
+    Moves the values of a row-major block of cells around, without changing them.
+
+    Args:
+        values (array): The value of every cell, row by row.
+        width (int): The width of the block.
+        height (int): The height of the block.
+        transform (str): One of TRANSFORMS.
+
+    Returns:
+        tuple[array, int, int]: The moved values and the new width and height of the block.
+    """
+    result = array(values.typecode)
+
+    if transform == FLIP_HORIZONTAL:
+        for start in range(0, width * height, width):
+            row = values[start:start + width]
+            row.reverse()
+            result.extend(row)
+
+        return result, width, height
+
+    if transform == FLIP_VERTICAL:
+        for start in range((height - 1) * width, -1, -width):
+            result.extend(values[start:start + width])
+
+        return result, width, height
+
+    # each row of a rotated block is a column of the original
+    if transform == ROTATE_CLOCKWISE:
+        for column in range(width):
+            row = values[column::width]
+            row.reverse()
+            result.extend(row)
+
+        return result, height, width
+
+    if transform == ROTATE_COUNTERCLOCKWISE:
+        for column in range(width - 1, -1, -1):
+            result.extend(values[column::width])
+
+        return result, height, width
+
+    raise ValueError(f"Unknown region transform: {transform}")
+
+@dataclass
+class TileRegion:
+    """
+    A row-major block of tile codes (see CItemList.encode_item), holding the item, team and rotation of every cell.
+    Code 0 is an empty cell, which is left untouched when the region is stamped.
+    """
+    width: int
+    height: int
+    codes: array
+
+    @classmethod
+    def from_grid(cls, grid: TileGrid, x: int, y: int, width: int, height: int) -> 'TileRegion':
+        """
+        Copies a rectangle of the grid, clipped to the grid.
+
+        Args:
+            grid (TileGrid): The grid to copy from.
+            x (int): The x position of the top left cell.
+            y (int): The y position of the top left cell.
+            width (int): The width of the rectangle.
+            height (int): The height of the rectangle.
+
+        Returns:
+            TileRegion: The copied region, or None if the rectangle is outside of the grid.
+        """
+        left, top = max(x, 0), max(y, 0)
+        right, bottom = min(x + width, grid.width), min(y + height, grid.height)
+        if left >= right or top >= bottom:
+            return None
+
+        codes = array('I')
+        for row in range(top, bottom):
+            start = row * grid.width
+            codes.extend(grid.codes[start + left:start + right])
+
+        return cls(right - left, bottom - top, codes)
+
+    def get_cells(self, grid: TileGrid, x: int, y: int, include_empty: bool = False) -> tuple[array, array]:
+        """
+        Returns where the region's tiles go when stamped onto a grid, skipping out of bounds cells.
+
+        Args:
+            grid (TileGrid): The grid to stamp onto.
+            x (int): The x position of the top left cell.
+            y (int): The y position of the top left cell.
+            include_empty (bool): Whether empty cells of the region clear the grid, otherwise they are skipped.
+
+        Returns:
+            tuple[array, array]: The cell indexes in the grid and the code for each.
+        """
+        indexes, codes = array('I'), array('I')
+        first_x, last_x = max(0, -x), min(self.width, grid.width - x)
+
+        for row in range(max(0, -y), min(self.height, grid.height - y)):
+            grid_row = (y + row) * grid.width + x
+            region_row = row * self.width
+            for column in range(first_x, last_x):
+                code = self.codes[region_row + column]
+                if code != 0 or include_empty:
+                    indexes.append(grid_row + column)
+                    codes.append(code)
+
+        return indexes, codes
+
+    def transformed(self, transform: str, item_list: CItemList) -> 'TileRegion':
+        """
+        Returns a flipped or rotated copy of the region.
+        Rotatable items are turned to match, which also keeps the angle saved in their alpha channel right.
+
+        Args:
+            transform (str): One of TRANSFORMS.
+            item_list (CItemList): Used to find which items can rotate.
+
+        Returns:
+            TileRegion: The transformed region.
+        """
+        codes, width, height = transform_cells(self.codes, self.width, self.height, transform)
+
+        # each distinct code is turned once
+        change_angle = _ANGLE_CHANGES[transform]
+        turned = {}
+        for code in set(codes):
+            item = item_list.get_item_by_id(code >> ID_SHIFT)
+            if item is None or not item.sprite.properties.is_rotatable:
+                turned[code] = code
+                continue
+
+            angle = change_angle(((code & ROTATION_MASK) >> ROTATION_SHIFT) * 90) % 360
+            turned[code] = (code & ~ROTATION_MASK) | ((angle // 90) << ROTATION_SHIFT)
+
+        return TileRegion(width, height, array('I', map(turned.__getitem__, codes)))
+
+    def is_empty(self) -> bool:
+        return not any(self.codes)
@@ -5,20 +5,53 @@ Used to display images and interact with the map.
 import atexit
 import math
 import os
+from array import array
 from datetime import datetime
-
-from PyQt6.QtCore import Qt, QPoint
-from PyQt6.QtGui import QBrush, QColor, QPainter, QPen, QShortcut, QKeySequence, QKeyEvent, QCursor
-from PyQt6.QtWidgets import QGraphicsItemGroup, QGraphicsScene, QGraphicsView, QSizePolicy
+from itertools import compress, repeat
+from operator import ne
+
+from PyQt6.QtCore import Qt, QPoint, QRectF, QTimer
+from PyQt6.QtGui import (
+    QBrush, QColor, QImage, QPainter, QPainterPath, QPen, QPixmap, QShortcut, QKeySequence, QKeyEvent, QCursor
+)
+from PyQt6.QtWidgets import (
+    QGraphicsItemGroup, QGraphicsPathItem, QGraphicsPixmapItem, QGraphicsRectItem, QGraphicsScene, QGraphicsView,
+    QMessageBox, QSizePolicy
+)
 from PyQt6.QtOpenGLWidgets import QOpenGLWidget
 
+from base.autotile import Autotiler
 from base.citem import CItem
-from base.citemlist import CItemList
+from base.citemlist import CItemList, ID_SHIFT, TEAM_MASK
+from base.find_replace import MATCH_ITEM, find_cells, get_replacement_codes
+from base.flood_fill import DEFAULT_MAX_AREA, SAME_ITEM, flood_fill
+from base.footprint import FootprintIndex
+from base.history import EditHistory
 from base.kag_image import KagImage
+from base.lighting import MAX_LIGHT, LightMap
+from base.map_stats import MapStats
+from base.map_writer import FAST_PROFILE, wait_for_saves
 from base.renderer import Renderer
+from base.session_journal import SessionJournal
+from base.spatial_index import SpatialIndex
+from base.support import SupportAnalyzer
+from base.symmetry import SymmetryChecker
+from base.tile_grid import CHUNK_SIZE, TileGrid
+from base.tile_region import (
+    FLIP_HORIZONTAL, FLIP_VERTICAL, ROTATE_CLOCKWISE, ROTATE_COUNTERCLOCKWISE, TileRegion, transform_cells
+)
 from core.communicator import Communicator
+from utils.file_handler import FileHandler
+from utils.raster import brush_spans, ellipse_spans, line_cells, line_spans, rect_spans
 from utils.vec2f import Vec2f
 
+# how often batched edits are written to the session journal, in milliseconds
+JOURNAL_FLUSH_INTERVAL = 2000
+# milliseconds between applying buffered mouse input, about one frame at 60 fps
+FRAME_INTERVAL = 16
+# tools that are dragged out from one corner to another and used on release
+SHAPE_TOOLS = ("rectangle", "line", "ellipse", "select")
+
 class Canvas(QGraphicsView):
     """
     The main drawing and interaction surface within the map maker.
@@ -59,8 +92,7 @@ class Canvas(QGraphicsView):
 
         self._build_background_rect()
 
-        self._canvas_history = []
-        self._canvas_history_index = 0
+        self.history = EditHistory()
 
         self._holding_lmb = False
         self._holding_rmb = False
@@ -69,10 +101,34 @@ class Canvas(QGraphicsView):
 
         self._last_pan_point = None
 
-        # list of CItems
-        self.tilemap = {}
-        # list of sprites on the canvas
-        self.graphics_items = {}
+        # mouse input is buffered and applied once per frame
+        self._stroke_buffer = []
+        self._stroke_click_index = 1
+        # cells painted by the current stroke, so each is only painted once
+        self._stroke_mask: bytearray = None
+        self._cursor_pos = None
+        self._cursor_state = None
+        self._shape_start = None
+        self._shape_end = None
+        self._shape_click_index = 1
+        self._shape_preview: QGraphicsPathItem = None
+        self._shape_preview_state = None
+
+        # the selected rectangle as (left, top, right, bottom) cells, and the copied tiles
+        self.selection: tuple[int, int, int, int] = None
+        self.clipboard: TileRegion = None
+        self._selection_outline: QGraphicsRectItem = None
+        # the region being pasted, which follows the cursor until it is stamped
+        self._stamp: TileRegion = None
+        self._stamp_preview: QGraphicsPixmapItem = None
+
+        self._frame_timer = QTimer(self)
+        self._frame_timer.setSingleShot(True)
+        self._frame_timer.setInterval(FRAME_INTERVAL)
+        self._frame_timer.timeout.connect(self.flush_frame)
+
+        # the tile code of every cell, which the renderer draws a chunk at a time
+        self.grid = TileGrid(size.x, size.y)
 
         self._build_tile_grid()
         self.communicator.settings["tile grid visible"] = False
@@ -80,9 +136,41 @@ class Canvas(QGraphicsView):
         self.item_list = CItemList()
         self.rotation = 0
 
+        # highlights the cells that break the map's left/right symmetry
+        self.symmetry = SymmetryChecker(self.grid, self.item_list)
+        # a highlight per band of CHUNK_SIZE rows, so edits only redraw the bands they changed
+        self._symmetry_overlays: dict[int, QGraphicsPathItem] = {}
+
+        # the cells covered by blobs bigger than one cell
+        self.footprints = FootprintIndex(self.grid, self.item_list, self.grid_spacing, self.default_zoom_scale)
+        # where each item is, for tools that look for items around the map
+        self.spatial = SpatialIndex(self.grid)
+        # item counts for the statistics panel, read from the spatial index
+        self.stats = MapStats(self.spatial, self.item_list)
+
+        # highlights the blocks that would collapse in game
+        self.support = SupportAnalyzer(self.grid, self.item_list)
+        self._support_overlays: dict[int, QGraphicsPathItem] = {}
+
+        # draws tiles with the world.png variant that matches the tiles around them
+        self.autotiler = Autotiler(self.grid, self.item_list)
+
+        # darkens the cells that light from the sky and light-emitting items doesn't reach
+        self.lighting = LightMap(self.grid, self.item_list)
+        self._light_overlays: dict[int, QGraphicsPixmapItem] = {}
+        # whether edits were made since the overlays were last updated, which happens once per frame
+        self._overlays_dirty = False
+
         # save map on exiting the app
         atexit.register(self._save_map_at_exit, datetime.now())
 
+        # crash recovery, started by recover_session
+        session_path = os.path.join(FileHandler().paths.get("autosave_path"), "session")
+        self.session_journal = SessionJournal(session_path, self.item_list.get_fingerprint())
+        self._journal_timer = QTimer(self)
+        self._journal_timer.timeout.connect(self.session_journal.flush)
+        atexit.register(self.session_journal.close)
+
         # create shortcuts for handling key events
         self.create_shortcuts()
 
@@ -149,58 +237,226 @@ class Canvas(QGraphicsView):
         ctrl_y_shortcut = QShortcut(QKeySequence(modifier | Qt.Key.Key_Y), self)
         ctrl_y_shortcut.activated.connect(self._redo)
 
+        # ctrl + c, ctrl + x, ctrl + v
+        ctrl_c_shortcut = QShortcut(QKeySequence(modifier | Qt.Key.Key_C), self)
+        ctrl_c_shortcut.activated.connect(self.copy_selection)
+        ctrl_x_shortcut = QShortcut(QKeySequence(modifier | Qt.Key.Key_X), self)
+        ctrl_x_shortcut.activated.connect(self.cut_selection)
+        ctrl_v_shortcut = QShortcut(QKeySequence(modifier | Qt.Key.Key_V), self)
+        ctrl_v_shortcut.activated.connect(self.paste)
+
+        # delete
+        delete_shortcut = QShortcut(QKeySequence(Qt.Key.Key_Delete), self)
+        delete_shortcut.activated.connect(self.delete_selection)
+
+        # escape
+        escape_shortcut = QShortcut(QKeySequence(Qt.Key.Key_Escape), self)
+        escape_shortcut.activated.connect(self.cancel_stamp)
+        escape_shortcut.activated.connect(self.clear_selection)
+
+        # h, v, ] and [ flip and rotate the selection
+        transforms = {
+            Qt.Key.Key_H: FLIP_HORIZONTAL, Qt.Key.Key_V: FLIP_VERTICAL,
+            Qt.Key.Key_BracketRight: ROTATE_CLOCKWISE, Qt.Key.Key_BracketLeft: ROTATE_COUNTERCLOCKWISE
+        }
+        for key, transform in transforms.items():
+            shortcut = QShortcut(QKeySequence(key), self)
+            shortcut.activated.connect(lambda transform=transform: self.transform_selection(transform))
+
     def _undo(self) -> None:
         """
-        Undoes the last action performed on the canvas.
-        Moves back one step in the canvas history if available.
+        Undoes the last stroke performed on the canvas.
 
         Returns:
             None
         """
-        if self._canvas_history_index == 0:
+        transaction = self.history.undo()
+        if transaction is None:
             return
 
-        self._canvas_history_index -= 1
-        placing, pos, previous_item = self._canvas_history[self._canvas_history_index]
+        self.apply_codes(*transaction.undo_changes())
 
-        grid_pos = self.snap_to_grid(pos)
+    def _redo(self) -> None:
+        """
+        Redoes the previously undone stroke on the canvas.
 
-        if previous_item is not None:
-            placing = previous_item
+        Returns:
+            None
+        """
+        transaction = self.history.redo()
+        if transaction is None:
+            return
+
+        self.apply_codes(*transaction.redo_changes())
+
+    def apply_codes(self, cells, codes) -> None:
+        """
+        Sets cells to exact tile codes in a single batched render, without merging or recording history.
+
+        Args:
+            cells: The cell indexes to change, in order.
+            codes: The tile code for each cell.
+
+        Returns:
+            None
+        """
+        self.place_many(cells, codes, record=False)
+
+    def place_many(self, cells, codes, merge: bool = False, record: bool = True) -> int:
+        """
+        Places tile codes on many cells at once.
+        The grid is updated in one pass, the changes are recorded as one undo step
+        (or into the current stroke), and every affected chunk is redrawn once.
+
+        Args:
+            cells: The cell indexes to place on, in order. Later placements on the same cell win.
+            codes: The tile code for each cell, or a single code for every cell.
+            merge (bool): Whether to place like the brush does, merging with the existing tiles.
+                Otherwise the codes are placed exactly as given.
+            record (bool): Whether to record the changes into the history.
+
+        Returns:
+            int: The amount of cells that changed.
+        """
+        grid_codes = self.grid.codes
+        cell_count = len(grid_codes)
+        cells = list(cells)
+        codes = [codes] * len(cells) if isinstance(codes, int) else list(codes)
+        if cells and (min(cells) < 0 or max(cells) >= cell_count):
+            inside = [0 <= index < cell_count for index in cells]
+            cells, codes = list(compress(cells, inside)), list(compress(codes, inside))
+
+        # the final code of every cell, resolving each placement against the one before it
+        if merge and len(set(cells)) != len(cells):
+            pending = {}
+            resolved = {}
+            for index, code in zip(cells, codes):
+                existing = pending[index] if index in pending else grid_codes[index]
+                key = (code, existing)
+                if key not in resolved:
+                    resolved[key] = self.renderer.resolve_placement(code, existing)
+
+                pending[index] = resolved[key]
+
+        # every cell is only placed on once, so each distinct (code, existing code) pair is resolved once
+        elif merge:
+            keys = list(zip(codes, map(grid_codes.__getitem__, cells)))
+            resolved = {key: self.renderer.resolve_placement(*key) for key in set(keys)}
+            pending = dict(zip(cells, map(resolved.__getitem__, keys)))
 
         else:
-            placing = self.item_list.get_item_by_name('sky').copy()
+            pending = dict(zip(cells, codes))
 
-        self.place_item(grid_pos, 1, placing, False)
+        changed = list(map(ne, map(grid_codes.__getitem__, pending), pending.values()))
+        indexes = array('I', compress(pending, changed))
+        if not indexes:
+            return 0
 
-    def _redo(self) -> None:
+        new = array('I', compress(pending.values(), changed))
+
+        # codes without an image are left empty
+        missing = {code for code in set(new) if not self.renderer.can_draw(code)}
+        if missing:
+            new = array('I', [0 if code in missing else code for code in new])
+
+        old = self.grid.set_many(indexes, new)
+        if record:
+            self.history.record_many(indexes, old, new)
+
+        chunks = self.grid.get_chunk_indexes(indexes)
+        if self.communicator.settings.get("autotile preview", False):
+            # the tiles next to the edits can change variant too
+            chunks |= self.grid.get_chunk_indexes(self.autotiler.update())
+
+        self._draw_chunks(chunks)
+
+        # the overlays are updated with the next frame, however many batches are placed before it
+        self._overlays_dirty = True
+        if not self._frame_timer.isActive():
+            self._frame_timer.start()
+
+        return len(indexes)
+
+    def _draw_chunks(self, chunks) -> None:
+        # every chunk is drawn once however many of its cells changed
+        variants = None
+        if self.communicator.settings.get("autotile preview", False):
+            variants = self.autotiler.indexes
+
+        self.setUpdatesEnabled(False)
+        try:
+            self.renderer.draw_chunks(chunks, variants)
+
+        finally:
+            self.setUpdatesEnabled(True)
+
+    def begin_stroke(self) -> None:
         """
-        Redoes the previously undone action on the canvas.
-        Moves forward one step in the canvas history if available.
+        Starts grouping placed tiles into a single undo step.
 
         Returns:
             None
         """
-        if self._canvas_history_index >= len(self._canvas_history):
-            return
+        self.history.begin()
+        self._stroke_mask = bytearray(len(self.grid.codes))
+
+    def end_stroke(self) -> None:
+        """
+        Finishes the current undo step.
+
+        Returns:
+            None
+        """
+        self.history.commit()
+        self._stroke_mask = None
+
+    def get_cell_index(self, pos) -> int:
+        """
+        Returns the flat index of a grid position, as used by the history and tile grid.
+        """
+        x, y = pos
+        return int(y) * self.size.x + int(x)
+
+    def recover_session(self) -> None:
+        """
+        Offers to restore the map from a session that didn't close properly,
+        then starts journaling edits for this session.
+
+        Returns:
+            None
+        """
+        journal = self.session_journal
+        if journal.has_session():
+            answer = QMessageBox.question(
+                self,
+                "Recover Session",
+                "The map maker didn't close properly last time. Recover the unsaved map?"
+            )
 
-        placing, pos, _ = self._canvas_history[self._canvas_history_index]
+            session = None
+            if answer == QMessageBox.StandardButton.Yes:
+                session = journal.read_session()
 
-        grid_pos = self.snap_to_grid(pos)
-        self.place_item(grid_pos, 1, placing.copy(), False)
+            if session is not None:
+                self.load_codes(*session)
 
-        self._canvas_history_index += 1
+        journal.start(self.grid)
+        self._journal_timer.start(JOURNAL_FLUSH_INTERVAL)
 
-    def wipe_history(self) -> None:
+    def load_codes(self, width: int, height: int, codes) -> None:
         """
-        Wipes future history entries when a new action is performed after undoing.
+        Replaces the map with one made from tile codes.
+
+        Args:
+            width (int): The width of the map.
+            height (int): The height of the map.
+            codes: The tile code of every cell, row by row.
 
         Returns:
             None
         """
-        if self._canvas_history_index < len(self._canvas_history):
-            # remove all entries after the current index
-            self._canvas_history = self._canvas_history[:self._canvas_history_index]
+        self.resize_canvas(Vec2f(width, height), codes=codes)
+        self.recenter_canvas()
 
     def set_grid_visible(self, show: bool = None) -> None:
         """
@@ -220,7 +476,7 @@ class Canvas(QGraphicsView):
 
     def force_rerender(self) -> None:
         """
-        Re-renders the entire canvas by re-drawing all items in the tilemap.
+        Re-renders the entire canvas by re-drawing all items in the tile grid.
 
         Args:
             None
@@ -229,22 +485,26 @@ class Canvas(QGraphicsView):
             None
         """
         self.canvas.clear()
+        self.renderer.clear()
         self._build_background_rect()
-
-        # clear the graphics_items dictionary
-        if hasattr(self, 'graphics_items'):
-            self.graphics_items.clear()
-
-        # redraw all items
-        # needs to be a copy because they can change here
-        for pos, item in list(self.tilemap.items()):
-            if pos is None or item is None:
-                continue
-
-            x, y = pos
-            scene_pos = Vec2f(x, y) * self.grid_spacing
-
-            self.renderer.render_item(item, scene_pos, Vec2f(x, y), False, item.sprite.rotation)
+        self._cursor_state = None
+        self._shape_preview = None
+        self._shape_preview_state = None
+        self._selection_outline = None
+        self._stamp_preview = None
+        self._symmetry_overlays = {}
+        self._support_overlays = {}
+        self._light_overlays = {}
+        self.selection = None
+        self.cancel_stamp()
+
+        # redraw every chunk of the tile grid
+        if self.communicator.settings.get("autotile preview", False):
+            self.autotiler.update()
+
+        rows = (self.grid.height + CHUNK_SIZE - 1) // CHUNK_SIZE
+        self._draw_chunks(range(self.grid.get_chunk_columns() * rows))
+        self._update_overlays(redraw=True)
 
     def rotate(self, rev: bool) -> None:
         """
@@ -310,11 +570,19 @@ class Canvas(QGraphicsView):
         Returns:
             None
         """
+        # let saves that are still in flight finish first
+        wait_for_saves()
+
         # check if map is blank
-        if not self.tilemap:
+        if not any(self.grid.codes):
             print("Map is blank. Not saving.")
             return
 
+        kag_image = KagImage()
+        if kag_image.is_saved():
+            print("Map is unchanged since it was last saved. Not saving.")
+            return
+
         date_str = timestamp.strftime("%d-%m-%Y")
         path = os.path.join(self.exec_path, "Maps", "Autosave", date_str)
 
@@ -324,7 +592,7 @@ class Canvas(QGraphicsView):
         file_name = timestamp.strftime("%d-%m-%Y_%H-%M-%S")
         file_path = os.path.join(path, file_name)
 
-        KagImage().save_map(file_path + ".png")
+        kag_image.save_map(file_path + ".png", background=False, profile=FAST_PROFILE)
 
     def _build_background_rect(self) -> None:
         """
@@ -343,127 +611,227 @@ class Canvas(QGraphicsView):
         rect.setZValue(-1000000)
         self.canvas.addItem(rect)
 
-    def add_item(self, event, click_index: int) -> None:
+    def add_items(self, points: list, click_index: int) -> None:
         """
-        Requests to add an item at position (place item between frames)
+        Places items along the path from the last mouse position through each point.
+
+        Args:
+            points (list): The grid positions the mouse moved through, in order.
+            click_index (int): The index of the click that is placing the items.
+
+        Returns:
+            None
         """
         recent_pos = self.communicator.mouse_pos
-        pos = self.get_grid_pos(event)
+        cells = []
+        for pos in points:
+            # every cell between the previous and current position, once each
+            # the previous position was already placed
+            if len(recent_pos) != 0 and pos != recent_pos:
+                cells.extend(line_cells(*recent_pos, *pos)[1:])
+
+            recent_pos = pos
+
+        self.paint(cells, click_index)
+
+        self.communicator.old_mouse_pos = self.communicator.mouse_pos
+        self.communicator.mouse_pos = recent_pos
+
+    def flush_frame(self) -> None:
+        """
+        Applies the mouse input gathered since the last frame as one batched scene update.
 
-        # place items between frames
-        if (len(pos) == 0 or len(recent_pos) == 0):
+        Returns:
+            None
+        """
+        if self._stroke_buffer:
+            points, self._stroke_buffer = self._stroke_buffer, []
+            self.add_items(points, self._stroke_click_index)
+
+        # everything placed so far is drawn with this frame
+        self._frame_timer.stop()
+        if self._overlays_dirty:
+            self._update_overlays()
+
+        self._update_shape_preview()
+        self._update_cursor()
+
+    def _update_cursor(self) -> None:
+        if self._cursor_pos is None:
             return
 
-        # prevent placing if not in a new grid position and new block
-        if self._canvas_history and len(self._canvas_history) > 0:
-            old_item = self._canvas_history[-1][0]
-            placing_item: CItem = self.communicator.get_selected_tile(click_index).copy()
-            # if same position and same item type, don't place again
-            if pos == recent_pos and old_item.name_data.name == placing_item.name_data.name:
-                return
-
-        # calculate points between current and previous position
-        delta = (pos[0] - recent_pos[0], pos[1] - recent_pos[1])
-        steps = max(abs(delta[0]), abs(delta[1]))
-
-        processed_positions = set()
-        if steps in (0, 1):
-            if Vec2f(pos) not in processed_positions:
-                self.place_item(pos, click_index)
-                processed_positions.add(Vec2f(pos))
-        else:
-            for i in range(steps + 1):
-                x = recent_pos[0] + i * delta[0] / steps
-                y = recent_pos[1] + i * delta[1] / steps
-                grid_pos = (int(x), int(y))
+        # only move the cursor when it changes cells
+        state = (self._cursor_pos, self.communicator.settings.get("mirrored over x", False))
+        if state == self._cursor_state:
+            return
 
-                # only process each position once during a drag
-                if grid_pos not in processed_positions:
-                    self.place_item(grid_pos, click_index)
-                    processed_positions.add(grid_pos)
+        self._cursor_state = state
+        x, y = self._cursor_pos
+        self.renderer.render_cursor(Vec2f(x * self.grid_spacing, y * self.grid_spacing))
 
-        self.update_mouse_pos(event)
+        if self._stamp_preview is not None:
+            self._stamp_preview.setPos(x * self.grid_spacing, y * self.grid_spacing)
 
-    def place_item(self, grid_pos, click_index: int, item: CItem = None, add_to_history: bool = True) -> None:
+    def paint(self, cells, click_index: int, erase_owners: bool = False) -> None:
         """
-        Places an item on the canvas based on the given event and click index.
+        Stamps the brush on every cell of a stroke, skipping cells the stroke has already painted.
 
         Args:
-            grid_pos: The grid position to place the item at.
-            click_index: The index of the click that triggered the item placement.
+            cells: The grid positions to center the brush on, in order.
+            click_index: The index of the click that is painting.
+            erase_owners (bool): Whether erasing an empty cell under a big blob erases the blob,
+                only used for the click that starts a stroke.
 
         Returns:
             None
         """
+        settings = self.communicator.settings
+        spans = brush_spans(settings.get("brush size", 1), settings.get("brush shape", "square"))
+
+        mask = self._stroke_mask
+        if mask is None or len(mask) != len(self.grid.codes):
+            mask = bytearray(len(self.grid.codes))
+
+        width, height = self.size.x, self.size.y
+        indexes = array('I')
+        for x, y in cells:
+            for offset_y, first, last in spans:
+                row_y = y + offset_y
+                first, last = max(x + first, 0), min(x + last, width - 1)
+                if not 0 <= row_y < height or first > last:
+                    continue
+
+                # only the runs of the span that haven't been painted yet
+                start, end = row_y * width + first, row_y * width + last + 1
+                found = mask.find(0, start, end)
+                while found != -1:
+                    painted = mask.find(1, found, end)
+                    if painted == -1:
+                        painted = end
+
+                    indexes.extend(range(found, painted))
+                    mask[found:painted] = b"\x01" * (painted - found)
+                    found = mask.find(0, painted, end)
+
+        self.place_cells(indexes, click_index, erase_owners=erase_owners)
+
+    def place_cells(self, indexes, click_index: int, item: CItem = None, erase_owners: bool = False) -> int:
+        """
+        Places the selected item on cells the same way the brush does,
+        including the mirrored cells when mirroring is enabled.
+        The changes are recorded into the current undo step, or as their own.
 
-        # undo / redo support
-        if item is None:
-            placing_item: CItem = self.communicator.get_selected_tile(click_index).copy()
+        Args:
+            indexes: The cell indexes to place the item at.
+            click_index: The index of the click that triggered the item placement.
+            item: The item to place instead of the selected one.
+            erase_owners (bool): Whether erasing an empty cell under a big blob erases the blob instead.
 
-        else:
-            placing_item = item.copy()
+        Returns:
+            int: The amount of cells that changed.
+        """
+        code, mirrored_code = self._get_placing_codes(click_index, item)
 
-        eraser: bool = placing_item.is_eraser()
+        # clicking an empty cell under a big blob erases the blob
+        if code == 0 and erase_owners:
+            indexes = self._get_owners(indexes)
 
-        # do nothing if out of bounds
-        if self.is_out_of_bounds(grid_pos):
-            return
+        elif self.communicator.settings.get("prevent blob overlap", False):
+            indexes = self._remove_overlapping(indexes, code)
 
-        tilemap_x, tilemap_y = grid_pos
-        snapped_pos = Vec2f(tilemap_x, tilemap_y)
+        if not self.communicator.settings.get("mirrored over x", False):
+            return self.place_many(indexes, code, merge=True)
 
-        # ignore if we are trying to erase an already empty tile
-        if eraser and self.tilemap.get(snapped_pos) is None:
-            return
+        width = self.size.x
+        cells, codes = array('I'), array('I')
+        for index in indexes:
+            cells.append(index)
+            codes.append(code)
 
-        scene_x = tilemap_x * self.grid_spacing # for the location on the canvas
-        scene_y = tilemap_y * self.grid_spacing
+            # calculate mirrored position
+            tilemap_x = index % width
+            mirrored_x = width - 1 - tilemap_x
+            if mirrored_x != tilemap_x:
+                cells.append(index - tilemap_x + mirrored_x)
+                codes.append(mirrored_code)
+
+        return self.place_many(cells, codes, merge=True)
+
+    def _get_owners(self, indexes) -> array:
+        # cells with their own tile are erased as they are, empty ones become the item shown on top of them
+        owners = array('I')
+        codes = self.grid.codes
+        get_owner = self.footprints.get_owner
+        for index in indexes:
+            owner = get_owner(index) if codes[index] == 0 else index
+            if owner != -1:
+                owners.append(owner)
+
+        return owners
+
+    def _remove_overlapping(self, indexes, code: int) -> array:
+        # only blobs are kept apart, tiles can be placed anywhere
+        item = self.item_list.get_item_by_id(code >> ID_SHIFT)
+        if item is None or item.type != "blob":
+            return indexes
+
+        footprints = self.footprints
+        claimed = set()
+        kept = array('I')
+        for index in indexes:
+            cells = footprints.get_cells(index, code)
+            if footprints.get_overlaps(index, code) or not claimed.isdisjoint(cells):
+                continue
 
-        scene_pos = Vec2f(scene_x, scene_y)
+            claimed.update(cells)
+            kept.append(index)
 
-        if placing_item.sprite.properties.is_rotatable:
-            placing_item.sprite.rotation = self.rotation
+        return kept
 
-        placing_item_copy = placing_item.copy()
-        if placing_item.sprite.properties.can_swap_teams:
-            halfway = tilemap_x / 2 <= self.size.x
-            placing_item.swap_team(1 if not halfway else 0)
+    def _get_placing_codes(self, click_index: int, item: CItem = None) -> tuple[int, int]:
+        if item is None:
+            item = self.communicator.get_selected_tile(click_index)
 
-        mirror = self.communicator.settings.get("mirrored over x", False)
+        placing_item: CItem = item.copy()
+        if placing_item.sprite.properties.is_rotatable:
+            placing_item.sprite.rotation = self.rotation
 
-        # undo / redo history
-        if add_to_history:
-            previous_item = self.tilemap.get(snapped_pos)
-            if previous_item is not None:
-                previous_item = previous_item.copy()
+        code = 0 if placing_item.is_eraser() else self.item_list.encode_item(placing_item)
+        mirrored_code = code
 
-            if item is None:
-                if self._canvas_history_index >= 1000:
-                    self._canvas_history.pop(0)
-                    self._canvas_history_index -= 1
+        # the mirrored side belongs to the other team
+        if code != 0 and placing_item.sprite.properties.can_swap_teams:
+            team = self.communicator.team
+            mirrored_team = 1 - team if team in (0, 1) else team
+            code = (code & ~TEAM_MASK) | (team & TEAM_MASK)
+            mirrored_code = (code & ~TEAM_MASK) | (mirrored_team & TEAM_MASK)
 
-                if self._canvas_history_index < len(self._canvas_history):
-                    self.wipe_history()
+        return code, mirrored_code
 
-                self._canvas_history.append((placing_item.copy(), scene_pos, previous_item))
-                self._canvas_history_index += 1
+    def fill(self, grid_pos, click_index: int) -> None:
+        """
+        Fills the region connected to a cell with the selected item, as one undo step.
 
-        self.renderer.render_item(placing_item, scene_pos, snapped_pos, eraser, self.rotation)
+        Args:
+            grid_pos: The grid position to start filling from.
+            click_index: The index of the click that triggered the fill.
 
-        if mirror:
-            # calculate mirrored position
-            mirrored_x = self.size.x - 1 - tilemap_x
-            mirrored_scene_x = mirrored_x * self.grid_spacing
+        Returns:
+            None
+        """
+        x, y = grid_pos
+        if self.is_out_of_bounds((x, y)):
+            return
 
-            # only place if mirrored position is valid
-            if not self.is_out_of_bounds((mirrored_x, tilemap_y)) and mirrored_x != tilemap_x:
-                mirrored_scene_pos = Vec2f(mirrored_scene_x, scene_y)
-                mirrored_snapped_pos = Vec2f(mirrored_x, tilemap_y)
+        mode = self.communicator.settings.get("fill boundary", SAME_ITEM)
+        max_area = self.communicator.settings.get("fill max area", DEFAULT_MAX_AREA)
 
-                if placing_item.sprite.properties.can_swap_teams:
-                    placing_item_copy.swap_team(0 if not halfway else 1)
+        cells = flood_fill(self.grid, x, y, mode, max_area, self.item_list)
+        if cells is None:
+            print(f"Fill area is larger than {max_area} tiles. Not filling.")
+            return
 
-                self.renderer.render_item(placing_item_copy, mirrored_scene_pos, mirrored_snapped_pos, eraser, self.rotation)
+        self.place_cells(cells, click_index)
 
     def snap_to_grid(self, pos) -> tuple:
         """
@@ -522,6 +890,559 @@ class Canvas(QGraphicsView):
             self.setDragMode(QGraphicsView.DragMode.NoDrag)
             self.viewport().unsetCursor()
 
+    def get_shape_spans(self, start, end) -> list[tuple[int, int, int]]:
+        """
+        Returns the cells covered by the selected shape tool between two corner cells.
+
+        Args:
+            start: The grid position the shape was started at.
+            end: The grid position of the opposite corner.
+
+        Returns:
+            list[tuple[int, int, int]]: Rows of cells as (y, first x, last x) spans.
+        """
+        tool = self.communicator.tool
+        filled = self.communicator.settings.get("fill shapes", False)
+
+        if tool == "rectangle":
+            return rect_spans(*start, *end, filled)
+
+        if tool == "ellipse":
+            return ellipse_spans(*start, *end, filled)
+
+        if tool == "line":
+            return line_spans(*start, *end)
+
+        if tool == "select":
+            return rect_spans(*start, *end, False)
+
+        return []
+
+    def place_shape(self, click_index: int) -> None:
+        """
+        Places the shape being dragged out, if there is one, as one undo step.
+
+        Args:
+            click_index: The index of the click that started the shape.
+
+        Returns:
+            None
+        """
+        if self._shape_start is None or click_index != self._shape_click_index:
+            return
+
+        start, end = self._shape_start, self._shape_end
+        spans = self.get_shape_spans(start, end)
+        self._shape_start = self._shape_end = None
+        self._update_shape_preview()
+
+        if self.communicator.tool == "select":
+            # clicking a big blob selects all of it
+            owner = -1
+            if start == end and not self.is_out_of_bounds(start):
+                owner = self.footprints.get_owner(self.get_cell_index(start))
+
+            if owner != -1:
+                left, top, right, bottom = self.footprints.get_bounds(owner)
+                start, end = (left, top), (right, bottom)
+
+            self.select_region(start, end)
+            return
+
+        indexes = array('I')
+        for y, first, last in self._clip_spans(spans):
+            row = y * self.size.x
+            indexes.extend(range(row + first, row + last + 1))
+
+        self.place_cells(indexes, click_index)
+
+    def _clip_spans(self, spans) -> list[tuple[int, int, int]]:
+        width, height = self.size.x, self.size.y
+        clipped = []
+        for y, first, last in spans:
+            first, last = max(first, 0), min(last, width - 1)
+            if 0 <= y < height and first <= last:
+                clipped.append((y, first, last))
+
+        return clipped
+
+    def _update_shape_preview(self) -> None:
+        # everything is drawn by a single path item, one rectangle per row of cells
+        if self._shape_start is None:
+            if self._shape_preview is not None:
+                self._shape_preview.setVisible(False)
+                self._shape_preview_state = None
+            return
+
+        # only rebuild the path when the shape changes
+        mirror = self.communicator.settings.get("mirrored over x", False)
+        state = (self._shape_start, self._shape_end, self.communicator.tool,
+                 self.communicator.settings.get("fill shapes", False), mirror)
+        if state == self._shape_preview_state and self._shape_preview is not None:
+            return
+
+        self._shape_preview_state = state
+
+        if self._shape_preview is None:
+            self._shape_preview = QGraphicsPathItem()
+            self._shape_preview.setPen(QPen(Qt.PenStyle.NoPen))
+            self._shape_preview.setBrush(QBrush(QColor(255, 255, 255, 110)))
+            self._shape_preview.setZValue(999999) # just below the cursor
+            self.canvas.addItem(self._shape_preview)
+
+        spans = self._clip_spans(self.get_shape_spans(self._shape_start, self._shape_end))
+        if mirror:
+            width = self.size.x
+            spans += [(y, width - 1 - last, width - 1 - first) for y, first, last in spans]
+
+        path = QPainterPath()
+        path.setFillRule(Qt.FillRule.WindingFill)
+        spacing = self.grid_spacing
+        for y, first, last in spans:
+            path.addRect(QRectF(first * spacing, y * spacing, (last - first + 1) * spacing, spacing))
+
+        self._shape_preview.setPath(path)
+        self._shape_preview.setVisible(True)
+
+    def replace_items(self, target: CItem, replacement: CItem, mode: str = MATCH_ITEM,
+                      team: int = None, rotation: int = None, selection_only: bool = False) -> int:
+        """
+        Replaces every matching item on the map with another item, as one undo step.
+
+        Args:
+            target (CItem): The item to look for.
+            replacement (CItem): The item to replace it with, erasers remove the matches.
+            mode (str): One of MATCH_MODES in find_replace.py.
+            team (int): Only replace items of this team, or None for any team.
+            rotation (int): Only replace items with this rotation, or None for any rotation.
+            selection_only (bool): Whether to only replace inside the selection.
+
+        Returns:
+            int: The amount of cells that changed.
+        """
+        if selection_only and self.selection is None:
+            print("Nothing selected. Not replacing.")
+            return 0
+
+        region = self.selection if selection_only else None
+        indexes = find_cells(self.grid, self.item_list, self.item_list.encode_item(target), mode, team, rotation, region)
+        changed = self.place_many(indexes, get_replacement_codes(self.grid, self.item_list, indexes, replacement))
+
+        print(f"Replaced {changed} of {len(indexes)} matching tiles")
+        return changed
+
+    def complete_symmetry(self, from_left: bool = True) -> None:
+        """
+        Makes one half of the map a mirror image of the other, with the mirrored side belonging to the other team.
+        The changes are one undo step.
+
+        Args:
+            from_left (bool): Whether the left half is copied onto the right, otherwise the right onto the left.
+
+        Returns:
+            None
+        """
+        indexes, codes = self.symmetry.get_completion(from_left)
+        changed = self.place_many(indexes, codes)
+        print(f"Mirrored {changed} tiles from the {'left' if from_left else 'right'} half")
+
+    def set_symmetry_overlay_visible(self, show: bool) -> None:
+        """
+        Shows or hides the highlight over cells that don't match their mirrored cell.
+
+        Args:
+            show (bool): Whether to show the highlight.
+
+        Returns:
+            None
+        """
+        self.communicator.settings["show asymmetric cells"] = show
+        self._update_symmetry_overlay(redraw=True)
+
+        if show:
+            print(f"Found {self.symmetry.get_asymmetric_count()} asymmetric tiles")
+
+    def _update_overlays(self, redraw: bool = False) -> None:
+        # the highlights of the rows edited since the last update, or of every row when redrawing
+        self._overlays_dirty = False
+        self._update_symmetry_overlay(redraw)
+        self._update_support_overlay(redraw)
+        self._update_lighting_overlay()
+
+    def _update_symmetry_overlay(self, redraw: bool = False) -> None:
+        if not self.communicator.settings.get("show asymmetric cells", False):
+            for overlay in self._symmetry_overlays.values():
+                overlay.setVisible(False)
+            return
+
+        rows = self.symmetry.update_spans()
+        self._draw_span_overlay(
+            self._symmetry_overlays, range(self.grid.height) if redraw else rows, self.symmetry.get_row_spans,
+            QColor(255, 40, 40, 120), 999997 # below the stamp and shape previews
+        )
+
+    def _draw_span_overlay(self, overlays: dict[int, QGraphicsPathItem], rows, get_row_spans,
+                           color: QColor, z: float) -> None:
+        # only the bands of CHUNK_SIZE rows holding one of the rows are built again
+        height = self.grid.height
+        bands = (height + CHUNK_SIZE - 1) // CHUNK_SIZE
+        for band in [band for band in overlays if band >= bands]:
+            self.canvas.removeItem(overlays.pop(band))
+
+        spacing = self.grid_spacing
+        for band in {y // CHUNK_SIZE for y in rows}:
+            path = QPainterPath()
+            for y in range(band * CHUNK_SIZE, min(band * CHUNK_SIZE + CHUNK_SIZE, height)):
+                for first, last in get_row_spans(y):
+                    path.addRect(QRectF(first * spacing, y * spacing, (last - first + 1) * spacing, spacing))
+
+            overlay = overlays.get(band)
+            if overlay is None:
+                overlay = overlays[band] = QGraphicsPathItem()
+                overlay.setPen(QPen(Qt.PenStyle.NoPen))
+                overlay.setBrush(QBrush(color))
+                overlay.setZValue(z)
+                self.canvas.addItem(overlay)
+
+            overlay.setPath(path)
+            overlay.setVisible(True)
+
+    def set_autotile_preview(self, show: bool) -> None:
+        """
+        Draws tiles with the variant they have in game, picked from the tiles around them,
+        or with their plain image.
+
+        Args:
+            show (bool): Whether to show the variants.
+
+        Returns:
+            None
+        """
+        self.communicator.settings["autotile preview"] = show
+        self.autotiler.update()
+
+        # only the chunks with a tile that has a variant look different
+        indexes = self.autotiler.indexes
+        self._draw_chunks(self.grid.get_chunk_indexes(compress(range(len(indexes)), indexes)))
+
+    def set_lighting_preview(self, show: bool) -> None:
+        """
+        Shows or hides how dark each cell is, from the light of the sky and light-emitting items.
+
+        Args:
+            show (bool): Whether to show the lighting.
+
+        Returns:
+            None
+        """
+        self.communicator.settings["show lighting"] = show
+        for overlay in self._light_overlays.values():
+            overlay.setVisible(show)
+
+        if show:
+            # the chunks edited while hidden, and the ones that weren't drawn yet such as after the map was redrawn
+            columns, rows = self.lighting.get_chunk_count()
+            missing = set(range(columns * rows)).difference(self._light_overlays)
+            self._draw_light_chunks(self.lighting.update() | missing)
+
+    def _update_lighting_overlay(self) -> None:
+        # the light is worked out when the preview is turned on
+        if self.communicator.settings.get("show lighting", False):
+            self._draw_light_chunks(self.lighting.update())
+
+    def _draw_light_chunks(self, chunks) -> None:
+        # every chunk is a tiny image with a pixel per cell, scaled up to the size of the cells
+        for chunk in chunks:
+            left, top, width, height, levels = self.lighting.get_chunk_levels(chunk)
+            pixels = bytearray(4 * width * height)
+            pixels[3::4] = bytes(255 - 255 * level // MAX_LIGHT for level in levels)
+            image = QImage(bytes(pixels), width, height, 4 * width, QImage.Format.Format_ARGB32)
+
+            overlay = self._light_overlays.get(chunk)
+            if overlay is None:
+                overlay = QGraphicsPixmapItem()
+                overlay.setScale(self.grid_spacing)
+                overlay.setZValue(999995) # below the highlights
+                overlay.setPos(left * self.grid_spacing, top * self.grid_spacing)
+                self.canvas.addItem(overlay)
+                self._light_overlays[chunk] = overlay
+
+            overlay.setPixmap(QPixmap.fromImage(image))
+            overlay.setVisible(True)
+
+    def set_support_overlay_visible(self, show: bool) -> None:
+        """
+        Shows or hides the highlight over solid blocks that aren't connected to bedrock or the bottom of the map.
+
+        Args:
+            show (bool): Whether to show the highlight.
+
+        Returns:
+            None
+        """
+        self.communicator.settings["show unsupported blocks"] = show
+        self._update_support_overlay(redraw=True)
+
+        if show:
+            print(f"Found {self.support.get_unsupported_count()} unsupported blocks")
+
+    def _update_support_overlay(self, redraw: bool = False) -> None:
+        if not self.communicator.settings.get("show unsupported blocks", False):
+            for overlay in self._support_overlays.values():
+                overlay.setVisible(False)
+            return
+
+        rows = self.support.update_spans()
+        self._draw_span_overlay(
+            self._support_overlays, range(self.grid.height) if redraw else rows, self.support.get_row_spans,
+            QColor(255, 170, 0, 120), 999996 # below the symmetry highlight
+        )
+
+    def select_region(self, start, end) -> None:
+        """
+        Selects the rectangle between two corner cells, clipped to the map.
+
+        Args:
+            start: The grid position of one corner.
+            end: The grid position of the opposite corner.
+
+        Returns:
+            None
+        """
+        left, right = max(0, min(start[0], end[0])), min(self.size.x - 1, max(start[0], end[0]))
+        top, bottom = max(0, min(start[1], end[1])), min(self.size.y - 1, max(start[1], end[1]))
+        if left > right or top > bottom:
+            self.clear_selection()
+            return
+
+        self.selection = (left, top, right, bottom)
+
+        if self._selection_outline is None:
+            pen = QPen(QColor(255, 255, 255, 220))
+            pen.setStyle(Qt.PenStyle.DashLine)
+            pen.setCosmetic(True)
+            self._selection_outline = QGraphicsRectItem()
+            self._selection_outline.setPen(pen)
+            self._selection_outline.setZValue(999999) # just below the cursor
+            self.canvas.addItem(self._selection_outline)
+
+        spacing = self.grid_spacing
+        self._selection_outline.setRect(QRectF(
+            left * spacing, top * spacing, (right - left + 1) * spacing, (bottom - top + 1) * spacing
+        ))
+        self._selection_outline.setVisible(True)
+
+    def clear_selection(self) -> None:
+        self.selection = None
+        if self._selection_outline is not None:
+            self._selection_outline.setVisible(False)
+
+    def get_selected_region(self) -> TileRegion:
+        """
+        Returns a copy of the selected tiles, or None if nothing is selected.
+        """
+        if self.selection is None:
+            return None
+
+        left, top, right, bottom = self.selection
+        return TileRegion.from_grid(self.grid, left, top, right - left + 1, bottom - top + 1)
+
+    def _get_selected_cells(self) -> array:
+        left, top, right, bottom = self.selection
+        indexes = array('I')
+        for y in range(top, bottom + 1):
+            row = y * self.size.x
+            indexes.extend(range(row + left, row + right + 1))
+
+        return indexes
+
+    def copy_selection(self) -> None:
+        """
+        Copies the selected tiles to the clipboard.
+
+        Returns:
+            None
+        """
+        region = self.get_selected_region()
+        if region is None:
+            return
+
+        self.clipboard = region
+        print(f"Copied {region.width}x{region.height} tiles")
+
+    def cut_selection(self) -> None:
+        """
+        Copies the selected tiles to the clipboard and removes them from the map.
+
+        Returns:
+            None
+        """
+        self.copy_selection()
+        self.delete_selection()
+
+    def delete_selection(self) -> None:
+        """
+        Removes the selected tiles from the map, as one undo step.
+
+        Returns:
+            None
+        """
+        if self.selection is not None:
+            self.place_many(self._get_selected_cells(), 0)
+
+    def transform_selection(self, transform: str) -> None:
+        """
+        Flips or rotates the selected tiles in place, as one undo step.
+        Rotations turn the selection around its center.
+        When pasting, the region being pasted is transformed instead.
+
+        Args:
+            transform (str): One of the TRANSFORMS in tile_region.py.
+
+        Returns:
+            None
+        """
+        if self._stamp is not None:
+            self.start_stamp(self._stamp.transformed(transform, self.item_list))
+            return
+
+        region = self.get_selected_region()
+        if region is None:
+            return
+
+        left, top, right, bottom = self.selection
+        result = region.transformed(transform, self.item_list)
+        x = left + (region.width - result.width) // 2
+        y = top + (region.height - result.height) // 2
+
+        # move every cell's original x along with it, to tell which cells crossed the midline
+        if self.communicator.settings.get("swap teams across midline", False):
+            columns = array('I', range(left, right + 1)) * region.height
+            columns = transform_cells(columns, region.width, region.height, transform)[0]
+            self._swap_crossed_teams(result, columns, x)
+
+        # clear the old area and write the new one, including its empty cells
+        indexes, codes = result.get_cells(self.grid, x, y, include_empty=True)
+        cells = self._get_selected_cells()
+        cells.extend(indexes)
+        self.place_many(cells, array('I', repeat(0, len(cells) - len(codes))) + codes)
+
+        self.select_region((x, y), (x + result.width - 1, y + result.height - 1))
+
+    def _swap_crossed_teams(self, region: TileRegion, columns: array, x: int) -> None:
+        # the side of the midline a column is on, 0 for the middle column of odd width maps
+        width = self.size.x
+        side = lambda column: (2 * column + 1 > width) - (2 * column + 1 < width)
+
+        swappable = {}
+        for i, code in enumerate(region.codes):
+            if code == 0 or side(columns[i]) * side(x + i % region.width) != -1:
+                continue
+
+            if code not in swappable:
+                item = self.item_list.get_item_by_id(code >> ID_SHIFT)
+                swappable[code] = item is not None and item.sprite.properties.can_swap_teams
+
+            team = code & TEAM_MASK
+            if swappable[code] and team in (0, 1):
+                region.codes[i] = (code & ~TEAM_MASK) | (1 - team)
+
+    def paste(self) -> None:
+        """
+        Starts pasting the clipboard, which follows the cursor until it is stamped with the left mouse button.
+
+        Returns:
+            None
+        """
+        if self.clipboard is not None:
+            self.start_stamp(self.clipboard)
+
+    def start_stamp(self, region: TileRegion) -> None:
+        """
+        Starts stamping a region, showing a see-through preview of it at the cursor.
+
+        Args:
+            region (TileRegion): The tiles to stamp.
+
+        Returns:
+            None
+        """
+        self.cancel_stamp()
+        if region is None:
+            return
+
+        self._stamp = region
+        self._stamp_preview = QGraphicsPixmapItem(self.renderer.render_region(region))
+        self._stamp_preview.setScale(self.default_zoom_scale)
+        self._stamp_preview.setOpacity(0.5)
+        self._stamp_preview.setZValue(999998) # below the shape preview and cursor
+        self.canvas.addItem(self._stamp_preview)
+
+        if self._cursor_pos is not None:
+            x, y = self._cursor_pos
+            self._stamp_preview.setPos(x * self.grid_spacing, y * self.grid_spacing)
+
+    def cancel_stamp(self) -> None:
+        self._stamp = None
+        if self._stamp_preview is not None:
+            self.canvas.removeItem(self._stamp_preview)
+            self._stamp_preview = None
+
+    def stamp(self, grid_pos) -> None:
+        """
+        Places the region being pasted with its top left corner at a grid position, as one undo step.
+        Empty cells of the region leave the map untouched.
+
+        Args:
+            grid_pos: The grid position of the top left corner.
+
+        Returns:
+            None
+        """
+        if self._stamp is None:
+            return
+
+        x, y = grid_pos
+        indexes, codes = self._stamp.get_cells(self.grid, x, y)
+        self.place_many(indexes, codes)
+
+    def use_tool(self, grid_pos, click_index: int) -> None:
+        """
+        Uses the selected tool at a grid position, when a mouse button is pressed.
+
+        Args:
+            grid_pos: The grid position that was clicked.
+            click_index: The index of the click, 1 for the left button and 0 for the right.
+
+        Returns:
+            None
+        """
+        tool = self.communicator.tool
+
+        # pasting takes over until it is cancelled
+        if self._stamp is not None:
+            if click_index == 1:
+                self.stamp(grid_pos)
+            else:
+                self.cancel_stamp()
+            return
+
+        if tool == "fill":
+            self.fill(grid_pos, click_index)
+            return
+
+        # shapes are previewed while dragging and placed on release
+        if tool in SHAPE_TOOLS:
+            self._shape_start = self._shape_end = tuple(grid_pos)
+            self._shape_click_index = click_index
+            self._update_shape_preview()
+            return
+
+        # brush strokes continue while the mouse moves
+        self._stroke_click_index = click_index
+        self.begin_stroke()
+        self.paint([grid_pos], click_index, erase_owners=True)
+
     def mouseDoubleClickEvent(self, event) -> None:
         """
         Handles mouse press events on the canvas.
@@ -532,18 +1453,16 @@ class Canvas(QGraphicsView):
         Returns:
             None
         """
+        self.flush_frame()
+
+        # direct call to place even if the mouse hasn't moved
         if event.button() == Qt.MouseButton.LeftButton:
             self._holding_lmb = True
-
-            # direct call to bypass add_item restrictions
-            grid_pos = self.get_grid_pos(event)
-            self.place_item(grid_pos, 1)
+            self.use_tool(self.get_grid_pos(event), 1)
 
         elif event.button() == Qt.MouseButton.RightButton:
             self._holding_rmb = True
-
-            grid_pos = self.get_grid_pos(event)
-            self.place_item(grid_pos, 0)
+            self.use_tool(self.get_grid_pos(event), 0)
 
     def mousePressEvent(self, event) -> None:
         """
@@ -556,20 +1475,18 @@ class Canvas(QGraphicsView):
             None
         """
 
+        # finish the previous input before starting something new
+        self.flush_frame()
         self.update_mouse_pos(event)
 
         # place blocks
         if event.button() == Qt.MouseButton.LeftButton:
             self._holding_lmb = True
-
-            grid_pos = self.get_grid_pos(event)
-            self.place_item(grid_pos, 1)
+            self.use_tool(self.get_grid_pos(event), 1)
 
         elif event.button() == Qt.MouseButton.RightButton:
             self._holding_rmb = True
-
-            grid_pos = self.get_grid_pos(event)
-            self.place_item(grid_pos, 0)
+            self.use_tool(self.get_grid_pos(event), 0)
 
         if event.button() == Qt.MouseButton.MiddleButton:
             self._last_pan_point = event.pos()
@@ -586,14 +1503,20 @@ class Canvas(QGraphicsView):
             None
         """
 
+        # the stroke includes everything up to the release
+        self.flush_frame()
         self.update_mouse_pos(event)
 
         if event.button() == Qt.MouseButton.LeftButton:
             self._holding_lmb = False
+            self.place_shape(1)
+            self.end_stroke()
 
         # elif to prevent placing two tiles at once
         elif event.button() == Qt.MouseButton.RightButton:
             self._holding_rmb = False
+            self.place_shape(0)
+            self.end_stroke()
 
         elif event.button() == Qt.MouseButton.MiddleButton:
             self._holding_scw = False
@@ -609,16 +1532,17 @@ class Canvas(QGraphicsView):
             None
         """
 
-        pos = Vec2f(*self.get_grid_pos(event))
-        old_pos = self.communicator.old_mouse_pos
-
-        same_tile = pos == old_pos
+        pos = self.get_grid_pos(event)
 
-        if self._holding_lmb and not same_tile:
-            self.add_item(event, 1)
+        # placing waits for the next frame, so fast mice don't do more work than can be shown
+        if (self._holding_lmb or self._holding_rmb) and self.communicator.tool == "brush":
+            last_pos = self._stroke_buffer[-1] if self._stroke_buffer else self.communicator.mouse_pos
+            if pos != last_pos:
+                self._stroke_buffer.append(pos)
 
-        elif self._holding_rmb and not same_tile:
-            self.add_item(event, 0)
+        # the shape preview follows the mouse every frame
+        elif self._shape_start is not None:
+            self._shape_end = pos
 
         if self._holding_scw or self._holding_space:
             self.setDragMode(QGraphicsView.DragMode.ScrollHandDrag)
@@ -636,10 +1560,11 @@ class Canvas(QGraphicsView):
             self.setCursor(Qt.CursorShape.ArrowCursor) # todo: should be a function that is called here & in mouseReleaseEvent
             self.setDragMode(QGraphicsView.DragMode.NoDrag)
             self.viewport().unsetCursor()
-        # render the cursor
-        scene_pos = self.mapToScene(event.pos())
-        x, y = self.snap_to_grid((scene_pos.x(), scene_pos.y()))
-        self.renderer.render_cursor(Vec2f(x * self.grid_spacing, y * self.grid_spacing))
+
+        # the cursor is rendered with the next frame
+        self._cursor_pos = pos
+        if not self._frame_timer.isActive():
+            self._frame_timer.start()
 
     def update_mouse_pos(self, event) -> None:
         """
@@ -682,16 +1607,23 @@ class Canvas(QGraphicsView):
         self.horizontalScrollBar().setValue(int(self.horizontalScrollBar().value() - delta.x()))
         self.verticalScrollBar().setValue(int(self.verticalScrollBar().value() - delta.y()))
 
-    def resize_canvas(self, size: Vec2f, tilemap: dict[Vec2f, CItem] = None) -> None:
-        self.size = size
-        if tilemap is None:
-            tilemap = {}
+    def resize_canvas(self, size: Vec2f, codes=None) -> None:
+        """
+        Replaces the map with a new one.
+
+        Args:
+            size (Vec2f): The size of the new map.
+            codes: The tile code of every cell row by row, or None for an empty map.
 
-        self.tilemap = tilemap
+        Returns:
+            None
+        """
+        self.size = size
+        self.grid.reset(size.x, size.y, codes)
         self.force_rerender()
         self.add_panning_space()
         print(f"New map created with dimensions: {size.x}x{size.y}")
-        self.wipe_history()
+        self.history.clear()
         self._build_tile_grid()
 
     def is_out_of_bounds(self, pos: tuple) -> bool:
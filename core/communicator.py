@@ -27,6 +27,7 @@ class Communicator(metaclass = SingletonMeta):
         self.mouse_pos = () # must be empty tuple
         self.old_mouse_pos = ()
         self.team = 0
+        self.tool = "brush" # brush, fill, rectangle, line, ellipse, select
 
     def select_item(self, tile: str, idx: int = 0): # 1 = lmb, 0 = rmb, # todo: could be boolean?
         """
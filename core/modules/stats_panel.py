@@ -0,0 +1,88 @@
+"""
+A dock panel showing how many of each item are on the map.
+"""
+
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtWidgets import QDockWidget, QLabel, QTableWidget, QTableWidgetItem, QVBoxLayout, QWidget
+
+from core.communicator import Communicator
+
+# milliseconds between checking the map for changes,
+# so a stroke redraws the table a few times a second rather than after every edit
+REFRESH_INTERVAL = 250
+COLUMNS = ("Item", "Team", "Left", "Right", "Total", "Balance")
+
+class StatsPanel(QDockWidget):
+    """
+    Lists the counts of every item per team and per half of the map.
+    The counts are kept by the canvas, the panel only redraws when the map has changed.
+    """
+    def __init__(self, parent = None) -> None:
+        super().__init__("Map Statistics", parent)
+        self.communicator = Communicator()
+        self.setObjectName("MapStatistics")
+        self._revision = None
+
+        widget = QWidget(self)
+        layout = QVBoxLayout(widget)
+        layout.setContentsMargins(4, 4, 4, 4)
+
+        self.team_label = QLabel(widget)
+        self.team_label.setWordWrap(True)
+        layout.addWidget(self.team_label)
+
+        self.table = QTableWidget(0, len(COLUMNS), widget)
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.setSelectionMode(QTableWidget.SelectionMode.NoSelection)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.table)
+
+        self.setWidget(widget)
+
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.refresh)
+        self._timer.start(REFRESH_INTERVAL)
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        Redraws the counts if the map changed since they were last drawn.
+
+        Args:
+            force (bool): Whether to redraw even if nothing changed.
+
+        Returns:
+            None
+        """
+        canvas = self.communicator.get_canvas()
+        if canvas is None or not self.isVisible():
+            return
+
+        revision = canvas.grid.revision
+        if revision == self._revision and not force:
+            return
+
+        self._revision = revision
+        stats = canvas.stats
+
+        totals = stats.get_team_totals("blob")
+        teams = ", ".join(f"Team {team}: {amount}" for team, amount in sorted(totals.items()))
+        self.team_label.setText(f"Blobs per team - {teams}" if teams else "No team blobs")
+
+        rows = stats.get_rows()
+        self.table.setRowCount(len(rows))
+        for y, row in enumerate(rows):
+            values = (
+                row.display_name, "-" if row.team is None else str(row.team),
+                row.left, row.right, row.total, f"{row.balance:+d}" if row.balance else "0"
+            )
+            for x, value in enumerate(values):
+                cell = QTableWidgetItem(str(value))
+                if x > 1:
+                    cell.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.table.setItem(y, x, cell)
+
+    def showEvent(self, event) -> None:
+        super().showEvent(event)
+        self.refresh(force=True)
@@ -6,13 +6,23 @@ import os
 import shutil
 import subprocess
 
-from PyQt6.QtWidgets import QToolBar, QMenu, QCheckBox, QWidgetAction
-from PyQt6.QtGui import QAction
-
+from PyQt6.QtWidgets import (
+    QToolBar, QMenu, QCheckBox, QComboBox, QDialog, QDialogButtonBox, QFormLayout, QHBoxLayout, QInputDialog, QLabel,
+    QSpinBox, QWidget, QWidgetAction
+)
+from PyQt6.QtGui import QAction, QActionGroup, QIcon
+
+from base.citemlist import CItemList
+from base.find_replace import MATCH_MODES
+from base.flood_fill import BOUNDARY_MODES, SAME_ITEM
 from base.kag_image import KagImage
+from base.prefabs import PrefabLibrary
+from base.tile_region import FLIP_HORIZONTAL, FLIP_VERTICAL, ROTATE_CLOCKWISE, ROTATE_COUNTERCLOCKWISE
+from base.map_writer import FAST_PROFILE
 from core.communicator import Communicator
 from utils.config_handler import ConfigHandler
 from utils.file_handler import FileHandler
+from utils.profiler import StartupProfiler
 
 class Toolbar(QToolBar):
     """
@@ -22,6 +32,7 @@ class Toolbar(QToolBar):
         super().__init__(parent)
         self.setParent(parent)
         self.kagimage = KagImage()
+        self.prefabs = PrefabLibrary(self.kagimage)
         self.communicator = Communicator()
         self.setup_ui()
 
@@ -49,9 +60,75 @@ class Toolbar(QToolBar):
         settings_menu = QMenu("Settings", self)
         self.mirror_x = self._add_checkbox(settings_menu, "Mirror Over X-Axis", self.toggle_mirrored_x)
 
+        # --- tools menu ---
+        tools_menu = QMenu("Tools", self)
+        tool_choices = [
+            ("Brush", "brush"),
+            ("Fill", "fill"),
+            ("Rectangle", "rectangle"),
+            ("Line", "line"),
+            ("Ellipse", "ellipse"),
+            ("Select", "select")
+        ]
+        self._add_choices(tools_menu, tool_choices, "brush", self.select_tool)
+        tools_menu.addSeparator()
+        self.fill_shapes = self._add_checkbox(tools_menu, "Fill Shapes", self.toggle_fill_shapes)
+        self.prevent_overlap = self._add_checkbox(tools_menu, "Prevent Overlapping Blobs", self.toggle_prevent_overlap)
+        tools_menu.addSeparator()
+
+        self.brush_size = self._add_spinbox(tools_menu, "Brush Size", 1, 64, self.set_brush_size)
+        brush_shape_submenu = QMenu("Brush Shape", self)
+        self._add_choices(brush_shape_submenu, [("Square", "square"), ("Circle", "circle")], "square", self.select_brush_shape)
+        tools_menu.addMenu(brush_shape_submenu)
+
+        fill_boundary_submenu = QMenu("Fill Boundary", self)
+        boundary_choices = [(mode.capitalize(), mode) for mode in BOUNDARY_MODES]
+        self._add_choices(fill_boundary_submenu, boundary_choices, SAME_ITEM, self.select_fill_boundary)
+        tools_menu.addMenu(fill_boundary_submenu)
+
+        transform_submenu = QMenu("Transform Selection", self)
+        transform_choices = [
+            ("Flip Horizontally\tH", FLIP_HORIZONTAL),
+            ("Flip Vertically\tV", FLIP_VERTICAL),
+            ("Rotate Clockwise\t]", ROTATE_CLOCKWISE),
+            ("Rotate Counterclockwise\t[", ROTATE_COUNTERCLOCKWISE)
+        ]
+        for text, transform in transform_choices:
+            transform_action = QAction(text, self)
+            transform_action.triggered.connect(lambda _, transform=transform: self.transform_selection(transform))
+            transform_submenu.addAction(transform_action)
+
+        transform_submenu.addSeparator()
+        self.swap_teams = self._add_checkbox(transform_submenu, "Swap Teams Across Midline", self.toggle_swap_teams)
+        tools_menu.addMenu(transform_submenu)
+
+        replace_action = QAction("Find and Replace...", self)
+        replace_action.triggered.connect(self.find_and_replace)
+        tools_menu.addAction(replace_action)
+
+        symmetry_submenu = QMenu("Symmetry", self)
+        complete_left_action = QAction("Complete From Left Half", self)
+        complete_right_action = QAction("Complete From Right Half", self)
+        complete_left_action.triggered.connect(lambda: self.communicator.get_canvas().complete_symmetry(True))
+        complete_right_action.triggered.connect(lambda: self.communicator.get_canvas().complete_symmetry(False))
+        symmetry_submenu.addAction(complete_left_action)
+        symmetry_submenu.addAction(complete_right_action)
+        symmetry_submenu.addSeparator()
+        self.show_asymmetric = self._add_checkbox(symmetry_submenu, "Highlight Asymmetric Tiles", self.toggle_asymmetric_cells)
+        tools_menu.addMenu(symmetry_submenu)
+        self.show_unsupported = self._add_checkbox(tools_menu, "Highlight Unsupported Blocks", self.toggle_unsupported_blocks)
+
+        # --- prefabs menu ---
+        # the list of prefabs is filled in every time the menu is opened
+        prefabs_menu = QMenu("Prefabs", self)
+        prefabs_menu.aboutToShow.connect(lambda: self._fill_prefabs_menu(prefabs_menu))
+
         # --- view Menu ---
         view_menu = QMenu("View", self)
         self.tilegrid_visible = self._add_checkbox(view_menu, "Show Grid", self.toggle_grid)
+        self.stats_visible = self._add_checkbox(view_menu, "Show Map Statistics", self.toggle_stats_panel)
+        self.autotile_preview = self._add_checkbox(view_menu, "Preview Tile Variants", self.toggle_autotile_preview)
+        self.lighting_preview = self._add_checkbox(view_menu, "Preview Lighting", self.toggle_lighting_preview)
         view_menu.addSeparator()
 
         # create a submenu for buttons/panels
@@ -65,6 +142,9 @@ class Toolbar(QToolBar):
 
         # add the submenu to the 'View' menu
         view_menu.addMenu(buttons_submenu)
+        view_menu.addSeparator()
+        startup_report_action = QAction("Startup Report", self)
+        view_menu.addAction(startup_report_action)
 
         # --- connect actions to functions ---
         new_action.triggered.connect(self.kagimage.new_map)
@@ -73,6 +153,8 @@ class Toolbar(QToolBar):
         load_action.triggered.connect(self.kagimage.load_map)
         test_in_kag.triggered.connect(self.test_in_kag_triggered)
 
+        startup_report_action.triggered.connect(StartupProfiler().print_report)
+
         button1_action.triggered.connect(self.button1_triggered)
         button2_action.triggered.connect(self.button2_triggered)
         button3_action.triggered.connect(self.button3_triggered)
@@ -89,6 +171,16 @@ class Toolbar(QToolBar):
         self.settings_menu.triggered.connect(lambda:self._pop_up(settings_menu, self.settings_menu))
         self.addAction(self.settings_menu)
 
+        # add 'Tools' menu to toolbar
+        self.tools_menu = QAction("Tools", self)
+        self.tools_menu.triggered.connect(lambda: self._pop_up(tools_menu, self.tools_menu))
+        self.addAction(self.tools_menu)
+
+        # add 'Prefabs' menu to toolbar
+        self.prefabs_menu = QAction("Prefabs", self)
+        self.prefabs_menu.triggered.connect(lambda: self._pop_up(prefabs_menu, self.prefabs_menu))
+        self.addAction(self.prefabs_menu)
+
         # add 'View' menu to toolbar
         self.view_menu = QAction("View", self)
         self.view_menu.triggered.connect(lambda: self._pop_up(view_menu, self.view_menu))
@@ -106,6 +198,127 @@ class Toolbar(QToolBar):
 
         return box
 
+    def _add_spinbox(self, menu: QMenu, text: str, minimum: int, maximum: int, action) -> QSpinBox:
+        widget = QWidget(self)
+        layout = QHBoxLayout(widget)
+        layout.setContentsMargins(6, 2, 6, 2)
+        layout.addWidget(QLabel(text, widget))
+
+        box = QSpinBox(widget)
+        box.setRange(minimum, maximum)
+        layout.addWidget(box)
+
+        action_widget = QWidgetAction(self)
+        action_widget.setDefaultWidget(widget)
+        menu.addAction(action_widget)
+        box.valueChanged.connect(action)
+
+        return box
+
+    def _add_choices(self, menu: QMenu, choices: list[tuple[str, str]], default: str, action) -> QActionGroup:
+        # only one choice of the group can be checked at a time
+        group = QActionGroup(self)
+        for text, value in choices:
+            choice = QAction(text, self)
+            choice.setCheckable(True)
+            choice.setChecked(value == default)
+            choice.triggered.connect(lambda _, value=value: action(value))
+            group.addAction(choice)
+            menu.addAction(choice)
+
+        return group
+
+    def select_tool(self, tool: str) -> None:
+        """
+        Selects the tool used when clicking on the canvas.
+
+        Args:
+            tool (str): The name of the tool.
+        """
+        self.communicator.tool = tool
+
+    def select_fill_boundary(self, mode: str) -> None:
+        self.communicator.settings['fill boundary'] = mode
+
+    def toggle_fill_shapes(self, checked: bool) -> None:
+        self.communicator.settings['fill shapes'] = checked
+
+    def toggle_prevent_overlap(self, checked: bool) -> None:
+        self.communicator.settings['prevent blob overlap'] = checked
+
+    def transform_selection(self, transform: str) -> None:
+        self.communicator.get_canvas().transform_selection(transform)
+
+    def find_and_replace(self) -> None:
+        """
+        Asks what to replace and replaces it across the map or the selection.
+        """
+        canvas = self.communicator.get_canvas()
+        dialog = ReplaceDialog(canvas.item_list, canvas.selection is not None, self)
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            canvas.replace_items(*dialog.get_inputs())
+
+    def toggle_asymmetric_cells(self, checked: bool) -> None:
+        self.communicator.get_canvas().set_symmetry_overlay_visible(checked)
+
+    def toggle_unsupported_blocks(self, checked: bool) -> None:
+        self.communicator.get_canvas().set_support_overlay_visible(checked)
+
+    def toggle_swap_teams(self, checked: bool) -> None:
+        self.communicator.settings['swap teams across midline'] = checked
+
+    def set_brush_size(self, size: int) -> None:
+        self.communicator.settings['brush size'] = size
+
+    def select_brush_shape(self, shape: str) -> None:
+        self.communicator.settings['brush shape'] = shape
+
+    def _fill_prefabs_menu(self, menu: QMenu) -> None:
+        menu.clear()
+
+        save_action = QAction("Save Selection as Prefab...", self)
+        save_action.triggered.connect(self.save_prefab)
+        save_action.setEnabled(self.communicator.get_canvas().selection is not None)
+        menu.addAction(save_action)
+        menu.addSeparator()
+
+        names = self.prefabs.get_names()
+        if not names:
+            empty_action = QAction("No Prefabs", self)
+            empty_action.setEnabled(False)
+            menu.addAction(empty_action)
+
+        for name in names:
+            prefab_action = QAction(name, self)
+            thumbnail = self.prefabs.get_thumbnail(name)
+            if thumbnail is not None:
+                prefab_action.setIcon(QIcon(thumbnail))
+
+            prefab_action.triggered.connect(lambda _, name=name: self.stamp_prefab(name))
+            menu.addAction(prefab_action)
+
+    def save_prefab(self) -> None:
+        """
+        Asks for a name and saves the selected tiles as a prefab.
+        """
+        region = self.communicator.get_canvas().get_selected_region()
+        if region is None:
+            print("Nothing selected. Not saving prefab.")
+            return
+
+        name, accepted = QInputDialog.getText(self, "Save Prefab", "Prefab name:")
+        if accepted:
+            self.prefabs.save(name, region)
+
+    def stamp_prefab(self, name: str) -> None:
+        """
+        Starts stamping a prefab onto the map.
+
+        Args:
+            name (str): The name of the prefab.
+        """
+        self.communicator.get_canvas().start_stamp(self.prefabs.load(name))
+
     def toggle_mirrored_x(self, checked: bool) -> None:
         """
         Toggles the mirrored over x setting based on checkbox state.
@@ -115,6 +328,17 @@ class Toolbar(QToolBar):
         """
         self.communicator.settings['mirrored over x'] = checked
 
+    def toggle_stats_panel(self, checked: bool) -> None:
+        stats_panel = getattr(self.parent(), "stats_panel", None)
+        if stats_panel is not None:
+            stats_panel.setVisible(checked)
+
+    def toggle_autotile_preview(self, checked: bool) -> None:
+        self.communicator.get_canvas().set_autotile_preview(checked)
+
+    def toggle_lighting_preview(self, checked: bool) -> None:
+        self.communicator.get_canvas().set_lighting_preview(checked)
+
     def toggle_grid(self, checked: bool) -> None:
         self.communicator.get_canvas().set_grid_visible(checked)
 
@@ -140,9 +364,14 @@ class Toolbar(QToolBar):
         if fh.does_path_exist(autostart_script) and not fh.does_path_exist(kag_script_path):
             shutil.copy(autostart_script, kag_script_path)
 
-        if fh.does_path_exist(kag_base_path):
-            self.kagimage.save_map(kag_map_path)
+        if not fh.does_path_exist(kag_base_path):
+            self._launch_kag(kag_base_path)
+            return
+
+        # KAG is started once the map has been written
+        self.kagimage.save_map(kag_map_path, on_saved=lambda _: self._launch_kag(kag_base_path), profile=FAST_PROFILE)
 
+    def _launch_kag(self, kag_base_path: str) -> None:
         try:
             if os.name == "nt":
                 kag_executable = os.path.join(kag_base_path, "KAG.exe")
@@ -173,4 +402,71 @@ class Toolbar(QToolBar):
         print("Button 2 clicked")
 
     def button3_triggered(self):
-        print("Button 3 clicked")
\ No newline at end of file
+        print("Button 3 clicked")
+
+class ReplaceDialog(QDialog):
+    """
+    Used to pick what to find and what to replace it with.
+    """
+    def __init__(self, item_list: CItemList, has_selection: bool, parent = None):
+        super().__init__(parent)
+
+        self.setWindowTitle("Find and Replace")
+        self.communicator = Communicator()
+        self.items = [item for item in item_list.all_items if item.name_data.name]
+
+        # default to replacing the right mouse button's tile with the left's
+        self.target_input = self._create_item_box(self.communicator.get_selected_tile(0))
+        self.replacement_input = self._create_item_box(self.communicator.get_selected_tile(1))
+
+        self.mode_input = QComboBox(self)
+        for mode in MATCH_MODES:
+            self.mode_input.addItem(mode.capitalize(), mode)
+
+        self.team_input = QComboBox(self)
+        self.team_input.addItem("Any", None)
+        for team in range(8):
+            self.team_input.addItem(str(team), team)
+
+        self.rotation_input = QComboBox(self)
+        self.rotation_input.addItem("Any", None)
+        for rotation in (0, 90, 180, 270):
+            self.rotation_input.addItem(str(rotation), rotation)
+
+        self.selection_input = QCheckBox("Only in Selection", self)
+        self.selection_input.setChecked(has_selection)
+        self.selection_input.setEnabled(has_selection)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel, self)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+
+        layout = QFormLayout(self)
+        layout.addRow("Find:", self.target_input)
+        layout.addRow("Replace With:", self.replacement_input)
+        layout.addRow("Match:", self.mode_input)
+        layout.addRow("Team:", self.team_input)
+        layout.addRow("Rotation:", self.rotation_input)
+        layout.addRow(self.selection_input)
+        layout.addRow(buttons)
+
+    def _create_item_box(self, selected) -> QComboBox:
+        box = QComboBox(self)
+        for item in self.items:
+            box.addItem(item.name_data.display_name or item.name_data.name, item)
+
+        names = [item.name_data.name for item in self.items]
+        if selected is not None and selected.name_data.name in names:
+            box.setCurrentIndex(names.index(selected.name_data.name))
+
+        return box
+
+    def get_inputs(self) -> tuple:
+        """
+        Returns the arguments for Canvas.replace_items: the target and replacement items,
+        the match mode, the team and rotation filters and whether to only replace inside the selection.
+        """
+        return (
+            self.target_input.currentData(), self.replacement_input.currentData(), self.mode_input.currentData(),
+            self.team_input.currentData(), self.rotation_input.currentData(), self.selection_input.isChecked()
+        )
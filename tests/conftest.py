@@ -0,0 +1,57 @@
+"""
+Shared fixtures for the tests, which run without a display.
+"""
+import atexit
+import os
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtWidgets import QApplication
+
+from base.citemlist import CItemList, ID_SHIFT, ROTATION_SHIFT
+from canvas import Canvas
+from core.communicator import Communicator
+from utils.vec2f import Vec2f
+
+@pytest.fixture(scope="session")
+def app() -> QApplication:
+    # the item list loads its sprites as pixmaps, and the canvas is a widget, which both need an application
+    return QApplication.instance() or QApplication([])
+
+@pytest.fixture(scope="session")
+def item_list(app) -> CItemList:
+    return CItemList()
+
+@pytest.fixture
+def canvas(app) -> Canvas:
+    """
+    An empty 40x30 canvas with the default settings, which doesn't autosave when the tests end.
+    """
+    communicator = Communicator()
+    communicator.settings = {}
+    communicator.mouse_pos = ()
+    communicator.tool = "brush"
+
+    canvas = Canvas(Vec2f(40, 30))
+    communicator.set_canvas(canvas)
+    atexit.unregister(canvas._save_map_at_exit)
+    yield canvas
+
+    canvas.deleteLater()
+
+@pytest.fixture(scope="session")
+def sample_codes(item_list) -> list[int]:
+    """
+    A mix of codes to fill random maps with: empty cells, solid and background tiles, and blobs with teams and rotations.
+    """
+    codes = [0] * 6
+    for name in ("tile_ground", "tile_stone", "tile_bedrock", "tile_castle_back", "tile_gold"):
+        codes += [item_list.get_item_id(name) << ID_SHIFT] * 2
+
+    for name in ("lamp", "ladder", "knight_shop", "tree", "wooden_door"):
+        item_id = item_list.get_item_id(name)
+        codes += [(item_id << ID_SHIFT) | (rotation << ROTATION_SHIFT) | team for rotation in (0, 1) for team in (0, 1)]
+
+    return codes
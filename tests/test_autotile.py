@@ -0,0 +1,69 @@
+"""
+Tests for picking world.png variants, compared with working out the whole map.
+"""
+import random
+
+import pytest
+
+from base.autotile import Autotiler, VARIANTS
+from base.citemlist import ID_SHIFT
+from base.tile_grid import TileGrid
+
+def full_update(autotiler: Autotiler):
+    fresh = Autotiler(autotiler.grid, autotiler.item_list)
+    autotiler.grid.remove_listener(fresh)
+    fresh.update()
+    return fresh.indexes
+
+@pytest.fixture
+def codes(item_list) -> list[int]:
+    tiles = [item_list.get_item_id(name) << ID_SHIFT for name in ("tile_ground", "tile_castle", "tile_wood")]
+    return [0] * 3 + tiles * 2 + [item_list.get_item_id("lamp") << ID_SHIFT]
+
+@pytest.mark.parametrize("width", (1, 2, 17))
+def test_incremental_update_matches_a_full_one(item_list, codes, width):
+    rng = random.Random(width)
+    grid = TileGrid(width, 15)
+    autotiler = Autotiler(grid, item_list)
+    autotiler.update()
+
+    for step in range(100):
+        before = autotiler.indexes[:]
+        if step % 3:
+            grid.set(rng.randrange(len(grid.codes)), rng.choice(codes))
+        else:
+            cells = rng.sample(range(len(grid.codes)), rng.randrange(1, min(12, len(grid.codes))))
+            grid.set_many(cells, rng.choices(codes, k=len(cells)))
+
+        changed = autotiler.update()
+        assert autotiler.indexes == full_update(autotiler)
+        # every cell that got a new variant is reported
+        assert all(cell in changed for cell in range(len(before)) if before[cell] != autotiler.indexes[cell])
+
+def test_variants_follow_the_cells_above_and_below(item_list):
+    castle = item_list.get_item_id("tile_castle") << ID_SHIFT
+    grid = TileGrid(3, 4)
+    autotiler = Autotiler(grid, item_list)
+    column = [grid.index(1, y) for y in range(3)]
+    grid.set_many(column, [castle] * 3)
+
+    variants = VARIANTS["tile_castle"]
+    assert autotiler.get_index(column[0]) in variants["top"]
+    assert autotiler.get_index(column[1]) in variants["inner"]
+    assert autotiler.get_index(column[2]) in variants["bottom"]
+    assert autotiler.get_index(grid.index(1, 3)) == 0
+
+    grid.set(column[1], 0)
+    assert autotiler.get_index(column[0]) in variants["single"]
+    assert autotiler.get_index(column[2]) in variants["single"]
+
+def test_reset_is_worked_out_again(item_list, codes):
+    grid = TileGrid(6, 6)
+    autotiler = Autotiler(grid, item_list)
+    grid.set(3, codes[3])
+    autotiler.update()
+
+    grid.reset(5, 4, random.Random(49).choices(codes, k=20))
+    changed = autotiler.update()
+    assert autotiler.indexes == full_update(autotiler)
+    assert set(changed) == {cell for cell in range(20) if autotiler.indexes[cell]}
@@ -0,0 +1,202 @@
+"""
+Tests for placing tiles on the canvas.
+"""
+import pytest
+from PyQt6.QtCore import QEvent, QPointF, Qt
+from PyQt6.QtGui import QMouseEvent
+
+from base.citemlist import ID_SHIFT, ROTATION_SHIFT
+from utils.raster import line_cells
+
+def code(canvas, name: str, rotation: int = 0, team: int = 0) -> int:
+    return canvas.item_list.get_item_id(name) << ID_SHIFT | rotation // 90 << ROTATION_SHIFT | team
+
+def mouse_event(canvas, event_type: QEvent.Type, cell: tuple, button=Qt.MouseButton.NoButton) -> QMouseEvent:
+    """
+    Makes a left mouse button event over the middle of a grid cell.
+    """
+    x, y = cell
+    spacing = canvas.grid_spacing
+    pos = QPointF(canvas.mapFromScene(QPointF((x + 0.5) * spacing, (y + 0.5) * spacing)))
+    buttons = Qt.MouseButton.NoButton if event_type == QEvent.Type.MouseButtonRelease else Qt.MouseButton.LeftButton
+    return QMouseEvent(event_type, pos, pos, button, buttons, Qt.KeyboardModifier.NoModifier)
+
+def press(canvas, cell: tuple) -> None:
+    canvas.mousePressEvent(mouse_event(canvas, QEvent.Type.MouseButtonPress, cell, Qt.MouseButton.LeftButton))
+
+def move(canvas, cell: tuple) -> None:
+    canvas.mouseMoveEvent(mouse_event(canvas, QEvent.Type.MouseMove, cell))
+
+def release(canvas, cell: tuple) -> None:
+    canvas.mouseReleaseEvent(mouse_event(canvas, QEvent.Type.MouseButtonRelease, cell, Qt.MouseButton.LeftButton))
+
+def painted_cells(canvas) -> set[tuple[int, int]]:
+    width = canvas.size.x
+    return {(index % width, index // width) for index, cell_code in enumerate(canvas.grid.codes) if cell_code}
+
+@pytest.fixture
+def brush(canvas, monkeypatch) -> list[int]:
+    """
+    Selects ground for the left button and returns the amount of cells in each batch placed on the canvas.
+    """
+    canvas.communicator.select_item(canvas.item_list.get_item_by_name("tile_ground"), 1)
+
+    batches = []
+    place_many = canvas.place_many
+    def counting_place_many(cells, *args, **kwargs):
+        cells = list(cells)
+        batches.append(len(cells))
+        return place_many(cells, *args, **kwargs)
+
+    monkeypatch.setattr(canvas, "place_many", counting_place_many)
+    return batches
+
+def test_mouse_moves_wait_for_the_next_frame(canvas, brush):
+    press(canvas, (2, 2))
+    assert painted_cells(canvas) == {(2, 2)}
+
+    for cell in [(6, 2), (6, 6), (6, 6), (9, 8)]:
+        move(canvas, cell)
+
+    # only the cells the mouse moved to are buffered, nothing is placed yet
+    assert canvas._stroke_buffer == [(6, 2), (6, 6), (9, 8)]
+    assert canvas._frame_timer.isActive()
+    assert painted_cells(canvas) == {(2, 2)}
+    assert len(brush) == 1
+
+    canvas.flush_frame()
+
+    # the whole path is placed as one batch
+    expected = set(line_cells(2, 2, 6, 2)) | set(line_cells(6, 2, 6, 6)) | set(line_cells(6, 6, 9, 8))
+    assert painted_cells(canvas) == expected
+    assert len(brush) == 2
+    assert canvas._stroke_buffer == []
+    assert not canvas._frame_timer.isActive()
+    assert canvas.communicator.mouse_pos == (9, 8)
+
+def test_frames_without_input_place_nothing(canvas, brush):
+    press(canvas, (2, 2))
+    canvas.flush_frame()
+    canvas.flush_frame()
+
+    assert len(brush) == 1
+
+def test_release_finishes_the_stroke(canvas, brush):
+    press(canvas, (1, 1))
+    move(canvas, (4, 1))
+    move(canvas, (4, 3))
+    release(canvas, (4, 3))
+
+    # the buffered moves are placed before the stroke ends
+    assert painted_cells(canvas) == set(line_cells(1, 1, 4, 1)) | set(line_cells(4, 1, 4, 3))
+    assert len(brush) == 2
+
+    canvas._undo()
+    assert painted_cells(canvas) == set()
+
+def test_place_many_counts_changed_cells(canvas):
+    ground = code(canvas, "tile_ground")
+
+    assert canvas.place_many([3, 4, 5], ground) == 3
+    assert canvas.place_many([4, 5, 6], ground) == 1
+    assert [canvas.grid.codes[index] for index in range(2, 8)] == [0, ground, ground, ground, ground, 0]
+
+def test_place_many_later_placements_win(canvas):
+    ground, stone = code(canvas, "tile_ground"), code(canvas, "tile_stone")
+
+    assert canvas.place_many([7, 8, 7], [ground, ground, stone]) == 2
+    assert canvas.grid.codes[7] == stone
+    assert canvas.grid.codes[8] == ground
+
+def test_place_many_skips_cells_outside_the_map(canvas):
+    ground = code(canvas, "tile_ground")
+    cell_count = len(canvas.grid.codes)
+
+    assert canvas.place_many([-1, 0, cell_count, cell_count - 1], ground) == 2
+    assert canvas.grid.codes[0] == canvas.grid.codes[cell_count - 1] == ground
+
+def test_place_many_merges_like_the_brush(canvas):
+    back, water = code(canvas, "tile_ground_back"), code(canvas, "water_air")
+    water_back = code(canvas, "water_ground_back")
+
+    canvas.place_many([10, 11], back)
+    canvas.place_many([10, 11, 12], water, merge=True)
+    assert [canvas.grid.codes[index] for index in (10, 11, 12)] == [water_back, water_back, water]
+
+    # without merging the codes are placed as given
+    canvas.place_many([13], back)
+    canvas.place_many([13], water)
+    assert canvas.grid.codes[13] == water
+
+def test_place_many_merges_with_earlier_placements(canvas):
+    back, water = code(canvas, "tile_ground_back"), code(canvas, "water_air")
+
+    # each placement on a cell is resolved against the one before it in the batch
+    canvas.place_many([20, 20, 21], [back, water, water], merge=True)
+    assert canvas.grid.codes[20] == code(canvas, "water_ground_back")
+    assert canvas.grid.codes[21] == water
+
+def test_place_many_keeps_rotation_and_team(canvas):
+    ladder, shop = code(canvas, "ladder", 90, 1), code(canvas, "knight_shop", team=1)
+
+    canvas.place_many([30, 31], [ladder, shop], merge=True)
+    assert canvas.grid.codes[30] == ladder
+    assert canvas.grid.codes[31] == shop
+
+def test_place_many_is_one_undo_step(canvas):
+    ground, stone = code(canvas, "tile_ground"), code(canvas, "tile_stone")
+    canvas.place_many([1, 2], ground)
+    canvas.place_many([2, 3, 4], stone)
+
+    canvas._undo()
+    assert [canvas.grid.codes[index] for index in range(1, 5)] == [ground, ground, 0, 0]
+
+    canvas._redo()
+    assert [canvas.grid.codes[index] for index in range(1, 5)] == [ground, stone, stone, stone]
+
+def test_place_many_into_a_stroke(canvas):
+    ground = code(canvas, "tile_ground")
+
+    canvas.begin_stroke()
+    canvas.place_many([1, 2], ground)
+    canvas.place_many([3], ground)
+    canvas.end_stroke()
+
+    canvas._undo()
+    assert not any(canvas.grid.codes)
+    assert canvas.history.undo() is None
+
+def test_place_many_without_recording(canvas):
+    ground = code(canvas, "tile_ground")
+
+    assert canvas.place_many([1, 2], ground, record=False) == 2
+    assert canvas.history.undo() is None
+    assert canvas.grid.codes[1] == canvas.grid.codes[2] == ground
+
+def test_undo_is_not_recorded(canvas):
+    ground = code(canvas, "tile_ground")
+    canvas.place_many([1, 2], ground)
+
+    canvas._undo()
+    canvas._redo()
+    canvas._undo()
+    assert canvas.history.undo() is None
+    assert not any(canvas.grid.codes)
+
+def test_brush_is_clipped_to_the_map(canvas, brush):
+    canvas.communicator.settings["brush size"] = 3
+
+    canvas.paint([(0, 0)], 1)
+    assert painted_cells(canvas) == {(0, 0), (1, 0), (0, 1), (1, 1)}
+
+def test_stroke_paints_each_cell_once(canvas, brush):
+    canvas.communicator.settings["brush size"] = 3
+
+    canvas.begin_stroke()
+    canvas.paint([(5, 5), (6, 5)], 1)
+    canvas.paint([(6, 6)], 1)
+    canvas.end_stroke()
+
+    # both stamps of a paint are one batch, the second only adding its right column and the third its bottom row
+    assert brush == [12, 3]
+    assert painted_cells(canvas) == {(x, y) for x in range(4, 8) for y in range(4, 8)} - {(4, 7)}
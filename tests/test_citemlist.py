@@ -0,0 +1,76 @@
+"""
+Tests for the merge table built with the item list.
+"""
+import pytest
+from PyQt6.QtWidgets import QApplication
+
+from base.citem import CItem
+from base.citemlist import CItemList, ID_SHIFT
+from base.renderer import Renderer
+
+# the pairs are found while collecting, before the app fixture exists, and the item list needs an application
+_app = QApplication.instance() or QApplication([])
+
+def get_merge_pairs() -> list[tuple[str, str]]:
+    """
+    Returns every (placing, existing) pair of item names where either item merges with the other,
+    and every mergeable item placed onto itself.
+    """
+    pairs = set()
+    for item in CItemList().all_items:
+        name = item.name_data.name
+        for other_name in item.sprite.properties.merges_with:
+            pairs.update(((name, name), (name, other_name), (other_name, name)))
+
+    return sorted(pairs)
+
+def merge_by_name(item_list: CItemList, placing: CItem, existing: CItem) -> int:
+    """
+    Merges two items the way placing did before the table,
+    trying what the placed item merges into first, then what the existing item merges into.
+    """
+    for name in (placing.merge_with(existing.name_data.name), existing.merge_with(placing.name_data.name)):
+        merged_id = item_list.get_item_id(name) if name is not None else 0
+        if merged_id != 0:
+            return merged_id
+
+    return 0
+
+@pytest.fixture(scope="module")
+def renderer(app) -> Renderer:
+    return Renderer()
+
+@pytest.mark.parametrize("placing_name, existing_name", get_merge_pairs())
+def test_merge_table_matches_merge_with(item_list, renderer, placing_name, existing_name):
+    placing_id, existing_id = item_list.get_item_id(placing_name), item_list.get_item_id(existing_name)
+    if placing_id == 0 or existing_id == 0:
+        pytest.skip(f"{placing_name} or {existing_name} isn't in the item list")
+
+    placing, existing = item_list.get_item_by_id(placing_id), item_list.get_item_by_id(existing_id)
+    merged_id = merge_by_name(item_list, placing, existing)
+    assert item_list.get_merge_result(placing_id, existing_id) == merged_id
+
+    existing_code = existing_id << ID_SHIFT
+    code = renderer.resolve_placement(placing_id << ID_SHIFT, existing_code)
+    if merged_id == 0:
+        assert code >> ID_SHIFT == placing_id
+    elif merged_id == placing_id:
+        # items merging into itself dont place
+        assert code == existing_code
+    else:
+        assert code >> ID_SHIFT == merged_id
+
+def test_items_that_dont_merge(item_list):
+    ground, stone = item_list.get_item_id("tile_ground"), item_list.get_item_id("tile_stone")
+
+    assert item_list.get_merge_result(ground, stone) == 0
+    assert item_list.get_merge_result(0, ground) == 0
+    assert item_list.get_merge_result(ground, len(item_list.merge_table)) == 0
+
+def test_merging_into_itself_places_nothing(renderer, monkeypatch):
+    item_list = renderer.item_list
+    ground, stone = item_list.get_item_id("tile_ground"), item_list.get_item_id("tile_stone")
+
+    # no vanilla pair merges into the placed item, so make one
+    monkeypatch.setattr(item_list, "get_merge_result", lambda placing_id, existing_id: placing_id)
+    assert renderer.resolve_placement(ground << ID_SHIFT, stone << ID_SHIFT) == stone << ID_SHIFT
@@ -0,0 +1,85 @@
+"""
+Tests for finding and replacing items across the map.
+"""
+import random
+
+import pytest
+
+from base.citemlist import ID_SHIFT, ROTATION_MASK, ROTATION_SHIFT, TEAM_MASK
+from base.find_replace import MATCH_COLOR, MATCH_ITEM, MATCH_MODES, MATCH_TYPE, find_cells, get_replacement_codes
+from base.tile_grid import TileGrid
+
+def brute_force(grid, item_list, target, mode, team=None, rotation=None, region=None) -> list[int]:
+    def get_item(code):
+        return item_list.get_item_by_id(code >> ID_SHIFT)
+
+    def get_color(code):
+        team = code & TEAM_MASK
+        color = get_item(code).get_color(((code >> ROTATION_SHIFT) & 3) * 90, team - 256 if team > 127 else team)
+        return None if color is None else tuple(color[1:])
+
+    left, top, right, bottom = region or (0, 0, grid.width - 1, grid.height - 1)
+    found = []
+    for index, code in enumerate(grid.codes):
+        x, y = grid.position(index)
+        if code == 0 or not (left <= x <= right and top <= y <= bottom):
+            continue
+
+        if mode == MATCH_ITEM and code >> ID_SHIFT != target >> ID_SHIFT:
+            continue
+        if mode == MATCH_TYPE and get_item(code).type != get_item(target).type:
+            continue
+        if mode == MATCH_COLOR and (get_color(target) is None or get_color(code) != get_color(target)):
+            continue
+        if team is not None and code & TEAM_MASK != team:
+            continue
+        if rotation is not None and ((code >> ROTATION_SHIFT) & 3) * 90 != rotation:
+            continue
+
+        found.append(index)
+
+    return found
+
+@pytest.fixture(scope="module")
+def random_grid(sample_codes) -> TileGrid:
+    rng = random.Random(41)
+    grid = TileGrid(30, 20)
+    grid.set_many(range(600), rng.choices(sample_codes, k=600))
+    return grid
+
+@pytest.mark.parametrize("mode", MATCH_MODES)
+def test_find_matches_brute_force(item_list, sample_codes, random_grid, mode):
+    for target in set(sample_codes) - {0}:
+        found = find_cells(random_grid, item_list, target, mode)
+        assert list(found) == brute_force(random_grid, item_list, target, mode)
+
+@pytest.mark.parametrize("team, rotation, region", [
+    (1, None, None), (None, 90, None), (0, 0, None), (None, None, (3, 2, 17, 11)), (1, 90, (-5, 10, 100, 30))
+])
+def test_find_filters_match_brute_force(item_list, sample_codes, random_grid, team, rotation, region):
+    for target in set(sample_codes) - {0}:
+        for mode in (MATCH_ITEM, MATCH_TYPE):
+            found = find_cells(random_grid, item_list, target, mode, team, rotation, region)
+            assert list(found) == brute_force(random_grid, item_list, target, mode, team, rotation, region)
+
+def test_nothing_matches_empty(item_list, random_grid):
+    assert len(find_cells(random_grid, item_list, 0)) == 0
+
+def test_unknown_mode_is_an_error(item_list, random_grid):
+    with pytest.raises(ValueError):
+        find_cells(random_grid, item_list, 1 << ID_SHIFT, "same name")
+
+def test_replacement_keeps_team_and_rotation(item_list):
+    door = item_list.get_item_id("wooden_door") << ID_SHIFT
+    ground = item_list.get_item_id("tile_ground") << ID_SHIFT
+    grid = TileGrid(3, 1)
+    grid.set_many([0, 1, 2], [door | (1 << ROTATION_SHIFT) | 1, door, ground])
+
+    stone_door = item_list.get_item_by_name("stone_door")
+    stone_code = item_list.encode_item(stone_door)
+    codes = get_replacement_codes(grid, item_list, [0, 1, 2], stone_door)
+    assert list(codes) == [(stone_code & ~(ROTATION_MASK | TEAM_MASK)) | (1 << ROTATION_SHIFT) | 1, stone_code & ~(ROTATION_MASK | TEAM_MASK), stone_code]
+
+    bedrock = item_list.get_item_by_name("tile_bedrock")
+    assert list(get_replacement_codes(grid, item_list, [0, 2], bedrock)) == [item_list.encode_item(bedrock)] * 2
+    assert list(get_replacement_codes(grid, item_list, [0, 2], None)) == [0, 0]
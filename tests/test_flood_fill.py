@@ -0,0 +1,87 @@
+"""
+Tests for the scanline flood fill.
+"""
+import random
+from collections import deque
+
+import pytest
+
+from base.citemlist import ID_SHIFT
+from base.flood_fill import ANY_NON_EMPTY, BOUNDARY_MODES, SAME_ITEM, SAME_TYPE, flood_fill
+from base.tile_grid import TileGrid
+
+def random_grid(item_list, seed: int, width: int = 23, height: int = 17) -> TileGrid:
+    rng = random.Random(seed)
+    names = ("tile_ground", "tile_stone", "lamp", "ladder")
+    codes = [0, 0, 0] + [item_list.get_item_id(name) << ID_SHIFT for name in names]
+    grid = TileGrid(width, height)
+    grid.set_many(range(width * height), [code | rng.randrange(2) if code else 0 for code in rng.choices(codes, k=width * height)])
+    return grid
+
+def bfs_fill(grid: TileGrid, x: int, y: int, mode: str, item_list) -> set[int]:
+    # the same region found one cell at a time
+    def kind(code):
+        if mode == SAME_ITEM:
+            return code >> ID_SHIFT
+        if mode == SAME_TYPE:
+            return None if code == 0 else item_list.get_item_by_id(code >> ID_SHIFT).type
+        return code == 0
+
+    start = grid.index(x, y)
+    start_kind = kind(grid.codes[start])
+    region = {start}
+    queue = deque((start,))
+    while queue:
+        index = queue.popleft()
+        cx, cy = grid.position(index)
+        for nx, ny in ((cx - 1, cy), (cx + 1, cy), (cx, cy - 1), (cx, cy + 1)):
+            neighbor = grid.index(nx, ny)
+            if grid.in_bounds(nx, ny) and neighbor not in region and kind(grid.codes[neighbor]) == start_kind:
+                region.add(neighbor)
+                queue.append(neighbor)
+
+    return region
+
+@pytest.mark.parametrize("mode", BOUNDARY_MODES)
+@pytest.mark.parametrize("seed", range(5))
+def test_fill_matches_cell_by_cell_search(item_list, mode, seed):
+    grid = random_grid(item_list, seed)
+    rng = random.Random(seed)
+    for _ in range(10):
+        x, y = rng.randrange(grid.width), rng.randrange(grid.height)
+        region = flood_fill(grid, x, y, mode, item_list=item_list)
+
+        assert len(region) == len(set(region))
+        assert set(region) == bfs_fill(grid, x, y, mode, item_list)
+
+def test_fill_stops_at_the_map_edges():
+    grid = TileGrid(10, 4)
+    # a wall in the middle column, cells on the other side of a row edge are not connected
+    for y in range(4):
+        grid.set(grid.index(5, y), 1 << ID_SHIFT)
+
+    assert set(flood_fill(grid, 0, 0)) == {grid.index(x, y) for x in range(5) for y in range(4)}
+
+def test_fill_over_the_limit_returns_none():
+    grid = TileGrid(20, 10)
+
+    assert flood_fill(grid, 3, 3, max_area=199) is None
+    assert len(flood_fill(grid, 3, 3, max_area=200)) == 200
+
+def test_fill_out_of_bounds_is_empty():
+    grid = TileGrid(5, 5)
+
+    assert len(flood_fill(grid, -1, 2)) == 0
+    assert len(flood_fill(grid, 2, 5)) == 0
+
+def test_any_non_empty_spreads_over_items(item_list):
+    grid = TileGrid(4, 1)
+    grid.set_many([0, 1, 2], [item_list.get_item_id("tile_ground") << ID_SHIFT, item_list.get_item_id("lamp") << ID_SHIFT, 1 << ID_SHIFT])
+
+    assert sorted(flood_fill(grid, 0, 0, ANY_NON_EMPTY)) == [0, 1, 2]
+    assert sorted(flood_fill(grid, 0, 0, SAME_TYPE, item_list=item_list)) == [0]
+    assert sorted(flood_fill(grid, 3, 0, SAME_ITEM)) == [3]
+
+def test_unknown_mode_is_an_error():
+    with pytest.raises(ValueError):
+        flood_fill(TileGrid(3, 3), 0, 0, "same color")
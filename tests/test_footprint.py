@@ -0,0 +1,91 @@
+"""
+Tests for the footprint index of big items.
+"""
+import random
+
+from base.citemlist import ID_SHIFT
+from base.footprint import FootprintIndex
+from base.tile_grid import TileGrid
+
+# the sprite scale of the canvas, where a cell is 8 pixels
+SCALE = 3
+GRID_SPACING = 8 * SCALE
+
+def get_covering(index: FootprintIndex) -> dict[int, list[int]]:
+    return {cell: sorted(anchors) for cell, anchors in index._covering.items()}
+
+def rebuilt(index: FootprintIndex) -> dict[int, list[int]]:
+    # a new index works every footprint out from the whole grid
+    fresh = FootprintIndex(index.grid, index.item_list, GRID_SPACING, SCALE)
+    index.grid.remove_listener(fresh)
+    return get_covering(fresh)
+
+def test_incremental_index_matches_a_rebuild(item_list, sample_codes):
+    rng = random.Random(45)
+    grid = TileGrid(30, 20)
+    index = FootprintIndex(grid, item_list, GRID_SPACING, SCALE)
+    # mostly empty, so big items are spread out like on a real map
+    codes = [0] * 40 + sample_codes
+
+    for step in range(80):
+        if step % 2:
+            grid.set(rng.randrange(len(grid.codes)), rng.choice(codes))
+        else:
+            cells = rng.sample(range(len(grid.codes)), rng.randrange(1, 40))
+            grid.set_many(cells, rng.choices(codes, k=len(cells)))
+
+        assert get_covering(index) == rebuilt(index)
+
+    assert index._covering
+
+def test_big_items_cover_their_sprite(item_list):
+    grid = TileGrid(20, 20)
+    index = FootprintIndex(grid, item_list, GRID_SPACING, SCALE)
+    shop = item_list.get_item_id("knight_shop") << ID_SHIFT
+    anchor = grid.index(10, 10)
+    grid.set(anchor, shop)
+
+    left, top, right, bottom = index.get_footprint(shop)
+    cells = index.get_cells(anchor)
+    assert len(cells) == (right - left + 1) * (bottom - top + 1) > 1
+    assert anchor in cells
+    for cell in cells:
+        assert index.get_anchors(cell) == [anchor]
+        assert index.get_owner(cell) == anchor
+
+    grid.set(anchor, 0)
+    assert index._covering == {}
+    assert index.get_owner(anchor) == -1
+
+def test_single_cell_items_have_no_footprint(item_list):
+    grid = TileGrid(5, 5)
+    index = FootprintIndex(grid, item_list, GRID_SPACING, SCALE)
+    ground = item_list.get_item_id("tile_ground") << ID_SHIFT
+    grid.set(7, ground)
+
+    assert index.get_footprint(ground) is None
+    assert index.get_cells(7) == [7]
+    assert index.get_cells(8) == []
+    assert index.get_bounds(7) == (2, 1, 2, 1)
+    assert index.get_owner(7) == 7
+
+def test_footprints_are_clipped_to_the_grid(item_list):
+    grid = TileGrid(6, 6)
+    index = FootprintIndex(grid, item_list, GRID_SPACING, SCALE)
+    shop = item_list.get_item_id("knight_shop") << ID_SHIFT
+    grid.set(0, shop)
+
+    cells = index.get_cells(0)
+    assert cells and all(0 <= cell < 36 for cell in cells)
+    assert sorted(index._covering) == sorted(cells)
+
+def test_overlaps_skip_the_replaced_item(item_list):
+    grid = TileGrid(20, 20)
+    index = FootprintIndex(grid, item_list, GRID_SPACING, SCALE)
+    shop = item_list.get_item_id("knight_shop") << ID_SHIFT
+    first, second = grid.index(5, 10), grid.index(7, 10)
+    grid.set(first, shop)
+
+    assert index.get_overlaps(first, shop) == set()
+    assert index.get_overlaps(second, shop) == {first}
+    assert index.get_overlaps(grid.index(19, 0), shop) == set()
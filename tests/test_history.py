@@ -0,0 +1,91 @@
+"""
+Tests for the undo / redo history.
+"""
+from array import array
+
+from base.history import EditHistory
+from base.tile_grid import TileGrid
+
+def apply(grid: TileGrid, changes: tuple[array, array]) -> None:
+    cells, codes = changes
+    for index, code in zip(cells, codes):
+        grid.set(index, code)
+
+def test_transaction_groups_changes():
+    history = EditHistory()
+    history.begin()
+    history.record(1, 0, 5)
+    history.record(2, 0, 6)
+    transaction = history.commit()
+
+    assert list(transaction.cells) == [1, 2]
+    assert list(transaction.old) == [0, 0]
+    assert list(transaction.new) == [5, 6]
+    assert history.undo() is transaction
+    assert history.undo() is None
+
+def test_unchanged_cells_are_not_recorded():
+    history = EditHistory()
+    history.record(1, 3, 3)
+    history.record_many([1, 2, 3], [0, 4, 0], [0, 4, 7])
+
+    transaction = history.undo()
+    assert list(transaction.cells) == [3]
+    assert history.undo() is None
+
+def test_changes_outside_a_transaction_commit_on_their_own():
+    history = EditHistory()
+    history.record(1, 0, 5)
+    history.record(2, 0, 6)
+
+    assert list(history.undo().cells) == [2]
+    assert list(history.undo().cells) == [1]
+
+def test_undo_and_redo_restore_the_grid():
+    grid = TileGrid(8, 8)
+    history = EditHistory()
+    states = [grid.snapshot()]
+
+    # the same cell is changed several times within a stroke, undo has to apply the changes in reverse
+    for stroke in ([(0, 1), (1, 2), (0, 3)], [(0, 4), (5, 4), (1, 0)]):
+        history.begin()
+        for index, code in stroke:
+            history.record(index, grid.get(index), code)
+            grid.set(index, code)
+        history.commit()
+        states.append(grid.snapshot())
+
+    for state in reversed(states[:-1]):
+        apply(grid, history.undo().undo_changes())
+        assert grid.codes == state
+
+    for state in states[1:]:
+        apply(grid, history.redo().redo_changes())
+        assert grid.codes == state
+
+def test_new_changes_clear_redo():
+    history = EditHistory()
+    history.record(1, 0, 5)
+    history.undo()
+    history.record(2, 0, 6)
+
+    assert history.redo() is None
+    assert history.nbytes == 12
+
+def test_history_is_trimmed_to_its_budget():
+    history = EditHistory(max_bytes=100)
+    for index in range(20):
+        history.record(index, 0, 1)
+
+    # every single change takes 12 bytes, so only 8 fit
+    assert history.nbytes <= 100
+    undone = []
+    while (transaction := history.undo()) is not None:
+        undone.append(transaction.cells[0])
+    assert undone == list(range(19, 11, -1))
+
+def test_latest_transaction_is_kept_over_budget():
+    history = EditHistory(max_bytes=10)
+    history.record_many(range(100), [0] * 100, [1] * 100)
+
+    assert len(history.undo()) == 100
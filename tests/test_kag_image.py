@@ -0,0 +1,149 @@
+"""
+Tests for reading and saving KAG map images.
+"""
+import os
+from array import array
+
+import pytest
+from PIL import Image
+
+from base.citemlist import ID_SHIFT
+from base.kag_image import KagImage
+from base.map_writer import FAST_PROFILE, MapSnapshot, encode_map, write_png
+from utils.vec2f import Vec2f
+
+@pytest.fixture
+def kag_image(canvas) -> KagImage:
+    return KagImage()
+
+@pytest.fixture
+def path(tmp_path) -> str:
+    return str(tmp_path / "map.png")
+
+def ground(canvas) -> int:
+    return canvas.item_list.get_item_id("tile_ground") << ID_SHIFT
+
+def code(canvas, name: str, rotation: int = 0, team: int = 0) -> int:
+    return canvas.item_list.get_item_id(name) << ID_SHIFT | rotation // 90 << 8 | team
+
+def round_trip(kag_image, path, width: int, height: int, cells: dict) -> dict:
+    """
+    Saves a map with the given {(x, y): code} cells, reads it back and returns its cells.
+    """
+    codes = array('I', bytes(4 * width * height))
+    for (x, y), cell_code in cells.items():
+        codes[y * width + x] = cell_code
+
+    write_png(encode_map(MapSnapshot(width, height, codes), kag_image.item_list), path, FAST_PROFILE)
+    snapshot = kag_image.read_map(path)
+
+    assert (snapshot.width, snapshot.height) == (width, height)
+    return {(index % width, index // width): cell_code for index, cell_code in enumerate(snapshot.codes) if cell_code}
+
+def test_saved_map_is_not_saved_again(canvas, kag_image, path):
+    canvas.place_many([5, 6], ground(canvas))
+    kag_image.save_map(path, background=False)
+    assert kag_image.is_saved(path)
+
+    mtime = os.stat(path).st_mtime_ns
+    kag_image.save_map(path, background=False)
+    assert os.stat(path).st_mtime_ns == mtime
+
+def test_edit_needs_a_save(canvas, kag_image, path):
+    kag_image.save_map(path, background=False)
+    canvas.place_many([5], ground(canvas))
+
+    assert not kag_image.is_saved(path)
+    assert not kag_image.is_saved(str(path) + ".other")
+
+def test_undone_edit_is_still_saved(canvas, kag_image, path):
+    canvas.place_many([5], ground(canvas))
+    kag_image.save_map(path, background=False)
+    revision = canvas.grid.revision
+
+    canvas.place_many([7, 8], ground(canvas))
+    canvas._undo()
+    assert canvas.grid.revision != revision
+    assert kag_image.is_saved(path)
+
+def test_changed_file_needs_a_save(canvas, kag_image, path):
+    canvas.place_many([5], ground(canvas))
+    kag_image.save_map(path, background=False)
+
+    # something else wrote the file, with a new time but the same size
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+    assert not kag_image.is_saved(path)
+
+def test_resized_file_needs_a_save(canvas, kag_image, path):
+    kag_image.save_map(path, background=False)
+    stat = os.stat(path)
+
+    with open(path, 'ab') as f:
+        f.write(b"more")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert not kag_image.is_saved(path)
+
+    os.remove(path)
+    assert not kag_image.is_saved(path)
+
+def test_resized_map_needs_a_save(canvas, kag_image, path):
+    kag_image.save_map(path, background=False)
+
+    # an empty map of another size has the same (empty) tiles
+    canvas.resize_canvas(Vec2f(30, 40))
+    assert canvas.grid.content_hash == 0
+    assert not kag_image.is_saved(path)
+
+def test_stacked_trees_are_saved_at_the_bottom(canvas, kag_image, path):
+    tree = code(canvas, "tree")
+    cells = {(3, y): tree for y in range(2, 6)}
+    cells[(5, 4)] = tree
+
+    assert round_trip(kag_image, path, 8, 8, cells) == {(3, 5): tree, (5, 4): tree}
+
+def test_stacked_trees_in_a_map_are_loaded_as_one(canvas, kag_image, path):
+    # a map written by another editor has a pixel for every block of the tree
+    tree_color = kag_image.argb_to_rgba(canvas.item_list.get_item_by_name("tree").get_color())
+    sky_color = kag_image.argb_to_rgba(canvas.item_list.get_item_by_name("sky").get_color())
+    image = Image.new("RGBA", (4, 6), sky_color)
+    for y in range(1, 5):
+        image.putpixel((2, y), tree_color)
+    image.save(path)
+
+    snapshot = kag_image.read_map(path)
+    assert [index for index, cell_code in enumerate(snapshot.codes) if cell_code] == [4 * 4 + 2]
+
+def test_other_items_in_a_column_are_kept(canvas, kag_image, path):
+    tree, bush = code(canvas, "tree"), code(canvas, "bush")
+    cells = {(1, y): ground(canvas) for y in range(6)}
+    cells.update({(4, 0): bush, (4, 1): bush, (4, 2): tree, (4, 3): tree, (4, 4): bush, (4, 5): tree})
+
+    expected = dict(cells)
+    del expected[(4, 2)]
+    assert round_trip(kag_image, path, 6, 6, cells) == expected
+
+def test_mixed_rotation_and_team_in_a_column(canvas, kag_image, path):
+    ladders = {(2, y): code(canvas, "ladder", rotation, team) for y, (rotation, team) in enumerate([(0, 0), (90, 1), (180, 0), (270, 1)])}
+    cells = dict(ladders)
+
+    # trees collapse by item, whatever their rotation and team bits
+    cells.update({(3, 1): code(canvas, "tree", team=1), (3, 2): code(canvas, "tree"), (3, 3): code(canvas, "tree", team=1)})
+
+    loaded = round_trip(kag_image, path, 5, 5, cells)
+    assert {pos: loaded[pos] for pos in ladders} == ladders
+    assert [pos for pos in loaded if pos[0] == 3] == [(3, 3)]
+    assert loaded[(3, 3)] >> ID_SHIFT == canvas.item_list.get_item_id("tree")
+
+def test_columns_at_the_map_edges(canvas, kag_image, path):
+    tree = code(canvas, "tree")
+    width, height = 5, 4
+    cells = {(x, y): tree for x in (0, width - 1) for y in range(height)}
+
+    # the last cell of a row and the first of the next are neighbours in the codes, not in a column
+    cells[(width - 1, 0)] = 0
+    cells[(width - 2, 1)] = tree
+    cells[(0, 2)] = 0
+
+    loaded = round_trip(kag_image, path, width, height, {pos: cell_code for pos, cell_code in cells.items() if cell_code})
+    assert loaded == {(0, 1): tree, (0, height - 1): tree, (width - 2, 1): tree, (width - 1, height - 1): tree}
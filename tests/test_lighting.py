@@ -0,0 +1,100 @@
+"""
+Tests for the lighting preview, compared with spreading light over the whole map at once.
+"""
+import random
+
+import pytest
+
+from base.citemlist import ID_SHIFT
+from base.lighting import MAX_LIGHT, SKY_LIGHT, LightMap
+from base.tile_grid import TileGrid
+
+def light_whole_map(light_map: LightMap) -> bytearray:
+    # light spread from every source over the whole map, one level at a time
+    grid = light_map.grid
+    width, height = grid.width, grid.height
+    kinds = [light_map.get_kind(code) for code in grid.codes]
+
+    levels = bytearray(len(kinds))
+    for x in range(width):
+        for y in range(height):
+            if kinds[y * width + x][0]:
+                break
+            levels[y * width + x] = SKY_LIGHT
+
+    for index, (_, level) in enumerate(kinds):
+        levels[index] = max(levels[index], level)
+
+    for level in range(MAX_LIGHT, 1, -1):
+        for index in [i for i in range(len(levels)) if levels[i] == level and not kinds[i][0]]:
+            x, y = index % width, index // width
+            for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+                if 0 <= nx < width and 0 <= ny < height:
+                    neighbor = ny * width + nx
+                    levels[neighbor] = max(levels[neighbor], level - 1)
+
+    return levels
+
+@pytest.fixture
+def codes(item_list) -> list[int]:
+    solid = [item_list.get_item_id(name) << ID_SHIFT for name in ("tile_ground", "tile_stone", "tile_bedrock")]
+    lights = [item_list.get_item_id(name) << ID_SHIFT for name in ("lamp", "lantern")]
+    return [0] * 6 + solid * 3 + lights + [item_list.get_item_id("tile_castle_back") << ID_SHIFT]
+
+def test_full_update_matches_spreading_over_the_whole_map(item_list, codes):
+    rng = random.Random(50)
+    grid = TileGrid(45, 40)
+    grid.set_many(range(len(grid.codes)), rng.choices(codes, k=len(grid.codes)))
+    light_map = LightMap(grid, item_list)
+
+    light_map.update()
+    assert light_map.levels == light_whole_map(light_map)
+
+@pytest.mark.parametrize("width, height", ((45, 40), (32, 48)))
+def test_incremental_update_matches_a_full_one(item_list, codes, width, height):
+    rng = random.Random(width)
+    grid = TileGrid(width, height)
+    # solid ground under a mostly open sky, so edits open and close the sky over the ground
+    ground = [rng.choice(codes) if y < height // 3 else rng.choice(codes[6:]) for y in range(height) for _ in range(width)]
+    grid.set_many(range(len(grid.codes)), ground)
+    light_map = LightMap(grid, item_list)
+    light_map.update()
+
+    for step in range(40):
+        if step % 3:
+            grid.set(rng.randrange(len(grid.codes)), rng.choice(codes))
+        else:
+            cells = rng.sample(range(len(grid.codes)), rng.randrange(1, 25))
+            grid.set_many(cells, rng.choices(codes, k=len(cells)))
+
+        if step % 2:
+            light_map.update()
+            assert light_map.levels == light_whole_map(light_map)
+
+def test_only_chunks_near_an_edit_are_lit_again(item_list):
+    lamp = item_list.get_item_id("lamp") << ID_SHIFT
+    grid = TileGrid(96, 96)
+    light_map = LightMap(grid, item_list)
+    light_map.update()
+
+    grid.set(grid.index(40, 40), lamp)
+    # the edited chunk and the chunks within LIGHT_REACH of it
+    assert light_map.update() == {chunk_y * 6 + chunk_x for chunk_y in range(1, 4) for chunk_x in range(1, 4)}
+
+    # a background tile doesn't change the light
+    grid.set(grid.index(5, 5), item_list.get_item_id("tile_castle_back") << ID_SHIFT)
+    assert light_map.update() == set()
+
+def test_closing_the_sky_darkens_the_column(item_list):
+    stone = item_list.get_item_id("tile_stone") << ID_SHIFT
+    grid = TileGrid(3, 40)
+    light_map = LightMap(grid, item_list)
+    assert light_map.get_level(grid.index(1, 39)) == SKY_LIGHT
+
+    grid.set_many([grid.index(x, 0) for x in range(3)], [stone] * 3)
+    assert light_map.get_level(grid.index(1, 0)) == 0
+    assert light_map.get_level(grid.index(1, 39)) == 0
+
+    grid.set(grid.index(1, 0), 0)
+    assert light_map.get_level(grid.index(1, 39)) == SKY_LIGHT
+    assert light_map.get_level(grid.index(0, 0)) == SKY_LIGHT - 1
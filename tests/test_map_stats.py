@@ -0,0 +1,121 @@
+"""
+Tests for the map statistics, compared with counting every cell.
+"""
+import random
+
+import pytest
+
+from base.citemlist import ID_SHIFT, TEAM_MASK
+from base.map_stats import LEFT, MIDDLE, RIGHT, MapStats
+from base.spatial_index import SpatialIndex
+from base.tile_grid import GridListener, TileGrid
+
+def count(grid: TileGrid, item_list, item_id: int, team: int = None, side: int = None) -> int:
+    width = grid.width
+    total = 0
+    for index, code in enumerate(grid.codes):
+        if code == 0 or code >> ID_SHIFT != item_id:
+            continue
+
+        x = index % width
+        code_side = LEFT if x < width // 2 else RIGHT if x >= (width + 1) // 2 else MIDDLE
+        code_team = code & TEAM_MASK
+        if not item_list.get_item_by_id(item_id).sprite.properties.can_swap_teams:
+            code_team = None
+        if (team is None or code_team == team) and (side is None or code_side == side):
+            total += 1
+
+    return total
+
+@pytest.mark.parametrize("width", (50, 51))
+def test_counts_match_brute_force(item_list, sample_codes, width):
+    rng = random.Random(width)
+    grid = TileGrid(width, 40)
+    stats = MapStats(SpatialIndex(grid), item_list)
+    item_ids = sorted({code >> ID_SHIFT for code in sample_codes} - {0})
+
+    for step in range(30):
+        if step % 2:
+            grid.set(rng.randrange(len(grid.codes)), rng.choice(sample_codes))
+        else:
+            cells = rng.sample(range(len(grid.codes)), rng.randrange(1, 200))
+            grid.set_many(cells, rng.choices(sample_codes, k=len(cells)))
+
+        if step % 3 == 0:
+            for item_id in item_ids:
+                for team in (None, 0, 1):
+                    for side in (None, LEFT, RIGHT, MIDDLE):
+                        assert stats.get_count(item_id, team, side) == count(grid, item_list, item_id, team, side)
+
+def test_rows_balance_the_teams(item_list):
+    grid = TileGrid(10, 2)
+    stats = MapStats(SpatialIndex(grid), item_list)
+    shop = item_list.get_item_id("knight_shop")
+    tree = item_list.get_item_id("tree")
+    # two blue shops on the left, one red shop on the right and a tree in the middle of each half
+    grid.set_many([0, 1, 18, 4, 15], [shop << ID_SHIFT, shop << ID_SHIFT, (shop << ID_SHIFT) | 1, tree << ID_SHIFT, tree << ID_SHIFT])
+
+    rows = {(row.name, row.team): row for row in stats.get_rows()}
+    assert set(rows) == {("knight_shop", 0), ("knight_shop", 1), ("tree", None)}
+    assert (rows["knight_shop", 0].left, rows["knight_shop", 0].balance) == (2, 1)
+    assert (rows["knight_shop", 1].right, rows["knight_shop", 1].balance) == (1, 0)
+    assert (rows["tree", None].left, rows["tree", None].right, rows["tree", None].total) == (1, 1, 2)
+    assert stats.get_team_totals("blob") == {0: 2, 1: 1}
+    assert stats.get_team_totals("tile") == {}
+
+def test_counts_follow_a_reset(item_list):
+    grid = TileGrid(10, 2)
+    stats = MapStats(SpatialIndex(grid), item_list)
+    grid.set(3, 2 << ID_SHIFT)
+    assert stats.get_count(2) == 1
+
+    grid.reset(11, 3)
+    assert stats.get_count(2) == 0
+    assert stats.get_rows() == []
+
+def test_edits_update_the_counts(item_list, monkeypatch):
+    grid = TileGrid(20, 4)
+    spatial = SpatialIndex(grid)
+    stats = MapStats(spatial, item_list)
+    ground = item_list.get_item_id("tile_ground")
+    grid.set_many([0, 1, 2], [ground << ID_SHIFT] * 3)
+    assert stats.get_count(ground) == 3
+
+    # the map is only counted once, edits after that change the counts
+    def count_codes(first_x, last_x):
+        raise AssertionError("counted the map again")
+
+    monkeypatch.setattr(spatial, "count_codes", count_codes)
+    grid.set_many([2, 3, 19], [0, ground << ID_SHIFT, ground << ID_SHIFT])
+    grid.set(59, ground << ID_SHIFT)
+    assert (stats.get_count(ground, side=LEFT), stats.get_count(ground, side=RIGHT)) == (3, 2)
+
+    grid.set_many([0, 1, 3, 19, 59], [0] * 5)
+    assert stats.get_rows() == []
+
+def test_big_batches_are_counted_again(item_list):
+    grid = TileGrid(20, 4)
+    stats = MapStats(SpatialIndex(grid), item_list)
+    ground, stone = item_list.get_item_id("tile_ground"), item_list.get_item_id("tile_stone")
+    grid.set(0, ground << ID_SHIFT)
+    assert stats.get_count(ground) == 1
+
+    grid.set_many(range(1, 60), [stone << ID_SHIFT] * 59)
+    assert (stats.get_count(stone, side=LEFT), stats.get_count(stone, side=RIGHT)) == (29, 30)
+    assert stats.get_count(ground) == 1
+
+def test_counts_taken_during_an_edit(item_list):
+    grid = TileGrid(10, 2)
+    stats = MapStats(SpatialIndex(grid), item_list)
+    ground = item_list.get_item_id("tile_ground")
+
+    class Reader(GridListener):
+        def cells_changed(self, indexes, old, new):
+            self.count = stats.get_count(ground)
+
+    # a listener before the stats counts the map with the edit already made
+    reader = Reader()
+    grid.listeners.insert(0, reader)
+    grid.set_many([1, 2], [ground << ID_SHIFT] * 2)
+
+    assert reader.count == stats.get_count(ground) == 2
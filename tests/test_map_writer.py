@@ -0,0 +1,68 @@
+"""
+Tests for encoding maps and writing them to disk.
+"""
+import os
+import random
+from array import array
+
+import pytest
+from PIL import Image
+
+from base.citemlist import ID_SHIFT
+from base.map_writer import ARCHIVAL_PROFILE, FAST_PROFILE, MapSnapshot, argb_to_rgba, encode_map, write_png
+
+def test_write_replaces_the_file(tmp_path):
+    path = tmp_path / "map.png"
+    path.write_bytes(b"old map")
+
+    write_png(Image.new("RGBA", (4, 3), (1, 2, 3, 255)), str(path), FAST_PROFILE)
+
+    with Image.open(path) as image:
+        assert image.size == (4, 3)
+        assert image.getpixel((2, 1)) == (1, 2, 3, 255)
+    assert os.listdir(tmp_path) == ["map.png"]
+
+def test_failed_write_keeps_the_old_file(tmp_path, monkeypatch):
+    path = tmp_path / "map.png"
+    path.write_bytes(b"old map")
+
+    def fail(self, fp, *args, **kwargs):
+        fp.write(b"half a map")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(Image.Image, "save", fail)
+    with pytest.raises(OSError):
+        write_png(Image.new("RGBA", (4, 3)), str(path))
+
+    assert path.read_bytes() == b"old map"
+    assert os.listdir(tmp_path) == ["map.png"]
+
+def test_encode_map_colors(item_list):
+    ground = item_list.get_item_by_name("tile_ground")
+    code = item_list.get_item_id("tile_ground") << ID_SHIFT
+    codes = array('I', [0, code, 0, code, code, 0])
+
+    image = encode_map(MapSnapshot(3, 2, codes), item_list)
+
+    sky = argb_to_rgba(item_list.get_item_by_name("sky").get_color())
+    tile = argb_to_rgba(ground.get_color())
+    assert list(image.getdata()) == [sky, tile, sky, tile, tile, sky]
+
+def test_profiles_decode_to_the_same_pixels(tmp_path, item_list, sample_codes):
+    rng = random.Random(30)
+    width, height = 64, 48
+    codes = array('I', (rng.choice(sample_codes) for _ in range(width * height)))
+    image = encode_map(MapSnapshot(width, height, codes), item_list)
+
+    paths = []
+    for profile in (FAST_PROFILE, ARCHIVAL_PROFILE):
+        path = tmp_path / f"{profile.name}.png"
+        write_png(image, str(path), profile)
+        paths.append(path)
+
+    with Image.open(paths[0]) as fast, Image.open(paths[1]) as archival:
+        assert fast.mode == archival.mode == "RGBA"
+        assert fast.size == archival.size == (width, height)
+        assert fast.tobytes() == archival.tobytes() == image.tobytes()
+
+    assert os.path.getsize(paths[1]) <= os.path.getsize(paths[0])
@@ -0,0 +1,131 @@
+"""
+Tests for timing the startup phases.
+"""
+import json
+
+import pytest
+from PIL import Image
+
+import utils.profiler
+from app import _get_startup_report_args
+from base.image_handler import ImageHandler
+from utils.profiler import SingletonMeta, StartupProfiler
+
+class FakeClock:
+    """
+    Stands in for perf_counter and process_time, only moving when told to.
+    """
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(utils.profiler.time, "perf_counter", clock)
+    monkeypatch.setattr(utils.profiler.time, "process_time", clock)
+    return clock
+
+@pytest.fixture
+def profiler(clock, monkeypatch) -> StartupProfiler:
+    # a new profiler for each test, the app's one is put back afterwards
+    monkeypatch.delitem(SingletonMeta._instances, StartupProfiler, raising=False)
+    return StartupProfiler()
+
+def test_nested_phases_are_excluded(profiler, clock):
+    with profiler.phase("outer"):
+        clock.advance(1.0)
+        with profiler.phase("inner"):
+            clock.advance(2.0)
+            with profiler.phase("innermost"):
+                clock.advance(4.0)
+        clock.advance(0.5)
+
+    assert profiler.phases["outer"].wall == pytest.approx(1.5)
+    assert profiler.phases["outer"].cpu == pytest.approx(1.5)
+    assert profiler.phases["inner"].wall == pytest.approx(2.0)
+    assert profiler.phases["innermost"].wall == pytest.approx(4.0)
+
+    total_wall, _ = profiler._get_totals()
+    assert sum(timing.wall for timing in profiler.phases.values()) == pytest.approx(total_wall)
+
+def test_phases_count_their_calls(profiler, clock):
+    for _ in range(3):
+        with profiler.phase("decode"):
+            clock.advance(1.0)
+
+    with profiler.phase("parse"):
+        with profiler.phase("decode"):
+            clock.advance(1.0)
+
+    assert profiler.phases["decode"].calls == 4
+    assert profiler.phases["decode"].wall == pytest.approx(4.0)
+    assert profiler.phases["parse"].calls == 1
+    assert profiler.phases["parse"].wall == pytest.approx(0.0)
+
+def test_phases_are_not_timed_after_finishing(profiler, clock):
+    with profiler.phase("config"):
+        clock.advance(1.0)
+    profiler.finish()
+
+    clock.advance(5.0)
+    with profiler.phase("config"):
+        clock.advance(1.0)
+
+    assert profiler.phases["config"].calls == 1
+    assert profiler._get_totals() == (pytest.approx(1.0), pytest.approx(1.0))
+
+def test_each_sprite_is_decoded_once(app, profiler, tmp_path, monkeypatch):
+    Image.new("RGBA", (32, 32), (10, 20, 30, 255)).save(tmp_path / "world.png")
+    Image.new("RGBA", (8, 8), (40, 50, 60, 255)).save(tmp_path / "crate.png")
+
+    images = ImageHandler()
+    monkeypatch.setattr(images, "_profiler", profiler)
+    monkeypatch.setattr(images, "_modded_images", {})
+
+    # modded world.png tiles go through the tile loader
+    assert images.get_image(5, path=str(tmp_path)) is not None
+    assert profiler.phases["sprite decode"].calls == 1
+
+    assert images.get_image("crate", path=str(tmp_path)) is not None
+    assert profiler.phases["sprite decode"].calls == 2
+
+    # cached images aren't decoded again
+    images.get_image(5, path=str(tmp_path))
+    images.get_image("crate", path=str(tmp_path))
+    assert profiler.phases["sprite decode"].calls == 2
+
+def test_startup_report_json(profiler, clock, tmp_path):
+    with profiler.phase("config"):
+        clock.advance(0.25)
+        with profiler.phase("sprite decode"):
+            clock.advance(0.5)
+    profiler.finish()
+
+    show_report, report_path = _get_startup_report_args(["app.py", f"--startup-report={tmp_path / 'reports' / 'startup.json'}"])
+    assert show_report
+    profiler.write_json(report_path)
+
+    with open(report_path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    assert set(data) == {"phases", "total_wall_ms", "total_cpu_ms", "peak_rss_bytes"}
+    assert [phase["name"] for phase in data["phases"]] == ["sprite decode", "config"]
+    for phase in data["phases"]:
+        assert set(phase) == {"name", "calls", "wall_ms", "cpu_ms", "peak_rss_bytes"}
+        assert phase["calls"] == 1
+
+    assert data["phases"][0]["wall_ms"] == pytest.approx(500.0)
+    assert data["phases"][1]["wall_ms"] == pytest.approx(250.0)
+    assert data["total_wall_ms"] == pytest.approx(750.0)
+
+def test_startup_report_args():
+    assert _get_startup_report_args(["app.py"]) == (False, None)
+    assert _get_startup_report_args(["app.py", "--startup-report"]) == (True, None)
+    assert _get_startup_report_args(["app.py", "--startup-report=out.json"]) == (True, "out.json")
+    assert _get_startup_report_args(["app.py", "--startup-report="]) == (True, None)
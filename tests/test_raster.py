@@ -0,0 +1,122 @@
+"""
+Tests for turning strokes into grid cells.
+"""
+import pytest
+
+from utils.raster import brush_spans, ellipse_spans, line_cells, rect_spans
+
+ENDPOINTS = [
+    (0, 0, 0, 0), (0, 0, 7, 0), (0, 0, 0, -5), (2, 3, 9, 5), (9, 5, 2, 3),
+    (-4, 1, 3, -8), (0, 0, 6, 6), (5, -2, -7, 1), (1, 1, 2, 20)
+]
+
+@pytest.mark.parametrize("x0, y0, x1, y1", ENDPOINTS)
+def test_line_is_continuous(x0, y0, x1, y1):
+    cells = line_cells(x0, y0, x1, y1)
+
+    assert cells[0] == (x0, y0)
+    assert cells[-1] == (x1, y1)
+    assert len(set(cells)) == len(cells)
+    # every step moves to one of the eight cells around the last one
+    for (ax, ay), (bx, by) in zip(cells, cells[1:]):
+        assert max(abs(bx - ax), abs(by - ay)) == 1
+
+@pytest.mark.parametrize("x0, y0, x1, y1", ENDPOINTS)
+def test_line_has_one_cell_per_step(x0, y0, x1, y1):
+    cells = line_cells(x0, y0, x1, y1)
+
+    assert len(cells) == max(abs(x1 - x0), abs(y1 - y0)) + 1
+
+@pytest.mark.parametrize("x0, y0, x1, y1", ENDPOINTS)
+def test_line_stays_close_to_the_ideal_line(x0, y0, x1, y1):
+    # no cell is more than half a cell away from the real line along the minor axis
+    for x, y in line_cells(x0, y0, x1, y1):
+        if abs(x1 - x0) >= abs(y1 - y0):
+            if x1 != x0:
+                assert abs(y - (y0 + (y1 - y0) * (x - x0) / (x1 - x0))) <= 0.5
+        else:
+            assert abs(x - (x0 + (x1 - x0) * (y - y0) / (y1 - y0))) <= 0.5
+
+def test_line_accepts_floats():
+    assert line_cells(0.0, 0.0, 2.0, 1.0) == line_cells(0, 0, 2, 1)
+
+def span_cells(spans) -> list[tuple[int, int]]:
+    return [(x, y) for y, first, last in spans for x in range(first, last + 1)]
+
+@pytest.mark.parametrize("filled", (True, False))
+def test_rect_covers_its_corners(filled):
+    cells = span_cells(rect_spans(6, 5, 1, 2, filled))
+
+    assert len(cells) == len(set(cells))
+    assert {(1, 2), (6, 2), (1, 5), (6, 5)} <= set(cells)
+    assert len(cells) == (24 if filled else 16)
+
+SIZES = [(0, 0), (1, 0), (4, 4), (5, 5), (9, 3), (2, 11), (14, 8)]
+
+@pytest.mark.parametrize("width, height", SIZES)
+def test_ellipse_is_symmetric(width, height):
+    cells = set(span_cells(ellipse_spans(0, 0, width, height)))
+
+    assert cells == {(width - x, y) for x, y in cells}
+    assert cells == {(x, height - y) for x, y in cells}
+    if width == height:
+        assert cells == {(y, x) for x, y in cells}
+
+@pytest.mark.parametrize("width, height", SIZES)
+def test_ellipse_fits_its_rectangle(width, height):
+    spans = ellipse_spans(width, height, 0, 0)
+
+    # one span per row, touching every side of the rectangle
+    assert [y for y, _, _ in spans] == list(range(height + 1))
+    assert min(first for _, first, _ in spans) == 0
+    assert max(last for _, _, last in spans) == width
+    # every row is at least as wide as the rows further from the middle
+    widths = [last - first for _, first, last in spans]
+    middle = height // 2
+    assert widths[:middle + 1] == sorted(widths[:middle + 1])
+    assert widths[middle:] == sorted(widths[middle:], reverse=True)
+
+@pytest.mark.parametrize("width, height", SIZES)
+def test_ellipse_outline_encloses_the_inside(width, height):
+    filled = set(span_cells(ellipse_spans(0, 0, width, height)))
+    outline = span_cells(ellipse_spans(0, 0, width, height, filled=False))
+
+    assert len(outline) == len(set(outline))
+    assert set(outline) <= filled
+    # every inside cell not on the outline only touches cells of the ellipse
+    for x, y in filled - set(outline):
+        assert {(x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)} <= filled
+
+@pytest.mark.parametrize("shape", ("square", "circle"))
+@pytest.mark.parametrize("size", range(1, 9))
+def test_brush_is_centered(size, shape):
+    cells = span_cells(brush_spans(size, shape))
+
+    assert len(cells) == len(set(cells))
+    assert (0, 0) in cells
+    # even brushes reach one cell further right and down than left and up
+    low, high = -((size - 1) // 2), size // 2
+    assert min(x for x, _ in cells) == min(y for _, y in cells) == low
+    assert max(x for x, _ in cells) == max(y for _, y in cells) == high
+
+@pytest.mark.parametrize("size", range(1, 9))
+def test_square_brush_covers_its_size(size):
+    assert len(span_cells(brush_spans(size, "square"))) == size * size
+
+@pytest.mark.parametrize("size", range(1, 9))
+def test_circle_brush_fits_inside_the_square(size):
+    circle = set(span_cells(brush_spans(size, "circle")))
+    square = set(span_cells(brush_spans(size, "square")))
+
+    assert circle <= square
+    assert circle == {(y, x) for x, y in circle}
+    # the corners are cut off once the brush is big enough to be round
+    if size > 3:
+        assert len(circle) < len(square)
+
+def test_small_brushes():
+    assert brush_spans(1) == ((0, 0, 0),)
+    assert brush_spans(1, "circle") == ((0, 0, 0),)
+    assert brush_spans(2) == ((0, 0, 1), (1, 0, 1))
+    # sizes below one are a single cell
+    assert brush_spans(0) == brush_spans(-3) == brush_spans(1)
@@ -0,0 +1,153 @@
+"""
+Tests for recovering a session from its checkpoint and journal.
+"""
+import os
+
+import pytest
+
+from base.session_journal import CHECKPOINT_HEADER, JOURNAL_HEADER, RECORD_HEADER, SessionJournal
+from base.tile_grid import TileGrid
+
+FINGERPRINT = 1234
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = SessionJournal(str(tmp_path), FINGERPRINT)
+    yield journal
+    journal.close(clean=False)
+
+def recover(journal: SessionJournal, fingerprint: int = FINGERPRINT):
+    # a crashed session is read by the next launch, which has its own journal object
+    return SessionJournal(journal.directory, fingerprint).read_session()
+
+def test_recovers_checkpoint_and_journal(journal):
+    grid = TileGrid(10, 6)
+    grid.set(3, 7)
+    journal.start(grid)
+
+    grid.set_many([4, 5, 3], [8, 9, 0])
+    journal.flush()
+    grid.set(20, 11)
+    grid.set(20, 12)
+    journal.flush()
+
+    assert recover(journal) == (10, 6, grid.codes)
+
+def test_unflushed_changes_are_lost(journal):
+    grid = TileGrid(10, 6)
+    journal.start(grid)
+    grid.set(1, 5)
+    journal.flush()
+    grid.set(2, 6)
+
+    width, height, codes = recover(journal)
+    assert (codes[1], codes[2]) == (5, 0)
+
+def test_corrupted_record_stops_replay(journal):
+    grid = TileGrid(10, 6)
+    journal.start(grid)
+    grid.set(1, 5)
+    journal.flush()
+    grid.set(2, 6)
+    journal.flush()
+    grid.set(3, 7)
+    journal.flush()
+
+    # flip a bit in the code of the second record
+    with open(journal.journal_path, 'r+b') as f:
+        offset = JOURNAL_HEADER.size + RECORD_HEADER.size + 8 + RECORD_HEADER.size + 4
+        f.seek(offset)
+        byte = f.read(1)[0]
+        f.seek(offset)
+        f.write(bytes((byte ^ 1,)))
+
+    width, height, codes = recover(journal)
+    assert (codes[1], codes[2], codes[3]) == (5, 0, 0)
+
+def test_partly_written_record_is_ignored(journal):
+    grid = TileGrid(10, 6)
+    journal.start(grid)
+    grid.set(1, 5)
+    journal.flush()
+    grid.set(2, 6)
+    journal.flush()
+
+    with open(journal.journal_path, 'r+b') as f:
+        f.truncate(os.path.getsize(journal.journal_path) - 3)
+
+    width, height, codes = recover(journal)
+    assert (codes[1], codes[2]) == (5, 0)
+
+def test_reset_writes_a_checkpoint(journal):
+    grid = TileGrid(10, 6)
+    journal.start(grid)
+    grid.set(1, 5)
+    journal.flush()
+
+    grid.reset(4, 3)
+    grid.set(2, 9)
+    journal.flush()
+
+    # the checkpoint already has every change, so the journal starts over empty
+    assert recover(journal) == (4, 3, grid.codes)
+    assert os.path.getsize(journal.journal_path) == JOURNAL_HEADER.size
+
+def test_journal_of_an_older_checkpoint_is_not_replayed(journal):
+    grid = TileGrid(10, 6)
+    journal.start(grid)
+    grid.set(1, 5)
+    journal.flush()
+    with open(journal.journal_path, 'rb') as f:
+        old_journal = f.read()
+
+    grid.reset(10, 6)
+    journal.flush()
+    with open(journal.journal_path, 'wb') as f:
+        f.write(old_journal)
+
+    width, height, codes = recover(journal)
+    assert codes[1] == 0
+
+def test_changed_items_are_not_recovered(journal):
+    grid = TileGrid(10, 6)
+    journal.start(grid)
+
+    assert recover(journal, FINGERPRINT + 1) is None
+
+def test_corrupted_checkpoint_is_not_recovered(journal):
+    grid = TileGrid(10, 6)
+    journal.start(grid)
+    with open(journal.checkpoint_path, 'r+b') as f:
+        f.truncate(CHECKPOINT_HEADER.size + 2)
+
+    assert recover(journal) is None
+
+def test_clean_close_removes_the_session(journal):
+    journal.start(TileGrid(10, 6))
+    assert journal.has_session()
+
+    journal.close()
+    assert not journal.has_session()
+    assert not os.path.exists(journal.journal_path)
+
+def test_failed_write_is_journaled_by_the_next_flush(journal, monkeypatch):
+    grid = TileGrid(10, 6)
+    journal.start(grid)
+    grid.set(1, 5)
+    journal.flush()
+    grid.set_many([2, 3], [6, 7])
+
+    def fail(fd):
+        raise OSError("disk full")
+
+    # the record reaches the file but isn't synced, so it is cut off again
+    monkeypatch.setattr(os, "fsync", fail)
+    journal.flush()
+    assert os.path.getsize(journal.journal_path) == JOURNAL_HEADER.size + RECORD_HEADER.size + 8
+
+    monkeypatch.undo()
+    grid.set(4, 8)
+    journal.flush()
+
+    assert recover(journal) == (10, 6, grid.codes)
+    assert os.path.getsize(journal.journal_path) == JOURNAL_HEADER.size + 2 * RECORD_HEADER.size + 4 * 8
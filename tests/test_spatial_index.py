@@ -0,0 +1,133 @@
+"""
+Tests for the spatial index, compared with searching every cell.
+"""
+import random
+from collections import Counter
+
+import pytest
+
+from base.citemlist import ID_SHIFT, TEAM_MASK
+from base.spatial_index import SpatialIndex, get_item_ids
+from base.tile_grid import TileGrid
+
+def matches(code: int, item_ids, team: int = None) -> bool:
+    return code != 0 and code >> ID_SHIFT in item_ids and (team is None or code & TEAM_MASK == team & TEAM_MASK)
+
+def find_in_rect(grid, item_ids, left, top, right, bottom, team=None) -> list[int]:
+    return [
+        index for index, code in enumerate(grid.codes)
+        if matches(code, item_ids, team) and left <= index % grid.width <= right and top <= index // grid.width <= bottom
+    ]
+
+def distance(grid, index: int, x: int, y: int) -> int:
+    return (index % grid.width - x) ** 2 + (index // grid.width - y) ** 2
+
+def check_queries(index: SpatialIndex, rng: random.Random, item_ids: list[int]) -> None:
+    grid = index.grid
+    ids = set(rng.sample(item_ids, rng.randrange(1, 4)))
+    team = rng.choice((None, 0, 1))
+    x, y = rng.randrange(grid.width), rng.randrange(grid.height)
+
+    found = [i for i, code in enumerate(grid.codes) if matches(code, ids, team)]
+    assert index.count(ids, team) == len(found)
+    assert list(index.get_cells(ids)) == [i for i, code in enumerate(grid.codes) if matches(code, ids)]
+
+    left, top = rng.randrange(-5, grid.width), rng.randrange(-5, grid.height)
+    right, bottom = left + rng.randrange(40), top + rng.randrange(40)
+    assert list(index.find_in_rect(ids, left, top, right, bottom, team)) == find_in_rect(grid, ids, left, top, right, bottom, team)
+
+    radius = rng.uniform(0, 20)
+    assert list(index.find_in_radius(ids, x, y, radius, team)) == [i for i in found if distance(grid, i, x, y) <= radius * radius]
+
+    nearest = index.find_nearest(ids, x, y, team)
+    if found:
+        assert distance(grid, nearest, x, y) == min(distance(grid, i, x, y) for i in found)
+    else:
+        assert nearest == -1
+
+    first_x = rng.randrange(-3, grid.width)
+    last_x = first_x + rng.randrange(grid.width)
+    expected = Counter(code for i, code in enumerate(grid.codes) if code and first_x <= i % grid.width <= last_x)
+    assert index.count_codes(first_x, last_x) == expected
+
+@pytest.mark.parametrize("width, height", ((70, 50), (64, 48)))
+def test_queries_match_brute_force(sample_codes, width, height):
+    rng = random.Random(width)
+    grid = TileGrid(width, height)
+    index = SpatialIndex(grid)
+    codes = [0] * 30 + sample_codes
+    item_ids = sorted({code >> ID_SHIFT for code in sample_codes} - {0})
+
+    for step in range(40):
+        if step % 3:
+            grid.set(rng.randrange(len(grid.codes)), rng.choice(codes))
+        else:
+            cells = rng.sample(range(len(grid.codes)), rng.randrange(1, 300))
+            grid.set_many(cells, rng.choices(codes, k=len(cells)))
+
+        # queries are only asked for now and then, so edits are made both before and after the index is built
+        if step % 5 == 4:
+            check_queries(index, rng, item_ids)
+
+def test_buckets_are_updated_per_batch(sample_codes):
+    rng = random.Random(46)
+    grid = TileGrid(40, 30)
+    index = SpatialIndex(grid)
+    assert index._buckets is None
+
+    index.count({1})
+    for _ in range(20):
+        cells = rng.sample(range(len(grid.codes)), 50)
+        grid.set_many(cells, rng.choices(sample_codes, k=50))
+
+        assert index._buckets is not None
+        expected = {}
+        for i, code in enumerate(grid.codes):
+            if code:
+                expected.setdefault(code >> ID_SHIFT, set()).add(i)
+        assert index._buckets == expected
+
+def test_batches_with_many_items_keep_the_buckets():
+    grid = TileGrid(40, 30)
+    index = SpatialIndex(grid)
+    index.count({1})
+    buckets = index._buckets
+
+    # a paste or an undo can hold any amount of items, the buckets are still updated rather than sorted again
+    codes = [(item_id << ID_SHIFT) | 1 for item_id in range(1, 41)]
+    grid.set_many(range(len(codes)), codes)
+    assert index._buckets is buckets
+    assert index._buckets == {item_id: {item_id - 1} for item_id in range(1, 41)}
+
+    grid.set_many(range(len(codes)), reversed(codes))
+    assert index._buckets == {item_id: {40 - item_id} for item_id in range(1, 41)}
+    assert index.count({2}, team=1) == 1
+    assert index.count({2}, team=0) == 0
+    assert list(index.get_cells(range(1, 5))) == [36, 37, 38, 39]
+
+def test_reset_is_indexed_again(sample_codes):
+    grid = TileGrid(20, 20)
+    index = SpatialIndex(grid)
+    grid.set(5, sample_codes[-1])
+    assert index.count({sample_codes[-1] >> ID_SHIFT}) == 1
+
+    grid.reset(10, 5)
+    assert index.count({sample_codes[-1] >> ID_SHIFT}) == 0
+    assert index.find_nearest({sample_codes[-1] >> ID_SHIFT}, 0, 0) == -1
+    assert index.count_codes(0, 9) == Counter()
+
+def test_nearest_stops_at_the_max_distance():
+    grid = TileGrid(60, 60)
+    index = SpatialIndex(grid)
+    grid.set(grid.index(50, 50), 3 << ID_SHIFT)
+
+    assert index.find_nearest({3}, 0, 0, max_distance=70) == -1
+    assert index.find_nearest({3}, 0, 0, max_distance=71) == grid.index(50, 50)
+    assert index.find_nearest({4}, 0, 0) == -1
+
+def test_item_ids_by_type_and_name(item_list):
+    blobs = get_item_ids(item_list, "blob")
+
+    assert item_list.get_item_id("knight_shop") in blobs
+    assert item_list.get_item_id("tile_ground") not in blobs
+    assert get_item_ids(item_list, names=("tree", "lamp")) == {item_list.get_item_id("tree"), item_list.get_item_id("lamp")}
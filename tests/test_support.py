@@ -0,0 +1,91 @@
+"""
+Tests for the structural support analysis, compared with analyzing the whole map.
+"""
+import random
+
+import pytest
+
+from base.citemlist import ID_SHIFT
+from base.support import FULL_UPDATE_RATIO, SupportAnalyzer
+from base.tile_grid import TileGrid
+
+def full_analysis(analyzer: SupportAnalyzer) -> tuple[bytearray, list[tuple[int, int, int]]]:
+    fresh = SupportAnalyzer(analyzer.grid, analyzer.item_list)
+    analyzer.grid.remove_listener(fresh)
+    fresh.update()
+    return fresh._supported, fresh.get_unsupported_spans()
+
+@pytest.fixture
+def codes(item_list) -> list[int]:
+    # mostly solid blocks, so pieces join up and break apart as cells change
+    ground, stone = (item_list.get_item_id(name) << ID_SHIFT for name in ("tile_ground", "tile_stone"))
+    bedrock = item_list.get_item_id("tile_bedrock") << ID_SHIFT
+    background = item_list.get_item_id("tile_castle_back") << ID_SHIFT
+    return [0] * 4 + [ground] * 4 + [stone] * 2 + [bedrock, background]
+
+@pytest.mark.parametrize("seed", range(4))
+def test_incremental_analysis_matches_a_full_one(item_list, codes, seed):
+    rng = random.Random(seed)
+    grid = TileGrid(24, 18)
+    grid.set_many(range(len(grid.codes)), rng.choices(codes, k=len(grid.codes)))
+    analyzer = SupportAnalyzer(grid, item_list)
+    analyzer.update()
+
+    for step in range(150):
+        if step % 4:
+            grid.set(rng.randrange(len(grid.codes)), rng.choice(codes))
+        else:
+            cells = rng.sample(range(len(grid.codes)), rng.randrange(1, 20))
+            grid.set_many(cells, rng.choices(codes, k=len(cells)))
+
+        # several edits pile up before they are analyzed
+        if step % 3 == 0:
+            supported, spans = full_analysis(analyzer)
+            assert analyzer.get_unsupported_spans() == spans
+            assert analyzer._supported == supported
+
+def test_cutting_a_piece_off_drops_it(item_list):
+    ground = item_list.get_item_id("tile_ground") << ID_SHIFT
+    grid = TileGrid(5, 5)
+    analyzer = SupportAnalyzer(grid, item_list)
+    # a column from the bottom row with an arm sticking out at the top
+    column = [grid.index(2, y) for y in range(5)]
+    grid.set_many(column + [grid.index(3, 0)], [ground] * 6)
+    assert analyzer.get_unsupported_count() == 0
+
+    grid.set(grid.index(2, 2), 0)
+    assert analyzer.get_unsupported_spans() == [(0, 2, 3), (1, 2, 2)]
+    assert not analyzer.is_supported(grid.index(3, 0))
+
+    grid.set(grid.index(2, 2), ground)
+    assert analyzer.get_unsupported_count() == 0
+    assert analyzer.is_supported(grid.index(3, 0))
+
+def test_bedrock_holds_up_floating_blocks(item_list):
+    ground = item_list.get_item_id("tile_ground") << ID_SHIFT
+    bedrock = item_list.get_item_id("tile_bedrock") << ID_SHIFT
+    grid = TileGrid(5, 5)
+    analyzer = SupportAnalyzer(grid, item_list)
+    grid.set_many([1, 2], [ground, ground])
+    assert analyzer.get_unsupported_count() == 2
+
+    grid.set(3, bedrock)
+    assert analyzer.get_unsupported_count() == 0
+
+    grid.set(3, ground)
+    assert analyzer.get_unsupported_spans() == [(0, 1, 3)]
+
+def test_big_batches_are_analyzed_again(item_list, codes):
+    rng = random.Random(48)
+    grid = TileGrid(20, 10)
+    analyzer = SupportAnalyzer(grid, item_list)
+    analyzer.update()
+
+    count = int(len(grid.codes) * FULL_UPDATE_RATIO) + 1
+    cells = rng.sample(range(len(grid.codes)), count)
+    grid.set_many(cells, rng.choices(codes, k=count))
+    assert analyzer._needs_full_update
+
+    supported, spans = full_analysis(analyzer)
+    assert analyzer.get_unsupported_spans() == spans
+    assert analyzer._supported == supported
@@ -0,0 +1,85 @@
+"""
+Tests for the symmetry checker.
+"""
+import random
+
+import pytest
+
+from base.citemlist import ID_SHIFT
+from base.symmetry import SymmetryChecker
+from base.tile_grid import TileGrid
+
+def get_spans(checker: SymmetryChecker) -> list[tuple[int, int, int]]:
+    # the asymmetric cells of the whole map, worked out from scratch
+    grid = checker.grid
+    width = grid.width
+    cells = [
+        (y, x) for y in range(grid.height) for x in range(width)
+        if x != width - 1 - x and grid.codes[y * width + x] != checker.get_mirrored_code(grid.codes[y * width + width - 1 - x])
+    ]
+
+    spans = []
+    for y, x in cells:
+        if spans and spans[-1][0] == y and spans[-1][2] == x - 1:
+            spans[-1] = (y, spans[-1][1], x)
+        else:
+            spans.append((y, x, x))
+
+    return spans
+
+@pytest.mark.parametrize("width", (20, 21))
+def test_incremental_spans_match_a_full_check(item_list, sample_codes, width):
+    rng = random.Random(width)
+    grid = TileGrid(width, 12)
+    checker = SymmetryChecker(grid, item_list)
+    assert checker.get_asymmetric_spans() == []
+
+    for step in range(60):
+        if step % 3:
+            grid.set(rng.randrange(len(grid.codes)), rng.choice(sample_codes))
+        else:
+            indexes = rng.sample(range(len(grid.codes)), rng.randrange(1, 30))
+            grid.set_many(indexes, rng.choices(sample_codes, k=len(indexes)))
+
+        # only check some of the time, so several edits pile up between checks
+        if step % 4 == 0:
+            assert checker.get_asymmetric_spans() == get_spans(checker)
+
+    assert checker.get_asymmetric_spans() == get_spans(checker)
+    assert checker.get_asymmetric_count() == sum(last - first + 1 for _, first, last in get_spans(checker))
+
+def test_reset_is_checked_again(item_list, sample_codes):
+    grid = TileGrid(10, 6)
+    checker = SymmetryChecker(grid, item_list)
+    grid.set(0, sample_codes[-1])
+    checker.get_asymmetric_spans()
+
+    grid.reset(9, 4, [random.Random(1).choice(sample_codes) for _ in range(36)])
+    assert checker.get_asymmetric_spans() == get_spans(checker)
+
+def test_mirrored_side_belongs_to_the_other_team(item_list):
+    checker = SymmetryChecker(TileGrid(4, 1), item_list)
+    shop = item_list.get_item_id("knight_shop") << ID_SHIFT
+    tree = item_list.get_item_id("tree") << ID_SHIFT
+
+    assert checker.get_mirrored_code(shop) == shop | 1
+    assert checker.get_mirrored_code(shop | 1) == shop
+    # items without a team stay as they are
+    assert checker.get_mirrored_code(tree | 1) == tree | 1
+    assert checker.get_mirrored_code(0) == 0
+
+@pytest.mark.parametrize("width", (20, 21))
+@pytest.mark.parametrize("from_left", (True, False))
+def test_completion_makes_the_map_symmetric(item_list, sample_codes, width, from_left):
+    rng = random.Random(width)
+    grid = TileGrid(width, 10)
+    grid.set_many(range(len(grid.codes)), rng.choices(sample_codes, k=len(grid.codes)))
+    before = grid.snapshot()
+    checker = SymmetryChecker(grid, item_list)
+
+    grid.set_many(*checker.get_completion(from_left))
+
+    assert checker.get_asymmetric_spans() == []
+    # the copied half and the middle column are left alone
+    kept = range(0, (width + 1) // 2) if from_left else range(width // 2, width)
+    assert all(grid.codes[y * width + x] == before[y * width + x] for y in range(10) for x in kept)
@@ -0,0 +1,74 @@
+"""
+Tests for the tile grid's revision and content hash, which decide whether a map needs saving.
+"""
+import random
+from array import array
+
+from base.tile_grid import TileGrid
+
+def filled_grid(seed: int, width: int = 20, height: int = 10) -> TileGrid:
+    rng = random.Random(seed)
+    grid = TileGrid(width, height)
+    grid.set_many(range(width * height), [rng.choice((0, 0, 1 << 10, 5 << 10, (7 << 10) | 1)) for _ in range(width * height)])
+    return grid
+
+def test_hash_matches_a_full_hash():
+    rng = random.Random(31)
+    grid = filled_grid(31)
+    for _ in range(50):
+        if rng.random() < 0.5:
+            grid.set(rng.randrange(200), rng.choice((0, 1 << 10, 9 << 10)))
+        else:
+            cells = rng.sample(range(200), rng.randrange(1, 40))
+            grid.set_many(cells, [rng.choice((0, 1 << 10, 9 << 10)) for _ in cells])
+
+        # reset hashes every cell from scratch
+        copy = TileGrid(20, 10)
+        copy.reset(20, 10, grid.codes)
+        assert grid.get_state() == copy.get_state()
+
+def test_undone_edit_has_the_same_hash():
+    grid = filled_grid(1)
+    state, revision = grid.get_state(), grid.revision
+
+    old = grid.set_many([3, 4, 5], [9 << 10, 0, 9 << 10])
+    assert grid.get_state() != state
+
+    grid.set_many([3, 4, 5], old)
+    assert grid.get_state() == state
+    assert grid.revision > revision
+
+def test_real_changes_change_the_hash():
+    grid = filled_grid(2)
+    states = {grid.get_state()}
+    for index, code in ((0, 3 << 10), (0, 4 << 10), (1, 3 << 10), (0, 0)):
+        grid.set(index, code)
+        assert grid.get_state() not in states
+        states.add(grid.get_state())
+
+    # the same tiles in another place are a different map
+    moved = TileGrid(20, 10)
+    moved.set(1, 5 << 10)
+    other = TileGrid(20, 10)
+    other.set(2, 5 << 10)
+    assert moved.get_state() != other.get_state()
+
+def test_unchanged_cells_keep_the_revision():
+    grid = filled_grid(3)
+    revision = grid.revision
+
+    grid.set(0, grid.codes[0])
+    grid.set_many([1, 2], grid.codes[1:3])
+    assert grid.revision == revision
+
+    grid.set(0, grid.codes[0] ^ (1 << 10))
+    assert grid.revision == revision + 1
+
+def test_resize_with_the_same_content_is_a_different_state():
+    grid = TileGrid(4, 2)
+    grid.set_many([0, 1], [1 << 10, 2 << 10])
+    state = grid.get_state()
+
+    grid.reset(2, 4, array('I', grid.codes))
+    assert grid.content_hash == state[2]
+    assert grid.get_state() != state
@@ -0,0 +1,115 @@
+"""
+Tests for copying, stamping and transforming regions of tiles.
+"""
+from array import array
+
+import pytest
+
+from base.citemlist import ID_SHIFT, ROTATION_SHIFT
+from base.tile_grid import TileGrid
+from base.tile_region import (
+    FLIP_HORIZONTAL, FLIP_VERTICAL, ROTATE_CLOCKWISE, ROTATE_COUNTERCLOCKWISE, TileRegion, transform_cells
+)
+
+def numbered_grid(width: int, height: int) -> TileGrid:
+    grid = TileGrid(width, height)
+    grid.set_many(range(width * height), range(1, width * height + 1))
+    return grid
+
+def test_copy_and_stamp_round_trip():
+    grid = numbered_grid(12, 9)
+    region = TileRegion.from_grid(grid, 2, 3, 5, 4)
+
+    assert (region.width, region.height) == (5, 4)
+    assert region.codes[0] == grid.codes[grid.index(2, 3)]
+
+    target = TileGrid(12, 9)
+    target.set_many(*region.get_cells(target, 2, 3))
+    assert TileRegion.from_grid(target, 2, 3, 5, 4) == region
+    assert sum(map(bool, target.codes)) == 20
+
+def test_copy_is_clipped_to_the_grid():
+    grid = numbered_grid(6, 5)
+
+    region = TileRegion.from_grid(grid, -2, 3, 4, 10)
+    assert (region.width, region.height) == (2, 2)
+    assert list(region.codes) == [19, 20, 25, 26]
+    assert TileRegion.from_grid(grid, 6, 0, 3, 3) is None
+
+def test_stamp_skips_cells_outside_the_grid():
+    region = TileRegion(3, 3, array('I', range(1, 10)))
+    grid = TileGrid(4, 4)
+
+    indexes, codes = region.get_cells(grid, 2, -1)
+    assert list(indexes) == [2, 3, 6, 7]
+    assert list(codes) == [4, 5, 7, 8]
+
+def test_empty_cells_only_clear_when_asked():
+    region = TileRegion(2, 2, array('I', [0, 3, 4, 0]))
+    grid = TileGrid(4, 4)
+
+    assert list(region.get_cells(grid, 1, 1)[0]) == [6, 9]
+    assert list(region.get_cells(grid, 1, 1, include_empty=True)[0]) == [5, 6, 9, 10]
+    assert not region.is_empty()
+    assert TileRegion(2, 1, array('I', [0, 0])).is_empty()
+
+def test_transforms_move_cells():
+    values = array('I', range(6)) # 3 wide, 2 tall
+
+    assert transform_cells(values, 3, 2, FLIP_HORIZONTAL) == (array('I', [2, 1, 0, 5, 4, 3]), 3, 2)
+    assert transform_cells(values, 3, 2, FLIP_VERTICAL) == (array('I', [3, 4, 5, 0, 1, 2]), 3, 2)
+    assert transform_cells(values, 3, 2, ROTATE_CLOCKWISE) == (array('I', [3, 0, 4, 1, 5, 2]), 2, 3)
+    assert transform_cells(values, 3, 2, ROTATE_COUNTERCLOCKWISE) == (array('I', [2, 5, 1, 4, 0, 3]), 2, 3)
+
+def test_rotating_moves_every_cell_to_its_rotated_position():
+    width, height = 7, 4
+    values = array('I', range(width * height))
+    rotated, new_width, _ = transform_cells(values, width, height, ROTATE_CLOCKWISE)
+
+    for y in range(height):
+        for x in range(width):
+            assert rotated[x * new_width + (new_width - 1 - y)] == values[y * width + x]
+
+def test_transforms_undo_each_other():
+    values = array('I', range(35))
+    for transforms in (
+        [ROTATE_CLOCKWISE] * 4, [ROTATE_COUNTERCLOCKWISE] * 4, [FLIP_HORIZONTAL] * 2, [FLIP_VERTICAL] * 2,
+        [ROTATE_CLOCKWISE, ROTATE_COUNTERCLOCKWISE], [FLIP_HORIZONTAL, FLIP_VERTICAL, ROTATE_CLOCKWISE, ROTATE_CLOCKWISE]
+    ):
+        result, width, height = values, 5, 7
+        for transform in transforms:
+            result, width, height = transform_cells(result, width, height, transform)
+
+        assert (result, width, height) == (values, 5, 7)
+
+def test_unknown_transform_is_an_error():
+    with pytest.raises(ValueError):
+        transform_cells(array('I', [1]), 1, 1, "mirror")
+
+def test_transformed_turns_rotatable_items(item_list):
+    ladder = item_list.get_item_id("ladder") << ID_SHIFT
+    ground = item_list.get_item_id("tile_ground") << ID_SHIFT
+    region = TileRegion(2, 1, array('I', [ladder | 1, ground]))
+
+    rotated = region.transformed(ROTATE_CLOCKWISE, item_list)
+    assert (rotated.width, rotated.height) == (1, 2)
+    assert list(rotated.codes) == [ladder | 1 | (1 << ROTATION_SHIFT), ground]
+
+    # flipping a quarter turn sideways points it the other way
+    flipped = rotated.transformed(FLIP_HORIZONTAL, item_list)
+    assert list(flipped.codes) == [ladder | 1 | (3 << ROTATION_SHIFT), ground]
+
+def test_transforms_are_undone_with_rotations(item_list):
+    ladder = item_list.get_item_id("ladder") << ID_SHIFT
+    region = TileRegion(3, 2, array('I', [ladder, ladder | (1 << ROTATION_SHIFT), 0, ladder | (2 << ROTATION_SHIFT), 5, ladder | (3 << ROTATION_SHIFT)]))
+
+    for transforms in ([ROTATE_CLOCKWISE] * 4, [FLIP_HORIZONTAL] * 2, [FLIP_VERTICAL] * 2, [ROTATE_COUNTERCLOCKWISE, ROTATE_CLOCKWISE]):
+        result = region
+        for transform in transforms:
+            result = result.transformed(transform, item_list)
+
+        assert result == region
+
+    # flipping both ways is the same as turning around
+    both = region.transformed(FLIP_HORIZONTAL, item_list).transformed(FLIP_VERTICAL, item_list)
+    assert both == region.transformed(ROTATE_CLOCKWISE, item_list).transformed(ROTATE_CLOCKWISE, item_list)
@@ -20,6 +20,8 @@ class FileHandler:
             "config_path": os.path.abspath(os.path.join(default_path, "settings", "config.json")),
             "default_config_path": os.path.abspath(os.path.join(default_path, "settings", "readonly_config.json")),
             "maps_path": os.path.abspath(os.path.join(default_path, "Maps")),
+            "autosave_path": os.path.abspath(os.path.join(default_path, "Maps", "Autosave")),
+            "prefabs_path": os.path.abspath(os.path.join(default_path, "Maps", "Prefabs")),
             "modded_items_path": os.path.abspath(os.path.join(default_path, "Modded")),
             "tilelist_path": os.path.abspath(os.path.join(vanilla_items, "tiles.json")),
             "bloblist_path": os.path.abspath(os.path.join(vanilla_items, "blobs.json")),
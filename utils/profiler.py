@@ -0,0 +1,208 @@
+"""
+Used to time the startup phases of the application.
+"""
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+try:
+    import resource
+except ImportError: # windows
+    resource = None
+
+class SingletonMeta(type):
+    """
+    Used to share code between all instances of the class.
+    """
+    _instances = {}
+
+    def __call__(cls, *args, **kwargs):
+        if cls not in cls._instances:
+            instance = super().__call__(*args, **kwargs)
+            cls._instances[cls] = instance
+        return cls._instances[cls]
+
+@dataclass
+class PhaseTiming:
+    name: str
+    calls: int = 0
+    wall: float = 0.0 # seconds, excluding nested phases
+    cpu: float = 0.0 # seconds, excluding nested phases
+    peak_rss: int = 0 # bytes, high-water mark of the process when the phase last ended
+
+class StartupProfiler(metaclass=SingletonMeta):
+    """
+    Records wall time, CPU time and peak RSS for each startup phase.
+
+    Phases can be nested and entered more than once, time spent in a nested
+    phase is only counted towards the innermost one so the totals add up.
+    """
+    def __init__(self) -> None:
+        self.phases: dict[str, PhaseTiming] = {}
+        self.finished = False
+        self._stack = [] # [name, wall start, cpu start, nested wall, nested cpu]
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self._total_wall = 0.0
+        self._total_cpu = 0.0
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Times the code run inside the context as part of the given phase.
+
+        Args:
+            name (str): The name of the phase.
+        """
+        if self.finished:
+            yield
+            return
+
+        frame = [name, time.perf_counter(), time.process_time(), 0.0, 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            wall = time.perf_counter() - frame[1]
+            cpu = time.process_time() - frame[2]
+
+            timing = self.phases.get(name)
+            if timing is None:
+                timing = self.phases[name] = PhaseTiming(name)
+
+            timing.calls += 1
+            timing.wall += wall - frame[3]
+            timing.cpu += cpu - frame[4]
+            timing.peak_rss = self._get_peak_rss()
+
+            # let the parent phase know how much time to exclude
+            if self._stack:
+                self._stack[-1][3] += wall
+                self._stack[-1][4] += cpu
+
+    def finish(self) -> None:
+        """
+        Stops recording, phases entered after this are not timed.
+        """
+        if self.finished:
+            return
+
+        self._total_wall = time.perf_counter() - self._start_wall
+        self._total_cpu = time.process_time() - self._start_cpu
+        self.finished = True
+
+    def get_report(self) -> str:
+        """
+        Builds a summary table of every recorded phase.
+
+        Returns:
+            str: The formatted table.
+        """
+        header = f"{'phase':<20}{'calls':>7}{'wall (ms)':>12}{'cpu (ms)':>12}{'peak rss (MB)':>16}"
+        lines = [header, "-" * len(header)]
+
+        for timing in self.phases.values():
+            lines.append(
+                f"{timing.name:<20}{timing.calls:>7}{timing.wall * 1000:>12.1f}"
+                f"{timing.cpu * 1000:>12.1f}{timing.peak_rss / (1024 * 1024):>16.1f}"
+            )
+
+        total_wall, total_cpu = self._get_totals()
+        lines.append("-" * len(header))
+        lines.append(
+            f"{'total':<20}{'':>7}{total_wall * 1000:>12.1f}"
+            f"{total_cpu * 1000:>12.1f}{self._get_peak_rss() / (1024 * 1024):>16.1f}"
+        )
+
+        return "\n".join(lines)
+
+    def print_report(self) -> None:
+        """
+        Prints the summary table of every recorded phase.
+        """
+        print(self.get_report())
+
+    def write_json(self, fp: str) -> None:
+        """
+        Writes every recorded phase to a JSON file.
+
+        Args:
+            fp (str): The path of the file to write.
+        """
+        total_wall, total_cpu = self._get_totals()
+        data = {
+            "phases": [
+                {
+                    "name": timing.name,
+                    "calls": timing.calls,
+                    "wall_ms": round(timing.wall * 1000, 3),
+                    "cpu_ms": round(timing.cpu * 1000, 3),
+                    "peak_rss_bytes": timing.peak_rss
+                }
+                for timing in self.phases.values()
+            ],
+            "total_wall_ms": round(total_wall * 1000, 3),
+            "total_cpu_ms": round(total_cpu * 1000, 3),
+            "peak_rss_bytes": self._get_peak_rss()
+        }
+
+        directory = os.path.dirname(os.path.abspath(fp))
+        os.makedirs(directory, exist_ok=True)
+
+        try:
+            with open(fp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=4)
+            print(f"Startup report saved to: {fp}")
+
+        except IOError as exc:
+            print(f"Error saving startup report: {exc}")
+
+    def _get_totals(self) -> tuple[float, float]:
+        if self.finished:
+            return self._total_wall, self._total_cpu
+
+        return time.perf_counter() - self._start_wall, time.process_time() - self._start_cpu
+
+    def _get_peak_rss(self) -> int:
+        if resource is not None:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # linux reports kilobytes, macos reports bytes
+            return peak if sys.platform == "darwin" else peak * 1024
+
+        if os.name == "nt":
+            return self._get_windows_peak_rss()
+
+        return 0
+
+    def _get_windows_peak_rss(self) -> int:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        try:
+            process = ctypes.windll.kernel32.GetCurrentProcess()
+            ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb)
+
+        except (AttributeError, OSError):
+            return 0
+
+        return counters.PeakWorkingSetSize
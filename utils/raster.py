@@ -0,0 +1,154 @@
+"""
+Used to turn shapes into the grid cells they cover.
+"""
+import math
+from functools import lru_cache
+
+def line_cells(x0: int, y0: int, x1: int, y1: int) -> list[tuple[int, int]]:
+    """
+    Returns every cell on the line between two cells using Bresenham's algorithm,
+    in order from the start to the end, with no cell repeated.
+
+    Args:
+        x0 (int): The x position of the start cell.
+        y0 (int): The y position of the start cell.
+        x1 (int): The x position of the end cell.
+        y1 (int): The y position of the end cell.
+
+    Returns:
+        list[tuple[int, int]]: The cells on the line, including both ends.
+    """
+    x0, y0, x1, y1 = int(x0), int(y0), int(x1), int(y1)
+
+    dx = abs(x1 - x0)
+    dy = -abs(y1 - y0)
+    step_x = 1 if x0 < x1 else -1
+    step_y = 1 if y0 < y1 else -1
+    error = dx + dy
+
+    cells = []
+    while True:
+        cells.append((x0, y0))
+        if x0 == x1 and y0 == y1:
+            return cells
+
+        error2 = 2 * error
+        if error2 >= dy:
+            error += dy
+            x0 += step_x
+
+        if error2 <= dx:
+            error += dx
+            y0 += step_y
+
+def rect_spans(x0: int, y0: int, x1: int, y1: int, filled: bool = True) -> list[tuple[int, int, int]]:
+    """
+    Returns the cells covered by a rectangle between two corner cells.
+
+    Args:
+        x0 (int): The x position of the first corner.
+        y0 (int): The y position of the first corner.
+        x1 (int): The x position of the opposite corner.
+        y1 (int): The y position of the opposite corner.
+        filled (bool): Whether to cover the inside, or only the outline.
+
+    Returns:
+        list[tuple[int, int, int]]: Rows of cells as (y, first x, last x) spans.
+    """
+    left, right = sorted((int(x0), int(x1)))
+    top, bottom = sorted((int(y0), int(y1)))
+
+    if filled:
+        return [(y, left, right) for y in range(top, bottom + 1)]
+
+    spans = [(top, left, right)]
+    for y in range(top + 1, bottom):
+        spans.append((y, left, left))
+        if right != left:
+            spans.append((y, right, right))
+
+    if bottom != top:
+        spans.append((bottom, left, right))
+
+    return spans
+
+def ellipse_spans(x0: int, y0: int, x1: int, y1: int, filled: bool = True) -> list[tuple[int, int, int]]:
+    """
+    Returns the cells covered by the ellipse that fits inside the rectangle between two corner cells.
+    A cell is covered when its center is inside the ellipse.
+
+    Args:
+        x0 (int): The x position of the first corner.
+        y0 (int): The y position of the first corner.
+        x1 (int): The x position of the opposite corner.
+        y1 (int): The y position of the opposite corner.
+        filled (bool): Whether to cover the inside, or only the outline.
+
+    Returns:
+        list[tuple[int, int, int]]: Rows of cells as (y, first x, last x) spans.
+    """
+    left, right = sorted((int(x0), int(x1)))
+    top, bottom = sorted((int(y0), int(y1)))
+
+    radius_x = (right - left + 1) / 2
+    radius_y = (bottom - top + 1) / 2
+    center_x = left + radius_x
+    center_y = top + radius_y
+
+    # the filled span of every row, always at least the middle cells so thin ellipses have no gaps
+    rows = []
+    for y in range(top, bottom + 1):
+        dy = (y + 0.5 - center_y) / radius_y
+        half = radius_x * math.sqrt(max(0.0, 1 - dy * dy))
+        first = min(math.ceil(center_x - half - 0.5), math.floor(center_x - 0.5))
+        last = max(math.floor(center_x + half - 0.5), math.ceil(center_x - 0.5))
+        rows.append((y, first, last))
+
+    if filled:
+        return rows
+
+    # a cell is on the outline unless all of its neighbours are inside the ellipse
+    spans = []
+    for i, (y, first, last) in enumerate(rows):
+        inner_first, inner_last = first + 1, last - 1
+        for neighbour in (i - 1, i + 1):
+            if 0 <= neighbour < len(rows):
+                inner_first = max(inner_first, rows[neighbour][1])
+                inner_last = min(inner_last, rows[neighbour][2])
+            else:
+                inner_first, inner_last = last + 1, first - 1
+
+        if inner_first > inner_last:
+            spans.append((y, first, last))
+            continue
+
+        spans.append((y, first, inner_first - 1))
+        spans.append((y, inner_last + 1, last))
+
+    return spans
+
+def line_spans(x0: int, y0: int, x1: int, y1: int) -> list[tuple[int, int, int]]:
+    """
+    Returns the cells on the line between two cells (see line_cells) as (y, first x, last x) spans.
+    """
+    return [(y, x, x) for x, y in line_cells(x0, y0, x1, y1)]
+
+@lru_cache(maxsize=None)
+def brush_spans(size: int, shape: str = "square") -> tuple[tuple[int, int, int], ...]:
+    """
+    Returns the cells covered by a brush, relative to the cell it is centered on.
+
+    Args:
+        size (int): The width of the brush in cells.
+        shape (str): Either "square" or "circle".
+
+    Returns:
+        tuple[tuple[int, int, int], ...]: Rows of cells as (y, first x, last x) spans.
+    """
+    size = max(1, int(size))
+    low, high = -((size - 1) // 2), size // 2
+
+    if shape == "circle":
+        return tuple(ellipse_spans(low, low, high, high))
+
+    return tuple(rect_spans(low, low, high, high))
@@ -1,14 +1,35 @@
 """
 Used to store Vector 2 positions.
 """
-from typing import Union
+from typing import NamedTuple, Union
+
 class Vec2f:
     """
     Used to store Vector 2 positions.
+    Vectors can't be changed once made, so they are safe to share and to use as dict keys.
+    A vector is equal to any (x, y) pair with the same values, such as a Cell.
     """
+    __slots__ = ("x", "y", "_hash")
+
     def __init__(self, x: Union[float, int] = 0, y: Union[float, int] = 0):
-        self.x = x
-        self.y = y
+        object.__setattr__(self, "x", x)
+        object.__setattr__(self, "y", y)
+        object.__setattr__(self, "_hash", hash((x, y)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Vec2f is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Vec2f is immutable")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (Vec2f, (self.x, self.y))
 
     def __iter__(self):
         return iter((self.x, self.y))
@@ -85,12 +106,15 @@ class Vec2f:
         return Vec2f(float(self.x), float(self.y))
 
     def __hash__(self):
-        return hash((self.x, self.y))
+        return self._hash
 
     def __eq__(self, other):
         if isinstance(other, Vec2f):
             return self.x == other.x and self.y == other.y
 
+        if isinstance(other, tuple) and len(other) == 2:
+            return self.x == other[0] and self.y == other[1]
+
         return False
 
     def __str__(self):
@@ -98,3 +122,25 @@ class Vec2f:
 
     def __repr__(self):
         return f"Vec2f({self.x}, {self.y})"
+
+class Cell(NamedTuple):
+    """
+    The integer position of a cell on the map, cheap to make and hash.
+    Returned by TileGrid.position, and equal to a Vec2f with the same position.
+    """
+    x: int
+    y: int
+
+    @classmethod
+    def from_index(cls, index: int, width: int) -> 'Cell':
+        """
+        Returns the cell at a flat index of the tile grid.
+        """
+        y, x = divmod(index, width)
+        return cls(x, y)
+
+    def get_index(self, width: int) -> int:
+        """
+        Returns the flat index of the cell in the tile grid.
+        """
+        return self.y * width + self.x